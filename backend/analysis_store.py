@@ -0,0 +1,350 @@
+# analysis_store.py - Histórico, análises, índice de cache, fila de jobs e progresso em SQLite (WAL)
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    stems_count INTEGER NOT NULL DEFAULT 0,
+    chords_count INTEGER NOT NULL DEFAULT 0,
+    duration REAL NOT NULL DEFAULT 0,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_filename ON history (filename);
+
+CREATE TABLE IF NOT EXISTS analyses (
+    filename TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    filename TEXT,
+    path TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    last_access REAL NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_last_access ON results (last_access);
+CREATE INDEX IF NOT EXISTS idx_results_filename ON results (filename);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    queue TEXT NOT NULL,
+    fn TEXT NOT NULL,
+    args TEXT NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue_state ON jobs (queue, state, seq);
+
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    queue TEXT NOT NULL,
+    slots INTEGER NOT NULL,
+    heartbeat REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS progress (
+    task_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class AnalysisStore:
+    """Armazenamento indexado: cada operação grava só as linhas afetadas"""
+
+    def __init__(self, db_path, history_limit=20):
+        self.db_path = db_path
+        self.history_limit = history_limit
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Uma conexão por thread; WAL permite leituras durante escritas.
+            # O índice do WAL fica em memória compartilhada do host: o banco não pode
+            # estar em sistema de arquivos de rede (api/worker só no mesmo host)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._conn())
+
+    # ---------- Migração ----------
+
+    def migrate_from_json(self, history_file, cache_file, result_cache_file=None):
+        """Importa os JSON antigos uma única vez e renomeia para *.migrated"""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+
+        history, cache, results = [], {}, {}
+        try:
+            if os.path.exists(history_file):
+                with open(history_file, 'r', encoding='utf-8') as f:
+                    history = json.load(f)
+            if os.path.exists(cache_file):
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+            if result_cache_file and os.path.exists(result_cache_file):
+                with open(result_cache_file, 'r', encoding='utf-8') as f:
+                    results = json.load(f)
+        except Exception as e:
+            print(f"Erro ao ler JSON para migração: {e}")
+            return
+
+        with self._transaction() as conn:
+            # Outro processo (api + worker no mesmo DATA_DIR) pode ter migrado enquanto líamos
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return
+            # Histórico em JSON está do mais novo para o mais antigo
+            for item in reversed(history):
+                conn.execute(
+                    'INSERT INTO history (filename, stems_count, chords_count, duration, timestamp) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (item['filename'], item.get('stems_count', 0), item.get('chords_count', 0),
+                     item.get('duration', 0), item.get('timestamp', ''))
+                )
+            for filename, data in cache.items():
+                conn.execute('INSERT OR REPLACE INTO analyses (filename, data) VALUES (?, ?)',
+                             (filename, json.dumps(data, ensure_ascii=False)))
+            for key, entry in results.items():
+                self._put_result(conn, key, entry)
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+        for path in (history_file, cache_file, result_cache_file):
+            if path and os.path.exists(path):
+                os.replace(path, f'{path}.migrated')
+        if history or cache or results:
+            print(f"✓ Migrado para SQLite: {len(history)} históricos, {len(cache)} análises, "
+                  f"{len(results)} resultados")
+
+    # ---------- Histórico ----------
+
+    def add_history(self, entry):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO history (filename, stems_count, chords_count, duration, timestamp) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (entry['filename'], entry['stems_count'], entry['chords_count'],
+                 entry['duration'], entry['timestamp'])
+            )
+            conn.execute(
+                'DELETE FROM history WHERE id NOT IN (SELECT id FROM history ORDER BY id DESC LIMIT ?)',
+                (self.history_limit,)
+            )
+
+    def list_history(self):
+        rows = self._conn().execute(
+            'SELECT filename, stems_count, chords_count, duration, timestamp '
+            'FROM history ORDER BY id DESC LIMIT ?', (self.history_limit,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_history(self, filename):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM history WHERE filename = ?', (filename,))
+
+    # ---------- Análises (resultado por nome de arquivo) ----------
+
+    def get_analysis(self, filename):
+        row = self._conn().execute('SELECT data FROM analyses WHERE filename = ?', (filename,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def put_analysis(self, filename, data):
+        with self._transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO analyses (filename, data) VALUES (?, ?)',
+                         (filename, json.dumps(data, ensure_ascii=False)))
+
+    def delete_analysis(self, filename):
+        with self._transaction() as conn:
+            return conn.execute('DELETE FROM analyses WHERE filename = ?', (filename,)).rowcount > 0
+
+    def referenced_filenames(self):
+        """Nomes com histórico ou análise salva"""
+        rows = self._conn().execute(
+            'SELECT filename FROM history UNION SELECT filename FROM analyses'
+        ).fetchall()
+        return [row['filename'] for row in rows]
+
+    def count_analyses(self):
+        return self._conn().execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+
+    # ---------- Índice do cache de resultados ----------
+
+    def result_index(self):
+        """Metadados (sem payload) de todas as entradas, da menos para a mais usada"""
+        rows = self._conn().execute(
+            'SELECT key, filename, path, size, last_access FROM results ORDER BY last_access'
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_result(self, key):
+        row = self._conn().execute('SELECT data FROM results WHERE key = ?', (key,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def put_result(self, key, entry):
+        with self._transaction() as conn:
+            self._put_result(conn, key, entry)
+
+    def _put_result(self, conn, key, entry):
+        conn.execute(
+            'INSERT OR REPLACE INTO results (key, filename, path, size, last_access, data) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (key, entry.get('filename'), entry.get('path'), entry.get('size', 0),
+             entry.get('last_access', 0), json.dumps(entry, ensure_ascii=False))
+        )
+
+    def touch_result(self, key, last_access):
+        with self._transaction() as conn:
+            conn.execute('UPDATE results SET last_access = ? WHERE key = ?', (last_access, key))
+
+    def delete_results(self, keys):
+        with self._transaction() as conn:
+            conn.executemany('DELETE FROM results WHERE key = ?', [(key,) for key in keys])
+
+    # ---------- Fila de jobs compartilhada (modo api/worker) ----------
+
+    def enqueue_job(self, job_id, queue, fn, args, max_queue):
+        """Insere o job se a fila tiver espaço; retorna a posição 1-based ou None se cheia"""
+        with self._transaction() as conn:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE queue = ? AND state = 'queued'",
+                                  (queue,)).fetchone()[0]
+            if queued >= max_queue:
+                return None
+            conn.execute(
+                "INSERT INTO jobs (id, queue, fn, args, state, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, queue, fn, json.dumps(args, ensure_ascii=False), time.time())
+            )
+            return queued + 1
+
+    def claim_job(self, queue, worker_id):
+        """Pega o job mais antigo da fila (atômico entre processos); None se vazia"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id, fn, args, created FROM jobs WHERE queue = ? AND state = 'queued' "
+                "ORDER BY seq LIMIT 1", (queue,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET state = 'running', worker = ?, started = ? WHERE id = ?",
+                         (worker_id, time.time(), row['id']))
+            return {'id': row['id'], 'fn': row['fn'], 'args': json.loads(row['args']),
+                    'created': row['created']}
+
+    def finish_job(self, job_id, state):
+        with self._transaction() as conn:
+            conn.execute('UPDATE jobs SET state = ?, finished = ? WHERE id = ?',
+                         (state, time.time(), job_id))
+
+    def job_position(self, job_id):
+        """Posição 1-based na fila, 0 se rodando, None se desconhecido/terminado"""
+        conn = self._conn()
+        row = conn.execute('SELECT seq, queue, state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or row['state'] not in ('queued', 'running'):
+            return None
+        if row['state'] == 'running':
+            return 0
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE queue = ? AND state = 'queued' AND seq <= ?",
+            (row['queue'], row['seq'])
+        ).fetchone()[0]
+
+    def queued_job_ids(self, queue):
+        rows = self._conn().execute(
+            "SELECT id FROM jobs WHERE queue = ? AND state = 'queued' ORDER BY seq", (queue,)
+        ).fetchall()
+        return [row['id'] for row in rows]
+
+    def pending_job_args(self, queue):
+        """Argumentos dos jobs ainda na fila ou rodando"""
+        rows = self._conn().execute(
+            "SELECT args FROM jobs WHERE queue = ? AND state IN ('queued', 'running')", (queue,)
+        ).fetchall()
+        return [json.loads(row['args']) for row in rows]
+
+    def job_counts(self, queue):
+        rows = self._conn().execute(
+            'SELECT state, COUNT(*) AS n FROM jobs WHERE queue = ? GROUP BY state', (queue,)
+        ).fetchall()
+        return {row['state']: row['n'] for row in rows}
+
+    def worker_heartbeat(self, worker_id, queue, slots):
+        with self._transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO workers (id, queue, slots, heartbeat) VALUES (?, ?, ?, ?)',
+                         (worker_id, queue, slots, time.time()))
+
+    def live_workers(self, queue, max_age):
+        rows = self._conn().execute(
+            'SELECT id, slots, heartbeat FROM workers WHERE queue = ? AND heartbeat >= ?',
+            (queue, time.time() - max_age)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def requeue_stale_jobs(self, queue, max_age):
+        """Jobs 'running' de workers sem heartbeat recente voltam para a fila"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET state = 'queued', worker = NULL, started = NULL "
+                "WHERE queue = ? AND state = 'running' AND worker NOT IN "
+                "(SELECT id FROM workers WHERE heartbeat >= ?)",
+                (queue, time.time() - max_age)
+            ).rowcount
+
+    def prune_jobs(self, max_age):
+        """Apaga jobs terminados e progresso antigos (a tabela não cresce para sempre)"""
+        limit = time.time() - max_age
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE state IN ('done', 'error') AND finished < ?", (limit,))
+            conn.execute('DELETE FROM progress WHERE updated < ?', (limit,))
+            conn.execute('DELETE FROM workers WHERE heartbeat < ?', (limit,))
+
+    # ---------- Progresso compartilhado (modo api/worker) ----------
+
+    def put_progress(self, task_id, data):
+        with self._transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO progress (task_id, data, updated) VALUES (?, ?, ?)',
+                         (task_id, json.dumps(data, ensure_ascii=False), time.time()))
+
+    def get_progress(self, task_id):
+        row = self._conn().execute('SELECT data FROM progress WHERE task_id = ?', (task_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK em uma conexão autocommit"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
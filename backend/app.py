@@ -1,33 +1,139 @@
 # app.py - Backend Flask UPGRADE - Demucs com 2/4/6 stems e 3 qualidades
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 import os
 import subprocess
-import librosa
 import soundfile as sf
 from pathlib import Path
 import time
-import json
 from datetime import datetime
 import threading
+import multiprocessing
 import sys
+import re
+import codecs
+import hashlib
+import shutil
+import uuid
+from collections import deque
+from demucs_pool import DemucsModelPool, SEGMENTS_DIR
+from job_scheduler import JobScheduler, QueueFullError, default_slots
+from shared_queue import SharedJobQueue, run_worker
+from result_cache import ResultCache, separation_key, chords_key, render_key, stem_render_key
+from analysis_store import AnalysisStore
+import parallel_separation
+import chord_recognizer
+from progress_events import ProgressBroker, stream_progress, poll_progress
+from crema_pool import CremaChordPool
+from audio_cache import DecodedAudioCache, audio_duration
+import stem_effects
+from stem_index import StemIndex
+import stem_transcode
+import waveform_peaks
+import preview_excerpt
+import stem_derivation
+import pitch_time
+import live_render
+from upload_store import UploadStore, UploadNotFoundError, UploadOffsetError
+import metrics
 
 app = Flask(__name__)
 CORS(app)
 
 # ==================== CONFIGURAÇÕES ====================
-UPLOAD_FOLDER = 'uploads'
-OUTPUT_FOLDER = 'output'
-STEMS_FOLDER = 'stems'
-HISTORY_FILE = 'analysis_history.json'
-CACHE_FILE = 'analysis_cache.json'
+# Modo do processo:
+#   standalone - API + separação no mesmo processo (padrão)
+#   api        - só HTTP; separações vão para a fila no SQLite compartilhado
+#   worker     - sem HTTP; pega separações da fila (rode N, na mesma máquina da API)
+APP_MODE = os.environ.get('APP_MODE', 'standalone')
+# api/worker: progresso e fila no banco SQLite (WAL), que só funciona entre processos do mesmo host
+SHARED_STATE = APP_MODE in ('api', 'worker')
+# Raiz de uploads/stems/output/banco (disco local; nunca NFS/SMB com api/worker)
+DATA_DIR = os.environ.get('DATA_DIR', '')
 
-for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER, STEMS_FOLDER]:
+UPLOAD_FOLDER = os.path.join(DATA_DIR, 'uploads')
+OUTPUT_FOLDER = os.path.join(DATA_DIR, 'output')
+STEMS_FOLDER = os.path.join(DATA_DIR, 'stems')
+DATABASE_FILE = os.path.join(DATA_DIR, 'analysis.db')
+# Arquivos JSON antigos: importados uma vez para o SQLite e renomeados para *.migrated
+HISTORY_FILE = os.path.join(DATA_DIR, 'analysis_history.json')
+CACHE_FILE = os.path.join(DATA_DIR, 'analysis_cache.json')
+RESULT_CACHE_FILE = os.path.join(DATA_DIR, 'result_cache.json')
+
+# Limite de disco dos stems em cache (LRU); acima disso os menos usados são apagados
+RESULT_CACHE_MAX_BYTES = int(float(os.environ.get('RESULT_CACHE_MAX_GB', '20')) * 1024 ** 3)
+# Renders de pitch/velocidade (/api/process-audio): orçamento de disco próprio e jobs simultâneos
+RENDER_CACHE_MAX_BYTES = int(float(os.environ.get('RENDER_CACHE_MAX_GB', '2')) * 1024 ** 3)
+RENDER_SLOTS = int(os.environ.get('RENDER_SLOTS', '2'))
+RENDER_MAX_QUEUE = int(os.environ.get('RENDER_MAX_QUEUE', '8'))
+RENDERS_FOLDER = os.path.join(OUTPUT_FOLDER, 'renders')
+# Acima desta duração o render lê/grava em blocos (memória constante) em vez de decodificar tudo
+STREAM_RENDER_SECONDS = float(os.environ.get('STREAM_RENDER_SECONDS', '600'))
+# Sessões de pitch/velocidade em tempo real (/api/live) abertas ao mesmo tempo
+LIVE_MAX_SESSIONS = int(os.environ.get('LIVE_MAX_SESSIONS', '8'))
+# Picos da waveform dos uploads (os dos stems ficam em .peaks/ dentro da pasta dos stems)
+PEAKS_FOLDER = os.path.join(OUTPUT_FOLDER, 'peaks')
+# Processos para pitch/velocidade dos stems (/api/stems/process)
+STEM_EFFECT_WORKERS = int(os.environ.get('STEM_EFFECT_WORKERS', '0')) or min(6, os.cpu_count() or 1)
+
+# Stems ficam em pastas com hash do áudio: o navegador pode guardá-los por 1 ano
+STEM_CACHE_MAX_AGE = 365 * 24 * 3600
+
+STEM_TRANSLATIONS = {
+    "vocals": "Vocal",
+    "drums": "Bateria",
+    "bass": "Baixo",
+    "other": "Outros",
+    "guitar": "Guitarra",
+    "piano": "Piano",
+    "instrumental": "Instrumental"
+}
+# Áudio decodificado em memória (float32), compartilhado entre Demucs, acordes e pitch/tempo
+AUDIO_CACHE_MAX_BYTES = int(float(os.environ.get('AUDIO_CACHE_MAX_MB', '1024')) * 1024 ** 2)
+
+# Engine de separação: 'pool' (modelos em memória) ou 'subprocess' (python -m demucs)
+DEMUCS_ENGINE = os.environ.get('DEMUCS_ENGINE', 'pool')
+DEMUCS_PRELOAD = os.environ.get('DEMUCS_PRELOAD', '0') == '1'
+
+# Engines por job (campo 'engine' do /api/separate):
+#   standard - uma chamada ao Demucs para a faixa inteira
+#   chunked  - trechos sobrepostos separados em paralelo num pool de processos
+#   shifts   - passadas de shifts (intermediate/maximum) em processos paralelos, mesma média
+SEPARATION_ENGINES = ['standard', 'chunked', 'shifts']
+# Prévia (campo 'preview' do /api/separate): trecho representativo separado com a config 'basic'
+# antes do job completo; faixas curtas (< 2x o trecho) vão direto para o job completo
+PREVIEW_SECONDS = int(os.environ.get('PREVIEW_SECONDS', str(preview_excerpt.PREVIEW_SECONDS)))
+PREVIEWS_FOLDER = os.path.join(OUTPUT_FOLDER, 'previews')
+# Modo progressivo (campo 'progressive' do /api/separate, engine pool): blocos sequenciais;
+# cada trecho pronto aparece em 'segments' no progresso antes do fim do job
+PROGRESSIVE_BLOCK_SECONDS = float(os.environ.get('PROGRESSIVE_BLOCK_SECONDS', '60'))
+PARALLEL_WORKERS = int(os.environ.get('PARALLEL_WORKERS', '0')) or (os.cpu_count() or 1)
+
+# Saída do CLI do Demucs: linhas guardadas para diagnóstico e regex da barra do tqdm
+DEMUCS_LOG_LINES = 500
+DEMUCS_PROGRESS_RE = re.compile(r'\s*(\d+)%\|')
+
+# CREMA: instâncias do modelo mantidas em memória e tamanho dos lotes do /api/chords/batch
+CREMA_POOL_SIZE = int(os.environ.get('CREMA_POOL_SIZE', '1'))
+CHORDS_BATCH_SIZE = int(os.environ.get('CHORDS_BATCH_SIZE', '8'))
+CHORDS_MAX_QUEUE = int(os.environ.get('CHORDS_MAX_QUEUE', '20'))
+
+# Agendador: separações simultâneas (slots) e tamanho máximo da fila de espera
+SEPARATION_SLOTS = int(os.environ.get('SEPARATION_SLOTS', '0')) or default_slots(
+    threads_per_job=int(os.environ.get('SEPARATION_THREADS_PER_JOB', '4')),
+    memory_per_job_gb=float(os.environ.get('SEPARATION_JOB_MEMORY_GB', '3'))
+)
+SEPARATION_MAX_QUEUE = int(os.environ.get('SEPARATION_MAX_QUEUE', '10'))
+# Threads de CPU por job: divide os cores entre os slots em vez de cada job usar todos
+SEPARATION_THREADS = max(1, (os.cpu_count() or 1) // SEPARATION_SLOTS)
+# Workers (APP_MODE=worker) não têm Flask: com METRICS_PORT servem /metrics nessa porta
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+
+for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER, STEMS_FOLDER, RENDERS_FOLDER, PEAKS_FOLDER, PREVIEWS_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 
 progress_data = {}
-analysis_history = []
-analysis_cache = {}
+progress_broker = ProgressBroker()
 
 # ==================== CONFIGURAÇÕES DE QUALIDADE ====================
 
@@ -110,84 +216,75 @@ QUALITY_CONFIGS_6STEMS = {
 
 # ==================== FUNÇÕES AUXILIARES ====================
 
-def load_history_from_file():
-    global analysis_history
-    try:
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                analysis_history = json.load(f)
-                print(f"✓ Histórico: {len(analysis_history)} análises")
-    except Exception as e:
-        print(f"Erro ao carregar histórico: {e}")
-        analysis_history = []
-
-def save_history_to_file():
-    try:
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(analysis_history, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Erro ao salvar histórico: {e}")
-
-def load_cache_from_file():
-    global analysis_cache
-    try:
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                analysis_cache = json.load(f)
-                print(f"✓ Cache: {len(analysis_cache)} análises")
-    except Exception as e:
-        print(f"Erro ao carregar cache: {e}")
-        analysis_cache = {}
-
-def save_cache_to_file():
-    try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(analysis_cache, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Erro ao salvar cache: {e}")
-
-def update_progress(task_id, step, message, percentage):
-    if task_id in progress_data:
-        progress_data[task_id].update({
-            'step': step,
-            'message': message,
-            'percentage': percentage,
-            'timestamp': datetime.now().isoformat()
-        })
-    else:
-        progress_data[task_id] = {
-            'step': step,
-            'message': message,
-            'percentage': percentage,
-            'timestamp': datetime.now().isoformat()
-        }
-    print(f"  [{percentage}%] {message}")
-
-def add_to_history(filename, stems_count, chords_count, duration, stems=None, chords=None):
-    analysis_history.insert(0, {
-        'filename': filename,
-        'stems_count': stems_count,
-        'chords_count': chords_count,
-        'duration': duration,
+def update_progress(task_id, step, message, percentage, **extra):
+    entry = progress_data.setdefault(task_id, {})
+    entry.update({
+        'step': step,
+        'message': message,
+        'percentage': percentage,
         'timestamp': datetime.now().isoformat()
     })
+    entry.update(extra)
     
-    if len(analysis_history) > 20:
-        analysis_history.pop()
-    save_history_to_file()
-    
-    if stems is not None or chords is not None:
-        analysis_cache[filename] = {
-            'status': 'success',
-            'stems': stems or [],
-            'chords': chords or [],
+    # Estado da task: queued -> running -> done/error
+    if step == -1:
+        entry['state'] = 'error'
+    elif percentage >= 100:
+        entry['state'] = 'done'
+    elif 'state' not in entry:
+        entry['state'] = 'running'
+    if SHARED_STATE:
+        # API e workers leem o progresso do banco (a task pode rodar em outro nó)
+        store.put_progress(task_id, entry)
+    progress_broker.publish(task_id, dict(entry))
+    print(f"  [{percentage}%] {message}")
+
+def add_to_history(filename, stems_count, chords_count, duration, stems=None, chords=None):
+    with metrics.stage_timer('persist_history'):
+        store.add_history({
             'filename': filename,
-            'duration': duration
-        }
-        save_cache_to_file()
+            'stems_count': stems_count,
+            'chords_count': chords_count,
+            'duration': duration,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+        if stems is not None or chords is not None:
+            store.put_analysis(filename, {
+                'status': 'success',
+                'stems': stems or [],
+                'chords': chords or [],
+                'filename': filename,
+                'duration': duration
+            })
+
+store = AnalysisStore(DATABASE_FILE, history_limit=20)
+store.migrate_from_json(HISTORY_FILE, CACHE_FILE, RESULT_CACHE_FILE)
+stem_index = StemIndex(STEMS_FOLDER)
+# Blobs sem nome só são apagados quando nenhum job/sessão os usa (uploads_in_use, seção UPLOADS)
+upload_store = UploadStore(UPLOAD_FOLDER, in_use=lambda: uploads_in_use())
+# Pastas removidas pelo LRU saem também do índice de downloads
+result_cache = ResultCache(store, RESULT_CACHE_MAX_BYTES, prefixes=('sep:', 'chords:'),
+                           on_remove=lambda meta: meta.get('path') and stem_index.invalidate_path(meta['path']))
+render_cache = ResultCache(store, RENDER_CACHE_MAX_BYTES, prefixes=('render:', 'render-stem:'), name='renders')
 
-load_history_from_file()
-load_cache_from_file()
+audio_cache = DecodedAudioCache(AUDIO_CACHE_MAX_BYTES)
+
+def load_mono(path):
+    return audio_cache.get(path, mono=True)
+
+demucs_pool = DemucsModelPool(device='cpu', num_threads=SEPARATION_THREADS,
+                              audio_loader=audio_cache.get_channels)
+crema_pool = CremaChordPool(size=CREMA_POOL_SIZE, audio_loader=load_mono)
+# Só no processo principal (workers 'spawn' reimportam este módulo)
+if DEMUCS_ENGINE == 'pool' and DEMUCS_PRELOAD and multiprocessing.parent_process() is None:
+    # Carrega htdemucs e htdemucs_6s em background para o primeiro job já pegar o modelo quente
+    threading.Thread(
+        target=demucs_pool.preload,
+        args=(sorted({c['model'] for c in QUALITY_CONFIGS.values()} |
+                     {c['model'] for c in QUALITY_CONFIGS_6STEMS.values()}),),
+        daemon=True
+    ).start()
 
 # ==================== ENDPOINTS ====================
 
@@ -195,9 +292,22 @@ load_cache_from_file()
 def health_check():
     return jsonify({
         'status': 'ok',
+        'mode': APP_MODE,
         'message': 'Music Analyzer API UPGRADE',
         'engine': 'Demucs 4.0 (2/4/6 stems + 3 qualidades)',
         'active_tasks': len(progress_data),
+        'demucs_engine': DEMUCS_ENGINE,
+        'loaded_models': demucs_pool.loaded_models(),
+        'progress_streams': progress_broker.connections(),
+        'live_sessions': len(live_sessions),
+        'scheduler': separation_scheduler.stats(),
+        'chords_scheduler': chords_scheduler.stats(),
+        'crema': crema_pool.stats(),
+        'result_cache': result_cache.stats(),
+        'render_cache': render_cache.stats(),
+        'stem_index': stem_index.stats(),
+        'render_scheduler': render_scheduler.stats(),
+        'audio_cache': audio_cache.stats(),
         'features': {
             'stems_options': [2, 4, 6],
             'quality_levels': ['basic', 'intermediate', 'maximum'],
@@ -211,6 +321,8 @@ def debug_tasks():
     tasks_info = {}
     for task_id, data in progress_data.items():
         tasks_info[task_id] = {
+            'state': data.get('state'),
+            'queue_position': data.get('queue_position'),
             'percentage': data.get('percentage', 0),
             'message': data.get('message', ''),
             'has_stems': 'stems' in data,
@@ -218,9 +330,15 @@ def debug_tasks():
         }
     return jsonify({
         'total_tasks': len(progress_data),
+        'scheduler': separation_scheduler.stats(),
         'tasks': tasks_info
     })
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Estatísticas do cache de resultados (hits, misses, tamanho)"""
+    return jsonify(result_cache.stats())
+
 @app.route('/api/quality-info', methods=['GET'])
 def quality_info():
     """Retorna informações sobre configurações de qualidade"""
@@ -256,31 +374,112 @@ def quality_info():
                     '6_stems': QUALITY_CONFIGS_6STEMS['maximum']['time']
                 }
             }
+        },
+        'engines': {
+            'standard': 'Faixa inteira em uma passada do Demucs',
+            'chunked': f'Trechos sobrepostos em paralelo ({PARALLEL_WORKERS} processos)',
+            'shifts': f'Passadas de shift do Demucs em paralelo ({PARALLEL_WORKERS} processos)'
         }
     })
 
+def scheduler_for(task_id):
+    if task_id.startswith('chords_batch_'):
+        return chords_scheduler
+    if task_id.startswith('render_'):
+        return render_scheduler
+    return separation_scheduler
+
+def load_progress(task_id):
+    """Estado da task: banco compartilhado (modo api/worker) ou memória deste processo"""
+    if SHARED_STATE:
+        entry = store.get_progress(task_id)
+        if entry is not None:
+            return entry
+    return progress_data.get(task_id)
+
+def progress_snapshot(task_id):
+    entry = load_progress(task_id)
+    if entry is None:
+        return None
+    data = dict(entry)
+    if data.get('state') == 'queued':
+        data['queue_position'] = scheduler_for(task_id).position(task_id)
+    return data
+
 @app.route('/api/progress/<task_id>', methods=['GET'])
 def get_progress(task_id):
     try:
-        if task_id in progress_data:
-            return jsonify(progress_data[task_id])
+        snapshot = progress_snapshot(task_id)
+        if snapshot is not None:
+            return jsonify(snapshot)
         return jsonify({'error': 'Task not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/progress/<task_id>/stream', methods=['GET'])
+def stream_task_progress(task_id):
+    """Progresso via Server-Sent Events (um evento por update_progress)"""
+    if load_progress(task_id) is None:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    if SHARED_STATE:
+        # Atualizações de workers chegam pelo banco, não pelo broker deste processo
+        events = poll_progress(lambda: progress_snapshot(task_id))
+    else:
+        events = stream_progress(progress_broker, task_id, lambda: progress_snapshot(task_id))
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # nginx: não bufferizar o stream
+        }
+    )
+
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    return jsonify({'history': analysis_history})
+    return jsonify({'history': store.list_history()})
 
 @app.route('/api/analysis/<filename>', methods=['GET'])
 def get_analysis(filename):
     try:
-        if filename in analysis_cache:
-            return jsonify(analysis_cache[filename])
+        analysis = store.get_analysis(filename)
+        if analysis is not None:
+            return jsonify(analysis)
         return jsonify({'error': 'Análise não encontrada'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Pasta de stems (e chave render-stem) trazem o início do hash: <música>-<hash[:12]>-<N>s-<qualidade>
+CONTENT_ID_PATTERN = re.compile(r'-([0-9a-f]{12})-\d+s-')
+
+def content_id(key):
+    """Início (12 caracteres) do hash do áudio de uma chave dos caches, ou None"""
+    kind, _, rest = key.partition(':')
+    if kind in ('sep', 'chords', 'render'):
+        return rest.split(':', 1)[0][:12]
+    match = CONTENT_ID_PATTERN.search(rest)
+    return match.group(1) if match else None
+
+def upload_content_id(filename):
+    try:
+        return upload_store.hash_of(upload_store.name_path(filename))[:12]
+    except (OSError, ValueError):
+        return None
+
+def contents_referenced(exclude):
+    """Áudios (content_id) que históricos/análises de outros nomes ainda servem"""
+    referenced = set()
+    for name in store.referenced_filenames():
+        if name == exclude:
+            continue
+        referenced.add(upload_content_id(name))
+        # Upload já removido: as URLs dos stems salvos ainda apontam para a pasta
+        analysis = store.get_analysis(name) or {}
+        referenced.update(CONTENT_ID_PATTERN.findall(str(analysis.get('stems', ''))))
+    referenced.discard(None)
+    return referenced
+
 @app.route('/api/analysis/<filename>', methods=['DELETE'])
 def delete_analysis(filename):
     try:
@@ -288,29 +487,40 @@ def delete_analysis(filename):
         song_name = Path(filename).stem
         deleted_items = []
         
-        # Deletar stems de TODOS os modelos possíveis
+        # Resultados em cache deste áudio (todas as combinações de stems/qualidade). São por
+        # conteúdo: outro nome com o mesmo áudio usa as mesmas pastas, então só saem quando
+        # nenhum outro histórico/análise aponta para elas
+        own = upload_content_id(filename)
+        shared = contents_referenced(filename)
+        
+        def unreferenced(key, entry):
+            content = content_id(key)
+            mine = entry.get('filename') == filename or (own is not None and content == own)
+            return mine and content not in shared
+        
+        removed = result_cache.remove_where(unreferenced)
+        removed += render_cache.remove_where(unreferenced)
+        if removed:
+            deleted_items.append(f"cache ({len(removed)} resultados)")
+        elif own in shared:
+            print("  ✓ Stems mantidos: mesmo áudio usado por outra análise")
+        
+        # Deletar stems de TODOS os modelos possíveis (pastas antigas, sem hash)
         for model in ['htdemucs', 'htdemucs_6s']:
             stems_path = os.path.join(STEMS_FOLDER, model, song_name)
             if os.path.exists(stems_path):
-                import shutil
                 shutil.rmtree(stems_path)
+                stem_index.invalidate(model, song_name)
                 deleted_items.append(f"stems ({model})")
                 print(f"  ✓ Deletado: {stems_path}")
         
-        # Deletar upload
-        upload_path = os.path.join(UPLOAD_FOLDER, filename)
-        if os.path.exists(upload_path):
-            os.remove(upload_path)
+        # Deletar upload (e o blob, se nenhum outro nome usa o mesmo conteúdo)
+        if upload_store.remove(filename):
             deleted_items.append("arquivo original")
         
         # Remover histórico e cache
-        global analysis_history
-        analysis_history = [item for item in analysis_history if item['filename'] != filename]
-        save_history_to_file()
-        
-        if filename in analysis_cache:
-            del analysis_cache[filename]
-            save_cache_to_file()
+        store.delete_history(filename)
+        store.delete_analysis(filename)
         
         print(f"✓ Deletado com sucesso!")
         return jsonify({
@@ -323,10 +533,522 @@ def delete_analysis(filename):
         print(f"Erro: {e}")
         return jsonify({'error': str(e)}), 500
 
+# ==================== UPLOADS ====================
+
+def uploads_in_use():
+    """Arquivos que jobs (na fila ou rodando) e sessões em tempo real ainda vão ler"""
+    paths = live_sessions.paths()
+    pending = [args for scheduler in (separation_scheduler, chords_scheduler, render_scheduler)
+               for args in scheduler.pending_args()]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, str):
+            paths.append(value)
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            pending.extend(value)
+    return paths
+
+def receive_upload():
+    """
+    Áudio da requisição: upload em partes já concluído (upload_id) ou arquivo do multipart,
+    gravado em streaming com hash. Retorna (caminho do blob, nome, hash) ou None.
+    """
+    upload_id = request.form.get('upload_id')
+    if upload_id:
+        return upload_store.completed(upload_id)
+    file = request.files.get('audio')
+    if file is None or not file.filename:
+        return None
+    filepath, audio_hash, deduplicated = upload_store.ingest(file.stream, file.filename)
+    if deduplicated:
+        print(f"✓ Upload já conhecido: {file.filename} ({audio_hash[:12]})")
+    return filepath, Path(file.filename).name, audio_hash
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """
+    Abre um upload em partes: JSON {filename, size, sha256?}
+
+    Com sha256 de um áudio já guardado a resposta vem com complete=true (nada a enviar).
+    Só clientes da API usam esse atalho: a interface web não calcula o hash antes de enviar.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        status = upload_store.create_session(data.get('filename'), data.get('size', 0),
+                                             data.get('sha256'))
+        return jsonify(status), 200 if status['complete'] else 201
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Quanto já chegou (offset) para retomar um upload interrompido"""
+    try:
+        return jsonify(upload_store.status(upload_id))
+    except UploadNotFoundError:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Corpo cru da parte a partir de ?offset= (lido em streaming, sem bufferizar)"""
+    try:
+        offset = int(request.args.get('offset', request.headers.get('Upload-Offset', '0')))
+        return jsonify(upload_store.append(upload_id, offset, request.stream))
+    except UploadNotFoundError:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+    except UploadOffsetError as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 # ==================== SEPARAÇÃO DE STEMS ====================
 
-def process_separation_async(task_id, filepath, filename, stems_mode, quality_mode):
-    """Processa separação em background com configurações otimizadas"""
+def report_demucs_progress(task_id, demucs_percent, last_progress):
+    """Mapeia 0-100% do Demucs para 20-80% do nosso progresso"""
+    our_percent = 20 + int(demucs_percent * 0.6)
+    if our_percent > last_progress:
+        update_progress(task_id, 3, f"Processando: {demucs_percent}%", our_percent,
+                        demucs_percent=demucs_percent)
+        return our_percent
+    return last_progress
+
+# ==================== PICOS DA WAVEFORM ====================
+
+def stem_peaks_path(stem_path):
+    folder, name = os.path.split(stem_path)
+    return os.path.join(folder, '.peaks', f'{Path(name).stem}.peaks')
+
+def upload_peaks_path(audio_hash):
+    return os.path.join(PEAKS_FOLDER, f'{audio_hash}.peaks')
+
+def write_separation_peaks(model_name, output_name, stems_info, filepath, audio_hash):
+    """Grava os picos de todos os stems e do upload; falhas não derrubam a separação"""
+    start = time.time()
+    stem_files = find_stem_files(model_name, output_name)
+    for stem in stems_info:
+        stem_name = stem['url'].rsplit('/', 1)[-1]
+        try:
+            waveform_peaks.write_file_peaks(stem_files[stem_name], stem_peaks_path(stem_files[stem_name]))
+            stem['peaks_url'] = f'/api/peaks/{model_name}/{output_name}/{stem_name}'
+        except Exception as e:
+            print(f"⚠️  Picos de {stem_name} não gerados: {e}")
+    try:
+        y, sr = audio_cache.get(filepath)
+        waveform_peaks.write_peaks(y, sr, upload_peaks_path(audio_hash))
+    except Exception as e:
+        print(f"⚠️  Picos do upload não gerados: {e}")
+    print(f"✓ Waveforms: {len(stems_info)} stems + original em {time.time() - start:.1f}s")
+
+def send_peaks(path):
+    # Conteúdo derivado de arquivos imutáveis (stem) ou endereçado por hash (upload)
+    response = send_file(os.path.abspath(path), mimetype='application/octet-stream',
+                         conditional=True, etag=True, max_age=STEM_CACHE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/api/peaks/<model>/<song>/<stem>', methods=['GET'])
+def stem_peaks(model, song, stem):
+    """Picos min/max multi-resolução de um stem (formato em waveform_peaks.py)"""
+    try:
+        found = stem_index.lookup(model, song, stem)
+        if found is None:
+            return jsonify({'error': 'Stem não encontrado'}), 404
+        path = stem_peaks_path(found[0])
+        if not os.path.exists(path):
+            # Separações anteriores aos picos: gera na primeira consulta
+            waveform_peaks.write_file_peaks(found[0], path)
+        return send_peaks(path)
+    except FileNotFoundError:
+        stem_index.invalidate(model, song)
+        return jsonify({'error': 'Stem não encontrado'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/peaks/upload/<path:filename>', methods=['GET'])
+def upload_peaks(filename):
+    """Picos min/max multi-resolução do arquivo original"""
+    try:
+        audio_path = os.path.join(UPLOAD_FOLDER, Path(filename).name)
+        if not os.path.isfile(audio_path):
+            return jsonify({'error': 'Not found'}), 404
+        path = upload_peaks_path(upload_store.hash_of(audio_path))
+        if not os.path.exists(path):
+            y, sr = audio_cache.get(audio_path)
+            waveform_peaks.write_peaks(y, sr, path)
+        return send_peaks(path)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def run_demucs_pool(task_id, audio_path, model_name, output_name, config, stems_mode,
+                    progressive=False):
+    """Separa com o modelo mantido em memória (sem subprocess nem recarregar checkpoint)"""
+    last_progress = [20]
+    segments = []
+    
+    def on_progress(demucs_percent):
+        last_progress[0] = report_demucs_progress(task_id, demucs_percent, last_progress[0])
+    
+    def on_segment(entry):
+        segments.append({
+            'index': entry['index'],
+            'start': entry['start'],
+            'end': entry['end'],
+            'stems': [
+                {
+                    'name': STEM_TRANSLATIONS.get(stem_name, stem_name),
+                    'url': f"/api/segments/{model_name}/{output_name}/{entry['index']}/{stem_name}"
+                }
+                for stem_name in entry['stems']
+            ],
+            # Do início da música até o fim deste trecho, num arquivo por stem (o player toca direto)
+            'combined': [
+                {
+                    'name': STEM_TRANSLATIONS.get(stem_name, stem_name),
+                    'url': f"/api/segments/{model_name}/{output_name}/{stem_name}?upto={entry['index'] + 1}"
+                }
+                for stem_name in entry['stems']
+            ]
+        })
+        update_progress(task_id, 3, f"Trecho pronto: até {entry['end']:.0f}s", last_progress[0],
+                        segments=list(segments))
+    
+    out_dir = os.path.join(STEMS_FOLDER, model_name, output_name)
+    # Trechos de uma execução anterior interrompida não podem se misturar aos novos
+    shutil.rmtree(os.path.join(out_dir, SEGMENTS_DIR), ignore_errors=True)
+    demucs_pool.separate(
+        model_name, audio_path, out_dir, config,
+        two_stems='vocals' if stems_mode == '2' else None,
+        progress_callback=on_progress,
+        segment_callback=on_segment if progressive else None,
+        block_seconds=PROGRESSIVE_BLOCK_SECONDS
+    )
+
+def run_demucs_chunked(task_id, audio_path, model_name, output_name, config, stems_mode):
+    """Separa trechos sobrepostos em paralelo e junta com crossfade"""
+    last_progress = [20]
+    
+    def on_progress(demucs_percent):
+        last_progress[0] = report_demucs_progress(task_id, demucs_percent, last_progress[0])
+    
+    out_dir = os.path.join(STEMS_FOLDER, model_name, output_name)
+    parallel_separation.separate_chunked(
+        demucs_pool, model_name, audio_path, out_dir, config,
+        two_stems='vocals' if stems_mode == '2' else None,
+        progress_callback=on_progress,
+        workers=PARALLEL_WORKERS
+    )
+
+def run_demucs_shifts(task_id, audio_path, model_name, output_name, config, stems_mode):
+    """Separa com cada passada de shifts num processo e tira a média (sem bordas)"""
+    last_progress = [20]
+    
+    def on_progress(demucs_percent):
+        last_progress[0] = report_demucs_progress(task_id, demucs_percent, last_progress[0])
+    
+    out_dir = os.path.join(STEMS_FOLDER, model_name, output_name)
+    parallel_separation.separate_shifts(
+        demucs_pool, model_name, audio_path, out_dir, config,
+        two_stems='vocals' if stems_mode == '2' else None,
+        progress_callback=on_progress,
+        workers=PARALLEL_WORKERS
+    )
+
+def pump_output(stream, on_line):
+    """Lê o pipe assim que há bytes e entrega linhas separadas por \\n ou \\r (tqdm usa \\r)"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ''
+    fd = stream.fileno()
+    while True:
+        chunk = os.read(fd, 4096)  # bloqueia só esta thread até haver saída
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        *lines, pending = re.split(r'[\r\n]', pending)
+        for line in lines:
+            if line.strip():
+                on_line(line)
+    pending += decoder.decode(b'', final=True)
+    if pending.strip():
+        on_line(pending)
+    stream.close()
+
+def run_demucs_subprocess(task_id, temp_filepath, model_name, output_name, config, stems_mode):
+    """Executa o CLI do Demucs (python -m demucs) e monitora o progresso"""
+    # Montar comando Demucs
+    cmd = [
+        sys.executable, '-m', 'demucs',
+        '-n', model_name,
+        '--shifts', str(config['shifts']),
+        '--overlap', str(config['overlap']),
+        '--jobs', '0',
+        '--device', 'cpu'
+    ]
+    
+    # Float32 (mais preciso)
+    if config.get('float32', False):
+        cmd.append('--float32')
+    
+    # Segment (para máxima qualidade)
+    if config.get('segment') and config['segment'] != 'default':
+        cmd.extend(['--segment', config['segment']])
+    
+    # MP3 output (menor tamanho)
+    if config.get('mp3', False):
+        cmd.append('--mp3')
+        if config.get('mp3_bitrate'):
+            cmd.extend(['--mp3-bitrate', str(config['mp3_bitrate'])])
+    
+    # 2 stems (vocals + instrumental)
+    if stems_mode == '2':
+        cmd.extend(['--two-stems', 'vocals'])
+    
+    cmd.extend(['--filename', f'{output_name}/{{stem}}.{{ext}}'])
+    cmd.extend(['--out', STEMS_FOLDER, temp_filepath])
+    print(f"   Comando: {' '.join(cmd)}\n")
+    
+    # Limitar threads do torch ao slot deste job
+    env = dict(os.environ)
+    env['OMP_NUM_THREADS'] = str(SEPARATION_THREADS)
+    env['MKL_NUM_THREADS'] = str(SEPARATION_THREADS)
+    
+    # Pipes binários sem buffer: os leitores recebem o texto assim que é escrito
+    process = subprocess.Popen(
+        cmd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0
+    )
+    
+    # Monitorar progresso em tempo real (uma thread por pipe, sem polling)
+    stderr_output = deque(maxlen=DEMUCS_LOG_LINES)
+    stdout_output = deque(maxlen=DEMUCS_LOG_LINES)
+    last_progress = [20]
+    
+    def on_stderr_line(line):
+        stderr_output.append(line)
+        # Barra do tqdm (ex: "  15%|###...")
+        match = DEMUCS_PROGRESS_RE.match(line)
+        if match:
+            demucs_percent = int(match.group(1))
+            last_progress[0] = report_demucs_progress(task_id, demucs_percent, last_progress[0])
+    
+    readers = [
+        threading.Thread(target=pump_output, args=(process.stderr, on_stderr_line), daemon=True),
+        threading.Thread(target=pump_output, args=(process.stdout, stdout_output.append), daemon=True)
+    ]
+    for reader in readers:
+        reader.start()
+    
+    print("Monitorando progresso do Demucs...")
+    # Conclusão = fim do processo (os stems são verificados em disco pelo chamador)
+    result_code = process.wait()
+    for reader in readers:
+        reader.join()
+    
+    stderr_text = '\n'.join(stderr_output)
+    
+    print(f"Processo Demucs terminou com código: {result_code}")
+    
+    # Debug: verificar se há mensagens de erro específicas
+    if result_code != 0:
+        print(f"\n⚠️  AVISO: Demucs retornou código de erro {result_code}")
+        stderr_lower = stderr_text.lower()
+        if "out of memory" in stderr_lower or "memory" in stderr_lower:
+            print("  ❌ ERRO DE MEMÓRIA detectado!")
+        if "permission" in stderr_lower:
+            print("  ❌ ERRO DE PERMISSÃO detectado!")
+        if "no space" in stderr_lower or "disk" in stderr_lower:
+            print("  ❌ ERRO DE ESPAÇO EM DISCO detectado!")
+    
+    return result_code
+
+def select_separation_config(stems_mode, quality_mode):
+    """Retorna (config, modelo) para a combinação stems/qualidade"""
+    if stems_mode == '6':
+        return QUALITY_CONFIGS_6STEMS[quality_mode], 'htdemucs_6s'
+    config = QUALITY_CONFIGS[quality_mode]
+    return config, config['model']
+
+def separation_output_name(filename, audio_hash, stems_mode, quality_mode, engine='standard'):
+    """Pasta dos stems: única por conteúdo + parâmetros (mesmo nome não sobrescreve outra música)"""
+    song_name = '_'.join(Path(filename).stem.split())
+    output_name = f"{song_name}-{audio_hash[:12]}-{stems_mode}s-{quality_mode}"
+    return output_name if engine == 'standard' else f"{output_name}-{engine}"
+
+def build_stems_info(model_name, output_name, files):
+    """[{name, url}] dos stems da pasta (WAV tem prioridade sobre MP3)"""
+    stems_info = []
+    stem_names_added = set()
+    for ext in ['.wav', '.mp3']:
+        for stem_file in files:
+            if stem_file.endswith(ext):
+                stem_name = Path(stem_file).stem
+                if stem_name not in stem_names_added:
+                    translated = STEM_TRANSLATIONS.get(stem_name, stem_name)
+                    stems_info.append({
+                        'name': translated,
+                        'url': f'/api/download/{model_name}/{output_name}/{stem_name}'
+                    })
+                    stem_names_added.add(stem_name)
+    return stems_info
+
+QUALITY_ORDER = ['basic', 'intermediate', 'maximum']
+
+def find_derivable_separation(audio_hash, stems_mode, quality_mode):
+    """
+    Separação em cache do mesmo áudio com mais stems e qualidade igual ou maior
+
+    Retorna (chave, entrada, mapeamento) da melhor candidata ou None.
+    """
+    candidates = []
+    for key, entry in result_cache.find(lambda key, meta: key.startswith(f'sep:{audio_hash}:')):
+        if entry.get('kind') != 'separation' or entry.get('quality_mode') not in QUALITY_ORDER:
+            continue
+        if QUALITY_ORDER.index(entry['quality_mode']) < QUALITY_ORDER.index(quality_mode):
+            continue
+        mapping = stem_derivation.stem_mapping(stems_mode, entry.get('stems_mode'))
+        if mapping and os.path.isdir(entry.get('path', '')):
+            # Melhor qualidade primeiro; no empate, menos stems (mesmo modelo: 4 antes de 6)
+            rank = (-QUALITY_ORDER.index(entry['quality_mode']), int(entry['stems_mode']))
+            candidates.append((rank, key, entry, mapping))
+    if not candidates:
+        return None
+    _, key, entry, mapping = min(candidates, key=lambda candidate: candidate[0])
+    return key, entry, mapping
+
+def derive_separation(filepath, filename, audio_hash, stems_mode, quality_mode, engine):
+    """
+    Monta stems_mode somando stems de uma separação maior já feita (sem Demucs)
+
+    Grava no cache com a chave pedida, então o próximo pedido igual é um cache hit comum.
+    Retorna a entrada do cache ou None se não houver separação compatível.
+    """
+    found = find_derivable_separation(audio_hash, stems_mode, quality_mode)
+    if found is None:
+        return None
+    source_key, source, mapping = found
+    
+    _, model_name = select_separation_config(stems_mode, quality_mode)
+    output_name = separation_output_name(filename, audio_hash, stems_mode, quality_mode, engine)
+    out_dir = os.path.join(STEMS_FOLDER, model_name, output_name)
+    with metrics.stage_timer('derive_stems', stems_mode=stems_mode, quality_mode=quality_mode,
+                             model=source.get('model', '')):
+        stem_derivation.derive_stems(stem_derivation.stem_files(source['path']), mapping, out_dir)
+    stem_index.invalidate(model_name, output_name)
+    
+    stems_info = build_stems_info(model_name, output_name, os.listdir(out_dir))
+    write_separation_peaks(model_name, output_name, stems_info, filepath, audio_hash)
+    entry = {
+        'kind': 'separation',
+        'path': out_dir,
+        'stems': stems_info,
+        'filename': filename,
+        'model': model_name,
+        'stems_mode': stems_mode,
+        'quality_mode': quality_mode,
+        'engine': engine,
+        'duration': source.get('duration', 0),
+        'derived_from': source_key
+    }
+    result_cache.put(separation_key(audio_hash, model_name, stems_mode, quality_mode, engine), entry)
+    print(f"✓ {stems_mode} stems derivados de {source['stems_mode']} stems ({source['quality_mode']}): {filename}")
+    return entry
+
+def run_preview_separation(task_id, filepath, filename, stems_mode, audio_hash):
+    """
+    Separa só o trecho representativo com a config 'basic' (segundos, não minutos)
+
+    Sempre usa o pool em memória. Retorna {stems, start, end, ...} ou None se não valer a pena.
+    """
+    config, model_name = select_separation_config(stems_mode, 'basic')
+    key = separation_key(audio_hash, model_name, stems_mode, 'basic', 'preview')
+    cached = result_cache.get(key)
+    if cached:
+        print(f"✓ Prévia em cache: {filename}")
+        return cached['preview']
+    
+    if audio_duration(filepath) < PREVIEW_SECONDS * 2:
+        return None
+    
+    start_time = time.time()
+    y, sr = audio_cache.get(filepath)
+    start, end = preview_excerpt.select_excerpt(y, sr, PREVIEW_SECONDS)
+    print(f"🎧 Prévia: trecho {start:.1f}s-{end:.1f}s (config basic)")
+    update_progress(task_id, 1, f"Prévia: separando trecho {start:.0f}s-{end:.0f}s...", 5)
+    
+    excerpt_path = preview_excerpt.write_excerpt(
+        y, sr, start, end, os.path.join(PREVIEWS_FOLDER, f'{audio_hash}-{stems_mode}s.wav'))
+    output_name = separation_output_name(filename, audio_hash, stems_mode, 'basic', 'preview')
+    out_dir = os.path.join(STEMS_FOLDER, model_name, output_name)
+    
+    def on_progress(demucs_percent):
+        update_progress(task_id, 1, f"Prévia: {demucs_percent}%", 5 + int(demucs_percent * 0.14))
+    
+    try:
+        demucs_pool.separate(
+            model_name, excerpt_path, out_dir, config,
+            two_stems='vocals' if stems_mode == '2' else None,
+            progress_callback=on_progress
+        )
+    finally:
+        if os.path.exists(excerpt_path):
+            os.remove(excerpt_path)
+    stem_index.invalidate(model_name, output_name)
+    
+    preview = {
+        'stems': build_stems_info(model_name, output_name, os.listdir(out_dir)),
+        'start': round(start, 2),
+        'end': round(end, 2),
+        'model': model_name,
+        'processing_time': round(time.time() - start_time, 2)
+    }
+    result_cache.put(key, {
+        'kind': 'preview',
+        'path': out_dir,
+        'stems': preview['stems'],
+        'preview': preview,
+        'filename': filename,
+        'model': model_name,
+        'stems_mode': stems_mode,
+        'quality_mode': 'basic',
+        'engine': 'preview'
+    })
+    print(f"✓ Prévia pronta em {preview['processing_time']:.1f}s ({len(preview['stems'])} stems)")
+    return preview
+
+def process_separation_async(task_id, filepath, filename, stems_mode, quality_mode, audio_hash,
+                             engine='standard', preview=False, progressive=False):
+    """Processa separação em background (etapas medidas com os labels stems/qualidade/modelo)"""
+    _, model_name = select_separation_config(stems_mode, quality_mode)
+    with metrics.job_labels(stems_mode=stems_mode, quality_mode=quality_mode, model=model_name), \
+            metrics.stage_timer('separation_job'):
+        run_separation(task_id, filepath, filename, stems_mode, quality_mode, audio_hash,
+                       engine, preview, progressive)
+
+def derive_separation_async(task_id, filepath, filename, stems_mode, quality_mode, audio_hash,
+                            engine='standard', preview=False, progressive=False):
+    """Stems somados de uma separação maior; sem candidata (ou se falhar) faz a separação normal"""
+    update_progress(task_id, 2, "Derivando stems de uma separação maior...", 50)
+    try:
+        derived = derive_separation(filepath, filename, audio_hash, stems_mode, quality_mode, engine)
+    except Exception as e:
+        print(f"⚠️  Falha ao derivar stems, seguindo com a separação: {e}")
+        derived = None
+    if derived is None:
+        process_separation_async(task_id, filepath, filename, stems_mode, quality_mode, audio_hash,
+                                 engine, preview, progressive)
+        return
+    update_progress(task_id, 4, f"Concluído (derivado)! {len(derived['stems'])} stems", 100,
+                    stems=derived['stems'], processing_time=0, model_used=derived['model'],
+                    cached=True, derived_from=derived['derived_from'])
+    add_to_history(filename, len(derived['stems']), 0, derived['duration'], derived['stems'], None)
+
+def run_separation(task_id, filepath, filename, stems_mode, quality_mode, audio_hash,
+                   engine, preview, progressive):
     try:
         song_name = Path(filename).stem.strip()
         song_name = ' '.join(song_name.split())
@@ -336,55 +1058,32 @@ def process_separation_async(task_id, filepath, filename, stems_mode, quality_mo
         print(f"   Stems: {stems_mode} | Qualidade: {quality_mode}")
         print(f"{'='*60}")
         
-        # Criar arquivo temporário sem espaços (bug do Demucs)
+        # Criar arquivo temporário sem espaços (bug do Demucs); blobs (<hash>.<ext>) já não têm
         temp_filepath = filepath
-        if ' ' in song_name:
+        if ' ' in os.path.basename(filepath):
             temp_name = song_name.replace(' ', '_')
             temp_filename = f"{temp_name}{Path(filename).suffix}"
             temp_filepath = os.path.join(UPLOAD_FOLDER, temp_filename)
-            import shutil
             shutil.copy2(filepath, temp_filepath)
             song_name = temp_name
         
         update_progress(task_id, 1, f"Iniciando...", 5)
         
-        # Selecionar configuração
-        if stems_mode == '6':
-            config = QUALITY_CONFIGS_6STEMS[quality_mode]
-            model_name = 'htdemucs_6s'
-        else:
-            config = QUALITY_CONFIGS[quality_mode]
-            model_name = config['model']
-        
-        # Montar comando Demucs
-        cmd = [
-            sys.executable, '-m', 'demucs',
-            '-n', model_name,
-            '--shifts', str(config['shifts']),
-            '--overlap', str(config['overlap']),
-            '--jobs', '0',
-            '--device', 'cpu'
-        ]
-        
-        # Float32 (mais preciso)
-        if config.get('float32', False):
-            cmd.append('--float32')
-        
-        # Segment (para máxima qualidade)
-        if config.get('segment') and config['segment'] != 'default':
-            cmd.extend(['--segment', config['segment']])
-        
-        # MP3 output (menor tamanho)
-        if config.get('mp3', False):
-            cmd.append('--mp3')
-            if config.get('mp3_bitrate'):
-                cmd.extend(['--mp3-bitrate', str(config['mp3_bitrate'])])
-        
-        # 2 stems (vocals + instrumental)
-        if stems_mode == '2':
-            cmd.extend(['--two-stems', 'vocals'])
+        # Prévia: o usuário ouve um trecho enquanto a separação completa roda na mesma task
+        if preview:
+            try:
+                with metrics.job_labels(quality_mode='basic'), metrics.stage_timer('preview'):
+                    preview_data = run_preview_separation(task_id, filepath, filename, stems_mode,
+                                                          audio_hash)
+                if preview_data:
+                    update_progress(task_id, 1, "Prévia pronta! Separando a música inteira...", 19,
+                                    preview=preview_data)
+            except Exception as e:
+                print(f"⚠️  Prévia falhou, seguindo com a separação completa: {e}")
         
-        cmd.extend(['--out', STEMS_FOLDER, temp_filepath])
+        # Selecionar configuração
+        config, model_name = select_separation_config(stems_mode, quality_mode)
+        output_name = separation_output_name(filename, audio_hash, stems_mode, quality_mode, engine)
         
         # Estimativa de tempo
         if stems_mode == '6':
@@ -394,108 +1093,32 @@ def process_separation_async(task_id, filepath, filename, stems_mode, quality_mo
             time_estimate = config.get(time_key, '5-10 min')
         
         print(f"\n🔧 Configuração:")
+        print(f"   Engine: {engine if engine != 'standard' else DEMUCS_ENGINE}")
         print(f"   Modelo: {model_name}")
         print(f"   Shifts: {config['shifts']} | Overlap: {config['overlap']}")
         print(f"   Tempo estimado: {time_estimate}")
-        print(f"   Comando: {' '.join(cmd)}\n")
         
         update_progress(task_id, 2, f"Processando ({quality_mode}) - {time_estimate}", 20)
         
         start_time = time.time()
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-        
-        # Monitorar progresso em tempo real
-        stderr_output = []
-        stdout_output = []
-        last_progress = 20
-        max_wait_after_100 = 30  # Esperar 30s após 100%
-        time_at_100 = None
-        
-        print("Monitorando progresso do Demucs...")
-        while True:
-            # Ler stderr (onde o Demucs mostra progresso)
-            stderr_line = process.stderr.readline() if process.stderr else None
-            if stderr_line:
-                stderr_output.append(stderr_line)
-                # Procurar por porcentagem no output
-                if '%|' in stderr_line:
-                    try:
-                        # Extrair porcentagem (ex: "  15%|###...")
-                        percent_str = stderr_line.strip().split('%')[0].strip()
-                        if percent_str.isdigit():
-                            demucs_percent = int(percent_str)
-                            # Mapear 0-100% do Demucs para 20-80% do nosso progresso
-                            our_percent = 20 + int(demucs_percent * 0.6)
-                            if our_percent > last_progress:
-                                last_progress = our_percent
-                                update_progress(task_id, 3, f"Processando: {demucs_percent}%", our_percent)
-                            
-                            # Marcar quando chegou a 100%
-                            if demucs_percent >= 100 and time_at_100 is None:
-                                time_at_100 = time.time()
-                                print("Demucs chegou a 100%, aguardando finalização...")
-                    except Exception as e:
-                        pass
-            
-            # Verificar se processo terminou
-            poll_result = process.poll()
-            if poll_result is not None:
-                print(f"Processo Demucs terminou com código: {poll_result}")
-                # Ler qualquer saída restante
-                if process.stdout:
-                    remaining_stdout = process.stdout.readlines()
-                    stdout_output.extend(remaining_stdout)
-                if process.stderr:
-                    remaining_stderr = process.stderr.readlines()
-                    stderr_output.extend(remaining_stderr)
-                break
-            
-            # Timeout: se chegou a 100% há mais de X segundos, forçar saída
-            if time_at_100 is not None:
-                elapsed_since_100 = time.time() - time_at_100
-                if elapsed_since_100 > max_wait_after_100:
-                    print(f"TIMEOUT: Processo não finalizou após {max_wait_after_100}s em 100%")
-                    print("Forçando continuação...")
-                    # Tentar terminar o processo
-                    try:
-                        process.terminate()
-                        time.sleep(1)
-                        if process.poll() is None:
-                            process.kill()
-                    except:
-                        pass
-                    break
-            
-            # Pequeno delay para não sobrecarregar CPU
-            time.sleep(0.1)
-        
+        if engine == 'chunked':
+            with metrics.stage_timer('demucs_chunked'):
+                run_demucs_chunked(task_id, temp_filepath, model_name, output_name, config, stems_mode)
+        elif engine == 'shifts':
+            with metrics.stage_timer('demucs_shifts'):
+                run_demucs_shifts(task_id, temp_filepath, model_name, output_name, config, stems_mode)
+        elif DEMUCS_ENGINE == 'pool':
+            # Carga do modelo e inferência são medidas separadamente no pool
+            run_demucs_pool(task_id, temp_filepath, model_name, output_name, config, stems_mode,
+                            progressive)
+        else:
+            with metrics.stage_timer('demucs_subprocess'):
+                run_demucs_subprocess(task_id, temp_filepath, model_name, output_name, config,
+                                      stems_mode)
         elapsed = time.time() - start_time
-        result_code = process.returncode
-        
-        stdout_text = ''.join(stdout_output)
-        stderr_text = ''.join(stderr_output)
         
         print(f"\nDemucs finalizado às {datetime.now().strftime('%H:%M:%S')}")
         print(f"Tempo decorrido: {elapsed:.1f}s")
-        print(f"Return code: {result_code}")
-        
-        # Debug: verificar se há mensagens de erro específicas
-        if result_code != 0:
-            print(f"\n⚠️  AVISO: Demucs retornou código de erro {result_code}")
-            stderr_lower = stderr_text.lower()
-            if "out of memory" in stderr_lower or "memory" in stderr_lower:
-                print("  ❌ ERRO DE MEMÓRIA detectado!")
-            if "permission" in stderr_lower:
-                print("  ❌ ERRO DE PERMISSÃO detectado!")
-            if "no space" in stderr_lower or "disk" in stderr_lower:
-                print("  ❌ ERRO DE ESPAÇO EM DISCO detectado!")
         
         # IMPORTANTE: Mesmo com erro, verificar se stems foram gerados
         print(f"\n{'='*60}")
@@ -503,7 +1126,7 @@ def process_separation_async(task_id, filepath, filename, stems_mode, quality_mo
         print(f"{'='*60}")
         
         # Localizar pasta de stems (suporta htdemucs e htdemucs_6s)
-        stems_base = os.path.join(STEMS_FOLDER, model_name, song_name)
+        stems_base = os.path.join(STEMS_FOLDER, model_name, output_name)
         
         print(f"Procurando em: {stems_base}")
         
@@ -523,6 +1146,7 @@ def process_separation_async(task_id, filepath, filename, stems_mode, quality_mo
         update_progress(task_id, 3, "Processando stems...", 80)
         
         # Listar stems
+        listing_start = time.perf_counter()
         files = os.listdir(stems_base)
         
         # VERIFICAÇÃO CRÍTICA: Pasta existe mas está vazia?
@@ -535,44 +1159,34 @@ def process_separation_async(task_id, filepath, filename, stems_mode, quality_mo
         
         print(f"✓ Encontrados {len(files)} arquivos")
         
-        stems_info = []
-        stem_names_added = set()
-        
-        stem_translations = {
-            "vocals": "Vocal",
-            "drums": "Bateria",
-            "bass": "Baixo",
-            "other": "Outros",
-            "guitar": "Guitarra",
-            "piano": "Piano",
-            "instrumental": "Instrumental"
-        }
+        stems_info = build_stems_info(model_name, output_name, files)
+        metrics.observe_stage('stem_listing', time.perf_counter() - listing_start)
+        
+        # Pasta (re)escrita: o próximo download relê a listagem
+        stem_index.invalidate(model_name, output_name)
+        
+        # Stems completos gravados: os trechos progressivos não são mais necessários
+        shutil.rmtree(os.path.join(stems_base, SEGMENTS_DIR), ignore_errors=True)
+        
+        # Picos da waveform de cada stem e da faixa original (o frontend desenha sem baixar o áudio)
+        update_progress(task_id, 3, "Gerando waveforms...", 85)
+        with metrics.stage_timer('waveform_peaks'):
+            write_separation_peaks(model_name, output_name, stems_info, filepath, audio_hash)
         
-        # Priorizar WAV, depois MP3
-        for ext in ['.wav', '.mp3']:
-            for stem_file in files:
-                if stem_file.endswith(ext):
-                    stem_name = Path(stem_file).stem
-                    if stem_name not in stem_names_added:
-                        translated = stem_translations.get(stem_name, stem_name)
-                        stems_info.append({
-                            'name': translated,
-                            'url': f'/api/download/{model_name}/{song_name}/{stem_name}'
-                        })
-                        stem_names_added.add(stem_name)
-        
-        # Duração
+        # Duração (cabeçalho do arquivo, sem decodificar)
         try:
-            y, sr = librosa.load(filepath, duration=10)
-            duration = len(y) / sr
+            duration = audio_duration(filepath)
             print(f"✓ Duração: {duration:.2f}s")
-        except:
+        except Exception:
             duration = 0
         
         # IMPORTANTE: Salvar stems ANTES de atualizar para 100%
         # para evitar race condition com o frontend
         print("\nSalvando resultado no progress_data...")
         progress_data[task_id]['stems'] = stems_info
+        # Resultado completo substitui a prévia e os trechos progressivos
+        progress_data[task_id].pop('preview', None)
+        progress_data[task_id].pop('segments', None)
         progress_data[task_id]['processing_time'] = elapsed
         progress_data[task_id]['model_used'] = model_name
         print(f"✓ Dados salvos! Stems disponíveis: {len(stems_info)}")
@@ -584,6 +1198,19 @@ def process_separation_async(task_id, filepath, filename, stems_mode, quality_mo
         # Adicionar ao histórico
         add_to_history(filename, len(stems_info), 0, duration, stems_info, None)
         
+        # Cache por conteúdo: próximo upload do mesmo áudio não roda o Demucs
+        result_cache.put(separation_key(audio_hash, model_name, stems_mode, quality_mode, engine), {
+            'kind': 'separation',
+            'path': stems_base,
+            'stems': stems_info,
+            'filename': filename,
+            'model': model_name,
+            'stems_mode': stems_mode,
+            'quality_mode': quality_mode,
+            'engine': engine,
+            'duration': duration
+        })
+        
         # Limpar temporário
         if temp_filepath != filepath and os.path.exists(temp_filepath):
             os.remove(temp_filepath)
@@ -602,48 +1229,124 @@ def process_separation_async(task_id, filepath, filename, stems_mode, quality_mo
         traceback.print_exc()
         update_progress(task_id, -1, f"Erro: {str(e)}", 0)
 
+def on_job_start(task_id, waited):
+    """Chamado pelo agendador quando o job sai da fila e ganha um slot"""
+    metrics.observe_stage('queue_wait', waited)
+    update_progress(task_id, 1, "Iniciando...", 1, state='running',
+                    queue_position=0, queue_wait=round(waited, 2))
+
+def on_job_queue_change(queued_ids):
+    for position, queued_id in enumerate(queued_ids, 1):
+        if queued_id in progress_data:
+            update_progress(queued_id, 0, f"Na fila (posição {position})", 0,
+                            state='queued', queue_position=position)
+
+def queue_full_response(message=None, scheduler=None):
+    stats = (scheduler or separation_scheduler).stats()
+    response = jsonify({
+        'status': 'rejected',
+        'error': message or 'Servidor ocupado: fila cheia',
+        'queued': stats['queued'],
+        'max_queue': stats['max_queue']
+    })
+    response.headers['Retry-After'] = '30'
+    return response, 429
+
+if SHARED_STATE:
+    # Posição na fila é calculada na leitura do progresso (progress_snapshot)
+    separation_scheduler = SharedJobQueue(store, SEPARATION_MAX_QUEUE, name='separation')
+else:
+    separation_scheduler = JobScheduler(
+        slots=SEPARATION_SLOTS,
+        max_queue=SEPARATION_MAX_QUEUE,
+        on_start=on_job_start,
+        on_queue_change=on_job_queue_change,
+        name='separation'
+    )
+
 @app.route('/api/separate', methods=['POST'])
 def separate_audio():
     """Endpoint para separação com validação de parâmetros"""
     try:
-        if 'audio' not in request.files:
+        if 'audio' not in request.files and not request.form.get('upload_id'):
             return jsonify({'error': 'Arquivo não enviado'}), 400
         
-        file = request.files['audio']
-        if not file.filename:
-            return jsonify({'error': 'Nome vazio'}), 400
-        
         # Parâmetros
         stems_mode = request.form.get('stems_mode', '4')
         quality_mode = request.form.get('quality_mode', 'intermediate')
+        engine = request.form.get('engine', 'standard')
+        preview = request.form.get('preview', '0').lower() in ('1', 'true', 'yes')
+        # Trechos progressivos só existem no engine pool padrão (subprocess e chunked gravam tudo no fim)
+        progressive = (request.form.get('progressive', '0').lower() in ('1', 'true', 'yes')
+                       and engine == 'standard' and DEMUCS_ENGINE == 'pool')
         
         # Validações
         if stems_mode not in ['2', '4', '6']:
             stems_mode = '4'
         if quality_mode not in ['basic', 'intermediate', 'maximum']:
             quality_mode = 'intermediate'
+        if engine not in SEPARATION_ENGINES:
+            engine = 'standard'
         
         task_id = f"separate_{int(time.time() * 1000)}"
-        filename = file.filename
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        
-        update_progress(task_id, 0, "Iniciando...", 0)
-        
-        thread = threading.Thread(
-            target=process_separation_async,
-            args=(task_id, filepath, filename, stems_mode, quality_mode)
-        )
-        thread.daemon = True
-        thread.start()
+        received = receive_upload()
+        if received is None:
+            return jsonify({'error': 'Nome vazio'}), 400
+        filepath, filename, audio_hash = received
+        
+        # Cache por conteúdo: mesmo áudio + mesmos parâmetros = resposta imediata
+        _, model_name = select_separation_config(stems_mode, quality_mode)
+        cached = result_cache.get(separation_key(audio_hash, model_name, stems_mode, quality_mode, engine))
+        if cached:
+            print(f"✓ Cache hit: {filename} ({stems_mode} stems, {quality_mode})")
+            update_progress(task_id, 4, f"Concluído (cache)! {len(cached['stems'])} stems", 100,
+                            stems=cached['stems'], processing_time=0, model_used=model_name, cached=True)
+            add_to_history(filename, len(cached['stems']), 0, cached.get('duration', 0), cached['stems'], None)
+            return jsonify({
+                'status': 'success',
+                'cached': True,
+                'task_id': task_id,
+                'stems': cached['stems'],
+                'stems_mode': stems_mode,
+                'quality_mode': quality_mode,
+                'engine': engine
+            })
+        
+        # Separação com mais stems já feita: soma os stems em vez de rodar o Demucs (task curta na fila)
+        derivable = find_derivable_separation(audio_hash, stems_mode, quality_mode) is not None
+        job = derive_separation_async if derivable else process_separation_async
+        
+        # Admissão: só misses ocupam a fila de separação
+        if separation_scheduler.is_full():
+            return queue_full_response()
+        
+        update_progress(task_id, 0, "Na fila...", 0, state='queued')
+        try:
+            position = separation_scheduler.submit(
+                task_id, job,
+                task_id, filepath, filename, stems_mode, quality_mode, audio_hash, engine, preview,
+                progressive
+            )
+        except QueueFullError as e:
+            progress_data.pop(task_id, None)
+            return queue_full_response(str(e))
         
         return jsonify({
-            'status': 'processing',
+            'status': 'queued',
             'task_id': task_id,
+            'queue_position': position,
             'stems_mode': stems_mode,
-            'quality_mode': quality_mode
+            'quality_mode': quality_mode,
+            'engine': engine,
+            'preview': preview,
+            'progressive': progressive,
+            'derived': derivable
         })
         
+    except UploadNotFoundError:
+        return jsonify({'error': 'Upload não encontrado ou incompleto'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -667,40 +1370,40 @@ def convert_chord_notation(harte_chord):
     converted_quality = quality_map.get(quality, quality)
     return f"{root}{converted_quality}"
 
+def annotation_to_chords(chord_annotation):
+    """Converte a anotação JAMS do CREMA em [{'start', 'end', 'chord'}] sem repetições"""
+    chords = []
+    prev_chord = None
+    
+    for observation in chord_annotation.data:
+        chord_label = observation.value
+        
+        if chord_label == 'N' or chord_label == 'X':
+            continue
+        
+        start_time = float(observation.time)
+        end_time = float(observation.time + observation.duration)
+        chord_name = convert_chord_notation(chord_label)
+        
+        if chord_name != prev_chord:
+            chords.append({
+                'start': start_time,
+                'end': end_time,
+                'chord': chord_name
+            })
+            prev_chord = chord_name
+        else:
+            if chords:
+                chords[-1]['end'] = end_time
+    
+    return chords
+
 def detect_chords_with_crema(audio_path):
     """Detecta acordes usando CREMA (Deep Learning)"""
     try:
-        import crema
-        import numpy as np
-        
-        print("✓ CREMA carregado com sucesso!")
         print("🎵 Usando CREMA (Deep Learning)...")
-        model = crema.models.chord.ChordModel()
-        chord_annotation = model.predict(filename=audio_path)
-        
-        chords = []
-        prev_chord = None
-        
-        for observation in chord_annotation.data:
-            chord_label = observation.value
-            
-            if chord_label == 'N' or chord_label == 'X':
-                continue
-            
-            start_time = float(observation.time)
-            end_time = float(observation.time + observation.duration)
-            chord_name = convert_chord_notation(chord_label)
-            
-            if chord_name != prev_chord:
-                chords.append({
-                    'start': start_time,
-                    'end': end_time,
-                    'chord': chord_name
-                })
-                prev_chord = chord_name
-            else:
-                if chords:
-                    chords[-1]['end'] = end_time
+        chord_annotation = crema_pool.predict(audio_path)
+        chords = annotation_to_chords(chord_annotation)
         
         print(f"✓ CREMA detectou {len(chords)} acordes")
         return chords, 'crema'
@@ -715,67 +1418,13 @@ def detect_chords_with_crema(audio_path):
         return detect_chords_chroma(audio_path), 'chroma_enhanced'
 
 def detect_chords_chroma(audio_path):
-    """Detecção de acordes usando análise de chroma (fallback)"""
+    """Detecção de acordes usando análise de chroma (fallback, faixa inteira)"""
     try:
-        y, sr = librosa.load(audio_path, duration=180, sr=22050)
-        chroma = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=2048, bins_per_octave=36)
-        
-        notes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        hop_length = 2048
-        frames_per_segment = int(2 * sr / hop_length)
-        
-        chords = []
-        prev_chord = None
-        
-        for i in range(0, chroma.shape[1], frames_per_segment):
-            segment = chroma[:, i:i+frames_per_segment]
-            if segment.shape[1] == 0:
-                continue
-            
-            chroma_mean = segment.mean(axis=1)
-            chroma_mean = chroma_mean / (chroma_mean.max() + 1e-6)
-            
-            threshold = 0.3
-            active_notes = chroma_mean > threshold
-            
-            if active_notes.sum() < 2:
-                continue
-            
-            root_idx = chroma_mean.argmax()
-            root_note = notes[root_idx]
-            
-            third_major_idx = (root_idx + 4) % 12
-            third_minor_idx = (root_idx + 3) % 12
-            fifth_idx = (root_idx + 7) % 12
-            
-            third_major = chroma_mean[third_major_idx]
-            third_minor = chroma_mean[third_minor_idx]
-            fifth = chroma_mean[fifth_idx]
-            
-            if third_major > third_minor + 0.1:
-                chord_quality = 'maj'
-            elif third_minor > third_major + 0.1:
-                chord_quality = 'min'
-            else:
-                chord_quality = '5' if fifth > 0.4 else 'maj'
-            
-            harte_notation = f'{root_note}:{chord_quality}'
-            chord_name = convert_chord_notation(harte_notation)
-            
-            start_time = i * hop_length / sr
-            end_time = min((i + frames_per_segment) * hop_length / sr, len(y) / sr)
-            
-            if chord_name != prev_chord:
-                chords.append({
-                    'start': float(start_time),
-                    'end': float(end_time),
-                    'chord': chord_name
-                })
-                prev_chord = chord_name
-            else:
-                if chords:
-                    chords[-1]['end'] = float(end_time)
-        
+        y, sr = audio_cache.get(audio_path, sr=chord_recognizer.SAMPLE_RATE, mono=True)
+        with metrics.stage_timer('chords_chroma', model='chroma'):
+            chords = chord_recognizer.recognize_audio(y, sr)
+        for chord in chords:
+            chord['chord'] = convert_chord_notation(chord['chord'])
         return chords
         
     except Exception as e:
@@ -787,19 +1436,33 @@ def detect_chords():
     """Detecta acordes no áudio"""
     task_id = None
     try:
-        if 'audio' not in request.files:
+        if 'audio' not in request.files and not request.form.get('upload_id'):
             return jsonify({'error': 'Nenhum arquivo enviado'}), 400
         
-        file = request.files['audio']
-        if file.filename == '':
+        received = receive_upload()
+        if received is None:
             return jsonify({'error': 'Nome de arquivo vazio'}), 400
-        
+        filepath, filename, audio_hash = received
         task_id = f"chords_{int(time.time() * 1000)}"
-        filename = file.filename
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
         
         print(f"\n=== DETECÇÃO DE ACORDES: {filename} ===")
+        
+        # Cache por conteúdo: mesmo áudio não passa de novo pelo CREMA
+        cached = result_cache.get(chords_key(audio_hash))
+        if cached:
+            chords = cached['chords']
+            print(f"✓ Cache hit: {len(chords)} acordes ({cached['method']})")
+            update_progress(task_id, 3, f"{len(chords)} acordes (cache)!", 100, cached=True)
+            add_to_history(filename, 0, len(chords), cached.get('duration', 0), None, chords)
+            return jsonify({
+                'status': 'success',
+                'cached': True,
+                'chords': chords,
+                'method': cached['method'],
+                'task_id': task_id,
+                'total': len(chords)
+            })
+        
         update_progress(task_id, 1, f"Iniciando detecção em {filename}...", 10)
         
         update_progress(task_id, 2, "Analisando harmonia...", 30)
@@ -811,13 +1474,21 @@ def detect_chords():
         
         # Adicionar ao histórico
         try:
-            y, sr = librosa.load(filepath, duration=10)
-            duration = len(y) / sr
-        except:
+            duration = audio_duration(filepath)
+        except Exception:
             duration = 0
             
         add_to_history(filename, 0, len(chords), duration, None, chords)
         
+        if chords:
+            result_cache.put(chords_key(audio_hash), {
+                'kind': 'chords',
+                'chords': chords,
+                'method': method,
+                'filename': filename,
+                'duration': duration
+            })
+        
         print(f"✓ Detecção concluída - {len(chords)} acordes ({method})")
         
         return jsonify({
@@ -828,6 +1499,8 @@ def detect_chords():
             'total': len(chords)
         })
         
+    except UploadNotFoundError:
+        return jsonify({'error': 'Upload não encontrado ou incompleto'}), 404
     except Exception as e:
         print(f"Erro na detecção: {str(e)}")
         if task_id:
@@ -837,8 +1510,249 @@ def detect_chords():
             'task_id': task_id
         }), 500
 
+def process_chords_batch_async(task_id, items):
+    """Detecta acordes de vários arquivos em lotes, reaproveitando o CREMA em memória"""
+    try:
+        start_time = time.time()
+        total = len(items)
+        results = [None] * total
+        done = 0
+        
+        print(f"\n=== ACORDES EM LOTE: {total} arquivos ===")
+        
+        # Cache por conteúdo primeiro: só os misses passam pelo modelo
+        pending = []
+        for index, item in enumerate(items):
+            cached = result_cache.get(chords_key(item['audio_hash']))
+            if cached:
+                results[index] = {
+                    'filename': item['filename'],
+                    'chords': cached['chords'],
+                    'method': cached['method'],
+                    'total': len(cached['chords']),
+                    'cached': True
+                }
+                done += 1
+            else:
+                pending.append(index)
+        
+        update_progress(task_id, 2, f"{done}/{total} músicas ({len(pending)} para analisar)",
+                        min(99, int(done / total * 100)))
+        
+        # Lotes de músicas de tamanho parecido: menos quadros de preenchimento no keras
+        pending.sort(key=lambda index: os.path.getsize(items[index]['filepath']))
+        for batch_start in range(0, len(pending), CHORDS_BATCH_SIZE):
+            batch = pending[batch_start:batch_start + CHORDS_BATCH_SIZE]
+            paths = [items[index]['filepath'] for index in batch]
+            try:
+                predictions = crema_pool.predict_batch(paths, feature_workers=len(paths))
+            except ImportError as e:
+                print(f"⚠️  CREMA não instalado: {e}")
+                predictions = [(None, e)] * len(batch)
+            
+            for index, (annotation, error) in zip(batch, predictions):
+                item = items[index]
+                if annotation is not None:
+                    chords = annotation_to_chords(annotation)
+                    method = 'crema'
+                    duration = float(annotation.duration or 0)
+                else:
+                    print(f"⚠️  {item['filename']}: CREMA falhou ({error}), usando chroma")
+                    chords = detect_chords_chroma(item['filepath'])
+                    method = 'chroma_enhanced'
+                    try:
+                        duration = audio_duration(item['filepath'])
+                    except Exception:
+                        duration = chords[-1]['end'] if chords else 0
+                
+                add_to_history(item['filename'], 0, len(chords), duration, None, chords)
+                if chords:
+                    result_cache.put(chords_key(item['audio_hash']), {
+                        'kind': 'chords',
+                        'chords': chords,
+                        'method': method,
+                        'filename': item['filename'],
+                        'duration': duration
+                    })
+                results[index] = {
+                    'filename': item['filename'],
+                    'chords': chords,
+                    'method': method,
+                    'total': len(chords),
+                    'cached': False
+                }
+                done += 1
+                update_progress(task_id, 2, f"{done}/{total} músicas", min(99, int(done / total * 100)))
+        
+        elapsed = time.time() - start_time
+        songs_per_minute = total / elapsed * 60 if elapsed > 0 else 0
+        
+        progress_data[task_id]['results'] = results
+        progress_data[task_id]['processing_time'] = elapsed
+        progress_data[task_id]['songs_per_minute'] = round(songs_per_minute, 2)
+        update_progress(task_id, 3, f"Concluído! {total} músicas ({songs_per_minute:.1f}/min)", 100)
+        
+    except Exception as e:
+        print(f"\n✗ Erro no lote: {e}\n")
+        import traceback
+        traceback.print_exc()
+        update_progress(task_id, -1, f"Erro: {str(e)}", 0)
+
+chords_scheduler = JobScheduler(
+    slots=1,  # um lote por vez: o paralelismo fica dentro do lote
+    max_queue=CHORDS_MAX_QUEUE,
+    on_start=on_job_start,
+    on_queue_change=on_job_queue_change,
+    name='chords'
+)
+
+@app.route('/api/chords/batch', methods=['POST'])
+def detect_chords_batch():
+    """Detecta acordes de vários arquivos (campo 'audio' repetido) em background"""
+    try:
+        files = [f for f in request.files.getlist('audio') if f.filename]
+        if not files:
+            return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+        
+        if chords_scheduler.is_full():
+            return queue_full_response(scheduler=chords_scheduler)
+        
+        items = []
+        for file in files:
+            filepath, audio_hash, _ = upload_store.ingest(file.stream, file.filename)
+            items.append({
+                'filename': Path(file.filename).name,
+                'filepath': filepath,
+                'audio_hash': audio_hash
+            })
+        
+        task_id = f"chords_batch_{int(time.time() * 1000)}"
+        update_progress(task_id, 0, "Na fila...", 0, state='queued', total=len(items))
+        try:
+            position = chords_scheduler.submit(task_id, process_chords_batch_async, task_id, items)
+        except QueueFullError as e:
+            progress_data.pop(task_id, None)
+            return queue_full_response(str(e), scheduler=chords_scheduler)
+        
+        return jsonify({
+            'status': 'queued',
+            'task_id': task_id,
+            'queue_position': position,
+            'total': len(items)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ==================== PROCESSAMENTO DE ÁUDIO (PITCH/VELOCIDADE) ====================
 
+# Renders em andamento: chave do cache -> task_id (pedidos repetidos acompanham a mesma task)
+render_tasks = {}
+render_tasks_lock = threading.Lock()
+
+def render_id_from_key(key):
+    _, audio_hash, semitones, rate = key.split(':')
+    return f"{audio_hash[:16]}_{semitones}_{rate}"
+
+def can_stream(audio_path):
+    """O libsndfile lê o arquivo em blocos (WAV, FLAC, OGG e MP3 em versões recentes)"""
+    try:
+        sf.info(audio_path)
+        return True
+    except Exception:
+        return False
+
+def stream_render(audio_path, partial_path, pitch_shift_semitones, time_stretch_rate):
+    """
+    Render em blocos: gera (sr, canais, nº de amostras) e depois blocos PCM 16 bits
+
+    Cada bloco é acrescentado em partial_path antes de ser entregue; a memória não
+    depende da duração (pitch_time.stream_file).
+    """
+    blocks = pitch_time.stream_file(audio_path, pitch_shift_semitones, time_stretch_rate)
+    sr, channels, total = next(blocks)
+    yield sr, channels, total
+    with metrics.stage_timer('pitch_time_stream'), \
+            sf.SoundFile(partial_path, 'w', samplerate=sr, channels=channels,
+                         format='WAV', subtype='PCM_16') as out:
+        for block in blocks:
+            pcm = pitch_time.to_pcm16(block)
+            out.write(pcm)
+            yield pcm
+
+def render_async(task_id, key, audio_path, filename, pitch_shift_semitones, time_stretch_rate):
+    """Aplica pitch shift / time stretch em background e grava o render no cache"""
+    try:
+        render_id = render_id_from_key(key)
+        render_dir = os.path.join(RENDERS_FOLDER, render_id)
+        os.makedirs(render_dir, exist_ok=True)
+        render_path = os.path.join(render_dir, 'render.wav')
+        # Grava em arquivo temporário e renomeia: quem lê nunca vê um WAV pela metade
+        partial_path = render_path + '.part'
+        message = (f"Aplicando pitch ({pitch_shift_semitones:+.1f} semitons) e "
+                   f"velocidade ({time_stretch_rate:.2f}x)...")
+        
+        if audio_duration(audio_path) > STREAM_RENDER_SECONDS and can_stream(audio_path):
+            # Faixas longas: blocos lidos, processados e gravados aos poucos
+            blocks = stream_render(audio_path, partial_path, pitch_shift_semitones, time_stretch_rate)
+            sr, channels, total = next(blocks)
+            print(f"✓ Render em blocos: {total/sr:.1f}s @ {sr}Hz, {channels} canais")
+            written = 0
+            last_pct = None
+            for pcm in blocks:
+                written += len(pcm)
+                # Progresso de 5 em 5%: um evento por bloco inundaria o SSE
+                pct = 10 + 5 * int(17 * written / max(total, 1))
+                if pct != last_pct:
+                    update_progress(task_id, 2, message, pct)
+                    last_pct = pct
+            duration = written / sr
+        else:
+            update_progress(task_id, 1, "Carregando áudio...", 10)
+            # Sample rate e canais originais (decodificação compartilhada, sem downmix para mono)
+            y, sr = audio_cache.get(audio_path)
+            print(f"✓ Carregado: {y.shape[-1]/sr:.1f}s @ {sr}Hz, {y.shape[0]} canais")
+            
+            # Pitch e velocidade juntos: uma passada de phase vocoder + um resample
+            update_progress(task_id, 2, message, 30)
+            with metrics.stage_timer('pitch_time'):
+                y = pitch_time.shift_and_stretch(y, sr, pitch_shift_semitones, time_stretch_rate)
+            
+            update_progress(task_id, 4, "Salvando áudio processado...", 90)
+            sf.write(partial_path, y.T, sr, format='WAV')
+            duration = y.shape[-1] / sr
+        os.replace(partial_path, render_path)
+        
+        render_cache.put(key, {
+            'kind': 'render',
+            'path': render_dir,
+            'file': render_path,
+            'filename': filename,
+            'pitch_shift': pitch_shift_semitones,
+            'time_stretch': time_stretch_rate,
+            'duration': duration
+        })
+        
+        progress_data[task_id]['render_url'] = f'/api/renders/{render_id}'
+        update_progress(task_id, 5, "Processamento concluído!", 100)
+        
+    except Exception as e:
+        print(f"❌ Erro no processamento: {e}")
+        import traceback
+        traceback.print_exc()
+        update_progress(task_id, -1, f"Erro: {str(e)}", 0)
+    finally:
+        with render_tasks_lock:
+            render_tasks.pop(key, None)
+
+render_scheduler = JobScheduler(
+    slots=RENDER_SLOTS,
+    max_queue=RENDER_MAX_QUEUE,
+    on_start=on_job_start,
+    on_queue_change=on_job_queue_change,
+    name='render'
+)
+
 @app.route('/api/process-audio', methods=['POST'])
 def process_audio():
     """
@@ -847,6 +1761,9 @@ def process_audio():
     Aceita dois formatos:
     1. JSON com filename (arquivo já no servidor)
     2. FormData com arquivo de áudio
+    
+    Render em cache: retorna o WAV direto. Senão: 202 com task_id (progresso em
+    /api/progress/<task_id>, arquivo em render_url ao concluir).
     """
     try:
         # Verificar se é FormData (arquivo enviado)
@@ -856,14 +1773,9 @@ def process_audio():
             pitch_shift_semitones = float(request.form.get('pitch_shift', 0))
             time_stretch_rate = float(request.form.get('time_stretch', 1.0))
             
-            # Salvar temporariamente
-            temp_filename = f'temp_{int(time.time() * 1000)}_{audio_file.filename}'
-            temp_path = os.path.join(UPLOAD_FOLDER, temp_filename)
-            audio_file.save(temp_path)
-            
-            audio_path = temp_path
-            filename = audio_file.filename
-            is_temp = True
+            # Blob por conteúdo: reenvios do mesmo áudio não ocupam disco de novo
+            audio_path, audio_hash, _ = upload_store.ingest(audio_file.stream, audio_file.filename)
+            filename = Path(audio_file.filename).name
         else:
             # JSON: arquivo já está no servidor
             data = request.json
@@ -875,11 +1787,11 @@ def process_audio():
                 return jsonify({'error': 'Filename não fornecido'}), 400
             
             audio_path = os.path.join(UPLOAD_FOLDER, filename)
-            is_temp = False
+            audio_hash = None
         
         print(f"\n=== PROCESSAMENTO DE ÁUDIO ===")
         print(f"Arquivo: {filename}")
-        print(f"Pitch: {pitch_shift_semitones:+.0f} semitons")
+        print(f"Pitch: {pitch_shift_semitones:+.1f} semitons")
         print(f"Velocidade: {time_stretch_rate:.2f}x")
         
         # Verificar se precisa processar
@@ -891,97 +1803,576 @@ def process_audio():
             print(f"❌ Arquivo não encontrado: {audio_path}")
             return jsonify({'error': 'Arquivo não encontrado'}), 404
         
-        print(f"[30%] Carregando áudio...")
-        # Manter sample rate original para preservar qualidade
-        y, sr = librosa.load(audio_path, sr=None)
-        print(f"✓ Carregado: {len(y)/sr:.1f}s @ {sr}Hz")
-        
-        # Aplicar pitch shift
-        if pitch_shift_semitones != 0:
-            print(f"[50%] Aplicando pitch shift ({pitch_shift_semitones:+.0f} semitons)...")
-            y = librosa.effects.pitch_shift(y, sr=sr, n_steps=pitch_shift_semitones)
-            print(f"✓ Pitch shift aplicado")
+        key = render_key(audio_hash or upload_store.hash_of(audio_path), pitch_shift_semitones,
+                         time_stretch_rate)
+        cached = render_cache.get(key)
+        if cached and os.path.exists(cached['file']):
+            print(f"✓ Render em cache: {render_id_from_key(key)}")
+            return send_file(os.path.abspath(cached['file']), mimetype='audio/wav',
+                             as_attachment=False, conditional=True)
+        
+        with render_tasks_lock:
+            task_id = render_tasks.get(key)
+            if task_id is None:
+                if render_scheduler.is_full():
+                    return queue_full_response('Servidor ocupado: fila de processamento cheia',
+                                               scheduler=render_scheduler)
+                task_id = f"render_{int(time.time() * 1000)}"
+                update_progress(task_id, 0, "Na fila...", 0, state='queued')
+                # Registrado antes do submit: a task pode terminar (e se remover) antes do retorno
+                render_tasks[key] = task_id
+                try:
+                    render_scheduler.submit(task_id, render_async, task_id, key, audio_path, filename,
+                                            pitch_shift_semitones, time_stretch_rate)
+                except QueueFullError as e:
+                    render_tasks.pop(key, None)
+                    progress_data.pop(task_id, None)
+                    return queue_full_response(str(e), scheduler=render_scheduler)
+            else:
+                print(f"✓ Mesmo render já em andamento: {task_id}")
         
-        # Aplicar time stretch
-        if time_stretch_rate != 1.0:
-            print(f"[70%] Aplicando time stretch ({time_stretch_rate:.2f}x)...")
-            y = librosa.effects.time_stretch(y, rate=time_stretch_rate)
-            print(f"✓ Time stretch aplicado")
+        return jsonify({
+            'status': 'queued',
+            'task_id': task_id,
+            'queue_position': render_scheduler.position(task_id)
+        }), 202
         
-        # Salvar temporariamente
-        print(f"[90%] Salvando áudio processado...")
-        output_filename = f'processed_{int(time.time() * 1000)}_{filename}'
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+    except Exception as e:
+        print(f"❌ Erro no processamento: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/process-audio/stream', methods=['GET'])
+def process_audio_stream():
+    """
+    Pitch/velocidade entregue enquanto é processado (WAV PCM 16 bits em blocos)
+    
+    Query: filename, pitch_shift, time_stretch. O cabeçalho já traz o tamanho final,
+    então o player começa a tocar com o primeiro bloco. Ao terminar, o render entra no
+    cache de renders (o mesmo do POST /api/process-audio).
+    """
+    filename = request.args.get('filename')
+    try:
+        pitch_shift_semitones = float(request.args.get('pitch_shift', 0))
+        time_stretch_rate = float(request.args.get('time_stretch', 1.0))
+    except ValueError:
+        return jsonify({'error': 'pitch_shift/time_stretch inválidos'}), 400
+    
+    if not filename:
+        return jsonify({'error': 'Filename não fornecido'}), 400
+    if pitch_shift_semitones == 0 and time_stretch_rate == 1.0:
+        return jsonify({'error': 'Nenhuma alteração solicitada'}), 400
+    
+    audio_path = os.path.join(UPLOAD_FOLDER, Path(filename).name)
+    if not os.path.exists(audio_path):
+        return jsonify({'error': 'Arquivo não encontrado'}), 404
+    
+    key = render_key(upload_store.hash_of(audio_path), pitch_shift_semitones, time_stretch_rate)
+    cached = render_cache.get(key)
+    if cached and os.path.exists(cached['file']):
+        print(f"✓ Render em cache: {render_id_from_key(key)}")
+        return send_file(os.path.abspath(cached['file']), mimetype='audio/wav', conditional=True)
+    
+    if not can_stream(audio_path):
+        return jsonify({'error': 'Formato sem leitura em blocos: use POST /api/process-audio'}), 415
+    
+    render_id = render_id_from_key(key)
+    render_dir = os.path.join(RENDERS_FOLDER, render_id)
+    os.makedirs(render_dir, exist_ok=True)
+    render_path = os.path.join(render_dir, 'render.wav')
+    # Nome único: outro stream (ou o POST) do mesmo render pode estar gravando ao mesmo tempo
+    partial_path = f"{render_path}.{uuid.uuid4().hex}.part"
+    
+    blocks = stream_render(audio_path, partial_path, pitch_shift_semitones, time_stretch_rate)
+    sr, channels, total = next(blocks)
+    print("\n=== RENDER EM STREAMING ===")
+    print(f"Arquivo: {filename} | Pitch: {pitch_shift_semitones:+.1f} | Velocidade: {time_stretch_rate:.2f}x")
+    
+    def generate():
+        completed = False
+        try:
+            yield pitch_time.wav_header(sr, channels, total)
+            written = 0
+            for pcm in blocks:
+                written += len(pcm)
+                yield pcm.tobytes()
+            os.replace(partial_path, render_path)
+            completed = True
+            render_cache.put(key, {
+                'kind': 'render',
+                'path': render_dir,
+                'file': render_path,
+                'filename': filename,
+                'pitch_shift': pitch_shift_semitones,
+                'time_stretch': time_stretch_rate,
+                'duration': written / sr
+            })
+            print(f"✓ Render em streaming concluído: {render_id}")
+        finally:
+            # Cliente desconectou (ou erro): o .part incompleto não vai para o cache
+            blocks.close()
+            if not completed and os.path.exists(partial_path):
+                os.remove(partial_path)
+    
+    return Response(
+        generate(),
+        mimetype='audio/wav',
+        headers={
+            'Content-Length': str(44 + total * channels * 2),
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+# ==================== PITCH/VELOCIDADE EM TEMPO REAL ====================
+
+live_sessions = live_render.LiveSessions(max_sessions=LIVE_MAX_SESSIONS)
+
+def live_params(data):
+    """(semitons, velocidade, posição ou None) do JSON; ValueError se inválidos"""
+    pitch_shift_semitones = float(data.get('pitch_shift', 0))
+    time_stretch_rate = float(data.get('time_stretch', 1.0))
+    if not -24 <= pitch_shift_semitones <= 24 or not 0.25 <= time_stretch_rate <= 4:
+        raise ValueError('pitch_shift/time_stretch fora do intervalo')
+    position = data.get('position')
+    return pitch_shift_semitones, time_stretch_rate, None if position is None else float(position)
+
+@app.route('/api/live', methods=['POST'])
+def create_live_session():
+    """
+    Abre uma sessão de pitch/velocidade em tempo real para o player
+    
+    JSON: filename (ou upload_id), position (segundos), pitch_shift, time_stretch.
+    Os quadros vêm de GET stream_url; trocas de parâmetro em POST /api/live/<id>.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        pitch_shift_semitones, time_stretch_rate, position = live_params(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if data.get('upload_id'):
+        try:
+            audio_path, _, _ = upload_store.completed(data['upload_id'])
+        except UploadNotFoundError:
+            return jsonify({'error': 'Upload não encontrado'}), 404
+    elif data.get('filename'):
+        audio_path = os.path.join(UPLOAD_FOLDER, Path(data['filename']).name)
+        if not os.path.exists(audio_path):
+            return jsonify({'error': 'Arquivo não encontrado'}), 404
+    else:
+        return jsonify({'error': 'Filename não fornecido'}), 400
+    
+    if not can_stream(audio_path):
+        return jsonify({'error': 'Formato sem leitura em blocos: use POST /api/process-audio'}), 415
+    if live_sessions.is_full():
+        return jsonify({'error': 'Servidor ocupado: sessões em tempo real esgotadas'}), 429
+    
+    session = live_sessions.add(live_render.LiveSession(
+        audio_path, position or 0.0, pitch_shift_semitones, time_stretch_rate))
+    return jsonify({
+        'session_id': session.id,
+        'stream_url': f'/api/live/{session.id}/stream',
+        'sample_rate': session.sample_rate,
+        'channels': session.channels,
+        'duration': session.duration,
+        'frame_seconds': live_render.FRAME_SECONDS
+    }), 201
+
+@app.route('/api/live/<session_id>/stream', methods=['GET'])
+def stream_live_session(session_id):
+    """Quadros da sessão (cabeçalho época/amostras/posição + PCM 16 bits), ~0.5s à frente do playhead"""
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Sessão não encontrada'}), 404
+    try:
+        frames = live_sessions.stream(session)
+        first = next(frames)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except StopIteration:
+        first = b''
+        frames = iter(())
+    
+    def generate():
+        yield first
+        yield from frames
+    
+    return Response(
+        generate(),
+        mimetype='application/octet-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/api/live/<session_id>', methods=['POST'])
+def update_live_session(session_id):
+    """Novos pitch/velocidade a partir do próximo quadro (com position: recomeça no playhead)"""
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Sessão não encontrada'}), 404
+    try:
+        pitch_shift_semitones, time_stretch_rate, position = live_params(request.get_json(silent=True) or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    epoch = session.set_params(pitch_shift_semitones, time_stretch_rate, position)
+    return jsonify({'epoch': epoch})
+
+@app.route('/api/live/<session_id>', methods=['DELETE'])
+def close_live_session(session_id):
+    live_sessions.remove(session_id)
+    return jsonify({'status': 'closed'})
+
+# ==================== PITCH/VELOCIDADE DOS STEMS ====================
+
+def cached_render_file(key):
+    cached = render_cache.get(key)
+    return cached['file'] if cached and os.path.exists(cached['file']) else None
+
+def stem_render_id(key):
+    return 'stem_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+def find_stem_files(model_name, output_name):
+    """{stem: caminho} da pasta de uma separação (WAV tem prioridade sobre MP3)"""
+    return {stem: path for stem, (path, _) in stem_index.song(model_name, output_name).items()}
+
+def stem_render_keys(model_name, output_name, stems, semitones, rate, remix):
+    keys = {stem: stem_render_key(model_name, output_name, stem, semitones, rate) for stem in stems}
+    if remix:
+        mix_name = 'mix[' + '+'.join(sorted(stems)) + ']'
+        keys[None] = stem_render_key(model_name, output_name, mix_name, semitones, rate)
+    return keys
+
+def stem_render_payload(keys):
+    payload = {
+        'stems': [
+            {
+                'name': STEM_TRANSLATIONS.get(stem, stem),
+                'stem': stem,
+                'url': f'/api/renders/{stem_render_id(key)}'
+            }
+            for stem, key in keys.items() if stem is not None
+        ]
+    }
+    if None in keys:
+        payload['remix_url'] = f'/api/renders/{stem_render_id(keys[None])}'
+    return payload
+
+def process_stems_async(task_id, task_key, model_name, output_name, stem_files, keys,
+                        pitch_shift_semitones, time_stretch_rate):
+    """Renderiza em paralelo os stems que faltam no cache e monta o remix"""
+    try:
+        start_time = time.time()
+        stems_dir = os.path.join(STEMS_FOLDER, model_name, output_name)
+        # Mesmo filename da separação: apagar a análise também apaga estes renders
+        owners = result_cache.find(
+            lambda key, meta: meta.get('path') and os.path.abspath(meta['path']) == os.path.abspath(stems_dir)
+        )
+        filename = owners[0][1].get('filename') if owners else output_name
         
-        # Garantir que a pasta existe
-        os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+        jobs = {}
+        for stem, src_path in stem_files.items():
+            if cached_render_file(keys[stem]) is None:
+                render_dir = os.path.join(RENDERS_FOLDER, stem_render_id(keys[stem]))
+                jobs[stem] = (src_path, os.path.join(render_dir, 'render.wav'))
         
-        sf.write(output_path, y, sr, format='WAV')
+        print(f"\n=== PITCH/VELOCIDADE DOS STEMS: {output_name} ===")
+        print(f"{len(jobs)} de {len(stem_files)} stems para renderizar ({STEM_EFFECT_WORKERS} processos)")
+        update_progress(task_id, 1, f"Processando {len(jobs)} stems em paralelo...", 10)
         
-        # Verificar se arquivo foi criado
-        if not os.path.exists(output_path):
-            print(f"❌ ERRO: Arquivo não foi criado!")
-            return jsonify({'error': 'Erro ao salvar arquivo processado'}), 500
+        def on_stem_done(stem, percent):
+            update_progress(task_id, 2, f"{STEM_TRANSLATIONS.get(stem, stem)} pronto", 10 + int(percent * 0.8))
         
-        print(f"[100%] Processamento concluído!")
-        print("=" * 40)
+        rendered = stem_effects.render_stems(
+            jobs, pitch_shift_semitones, time_stretch_rate, STEM_EFFECT_WORKERS, on_stem_done
+        )
+        for stem, (render_path, duration) in rendered.items():
+            render_cache.put(keys[stem], {
+                'kind': 'stem_render',
+                'path': os.path.dirname(render_path),
+                'file': render_path,
+                'filename': filename,
+                'stem': stem,
+                'pitch_shift': pitch_shift_semitones,
+                'time_stretch': time_stretch_rate,
+                'duration': duration
+            })
+        
+        if None in keys and cached_render_file(keys[None]) is None:
+            update_progress(task_id, 3, "Mixando stems...", 92)
+            render_paths = [
+                os.path.join(RENDERS_FOLDER, stem_render_id(keys[stem]), 'render.wav') for stem in stem_files
+            ]
+            mix_path = os.path.join(RENDERS_FOLDER, stem_render_id(keys[None]), 'render.wav')
+            _, duration = stem_effects.mix_stems(render_paths, mix_path)
+            render_cache.put(keys[None], {
+                'kind': 'stem_remix',
+                'path': os.path.dirname(mix_path),
+                'file': mix_path,
+                'filename': filename,
+                'stems': sorted(stem_files),
+                'pitch_shift': pitch_shift_semitones,
+                'time_stretch': time_stretch_rate,
+                'duration': duration
+            })
+        
+        progress_data[task_id].update(stem_render_payload(keys))
+        progress_data[task_id]['processing_time'] = time.time() - start_time
+        update_progress(task_id, 4, f"{len(stem_files)} stems processados!", 100)
         
-        # Usar caminho absoluto para send_file
-        abs_output_path = os.path.abspath(output_path)
+    except Exception as e:
+        print(f"❌ Erro no processamento dos stems: {e}")
+        import traceback
+        traceback.print_exc()
+        update_progress(task_id, -1, f"Erro: {str(e)}", 0)
+    finally:
+        with render_tasks_lock:
+            render_tasks.pop(task_key, None)
+
+@app.route('/api/stems/process', methods=['POST'])
+def process_stems():
+    """
+    Aplica o mesmo pitch shift / time stretch a todos os stems de uma separação
+    
+    JSON: model, song (pasta em stems/<model>/), pitch_shift, time_stretch,
+    stems (opcional, subconjunto) e remix (opcional, gera a soma dos stems).
+    Tudo em cache: 200 com as URLs. Senão: 202 com task_id.
+    """
+    try:
+        data = request.json or {}
+        model_name = Path(data.get('model') or '').name
+        output_name = Path(data.get('song') or '').name
+        pitch_shift_semitones = float(data.get('pitch_shift', 0))
+        time_stretch_rate = float(data.get('time_stretch', 1.0))
+        remix = bool(data.get('remix', False))
+        
+        if not model_name or not output_name:
+            return jsonify({'error': 'model e song são obrigatórios'}), 400
+        if pitch_shift_semitones == 0 and time_stretch_rate == 1.0:
+            return jsonify({'error': 'Nenhuma alteração solicitada'}), 400
         
-        # Limpar arquivo temporário se foi enviado
-        if is_temp and os.path.exists(audio_path):
-            try:
-                os.remove(audio_path)
-            except:
-                pass
+        stem_files = find_stem_files(model_name, output_name)
+        if not stem_files:
+            return jsonify({'error': 'Stems não encontrados'}), 404
+        
+        selected = data.get('stems')
+        if selected:
+            unknown = [stem for stem in selected if stem not in stem_files]
+            if unknown:
+                return jsonify({'error': f'Stems inexistentes: {", ".join(unknown)}'}), 400
+            stem_files = {stem: stem_files[stem] for stem in selected}
+        
+        keys = stem_render_keys(model_name, output_name, stem_files, pitch_shift_semitones,
+                                time_stretch_rate, remix)
+        missing = [key for key in keys.values() if cached_render_file(key) is None]
+        if not missing:
+            print(f"✓ Stems de {output_name} em cache ({pitch_shift_semitones:+.1f} st, {time_stretch_rate:.2f}x)")
+            return jsonify({'status': 'success', 'cached': True, **stem_render_payload(keys)})
+        
+        task_key = '|'.join(sorted(keys.values()))
+        with render_tasks_lock:
+            task_id = render_tasks.get(task_key)
+            if task_id is None:
+                if render_scheduler.is_full():
+                    return queue_full_response('Servidor ocupado: fila de processamento cheia',
+                                               scheduler=render_scheduler)
+                task_id = f"render_stems_{int(time.time() * 1000)}"
+                update_progress(task_id, 0, "Na fila...", 0, state='queued')
+                render_tasks[task_key] = task_id
+                try:
+                    render_scheduler.submit(task_id, process_stems_async, task_id, task_key, model_name,
+                                            output_name, stem_files, keys, pitch_shift_semitones,
+                                            time_stretch_rate)
+                except QueueFullError as e:
+                    render_tasks.pop(task_key, None)
+                    progress_data.pop(task_id, None)
+                    return queue_full_response(str(e), scheduler=render_scheduler)
         
-        return send_file(abs_output_path, mimetype='audio/wav', as_attachment=False)
+        return jsonify({
+            'status': 'queued',
+            'task_id': task_id,
+            'queue_position': render_scheduler.position(task_id)
+        }), 202
         
     except Exception as e:
-        print(f"❌ Erro no processamento: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"❌ Erro no processamento dos stems: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/renders/<render_id>', methods=['GET'])
+def serve_render(render_id):
+    """WAV processado (pitch/velocidade) servido do cache de renders"""
+    path = os.path.join(RENDERS_FOLDER, Path(render_id).name, 'render.wav')
+    if not os.path.exists(path):
+        return jsonify({'error': 'Render não encontrado'}), 404
+    return send_file(os.path.abspath(path), mimetype='audio/wav', conditional=True)
+
 # ==================== DOWNLOAD ====================
 
 @app.route('/api/download/<model>/<song>/<stem>', methods=['GET'])
 def download_stem(model, song, stem):
-    """Download com suporte a múltiplos modelos"""
+    """
+    Download com suporte a múltiplos modelos (Range, ETag e 304 via send_file)
+    
+    Query opcional: format=mp3|opus e bitrate (kbps) para uma versão comprimida;
+    sem format (ou format=original) retorna o arquivo sem perdas.
+    """
     try:
-        for ext in ['.wav', '.mp3']:
-            path = os.path.join(STEMS_FOLDER, model, song, f'{stem}{ext}')
-            if os.path.exists(path):
-                mime = 'audio/wav' if ext == '.wav' else 'audio/mpeg'
-                return send_file(path, mimetype=mime)
-        return jsonify({'error': 'Stem não encontrado'}), 404
+        found = stem_index.lookup(model, song, stem)
+        if found is None:
+            return jsonify({'error': 'Stem não encontrado'}), 404
+        path, mime = found
+        
+        # ?format=mp3|opus&bitrate=kbps: variante comprimida, gerada uma vez e guardada ao lado do stem
+        fmt = request.args.get('format')
+        if fmt and fmt != 'original':
+            try:
+                fmt, bitrate = stem_transcode.resolve_format(fmt, request.args.get('bitrate'))
+                path = stem_transcode.get_variant(path, fmt, bitrate)
+            except (stem_transcode.UnsupportedFormatError, ValueError) as e:
+                return jsonify({'error': str(e)}), 400
+            except FileNotFoundError:
+                stem_index.invalidate(model, song)
+                return jsonify({'error': 'Stem não encontrado'}), 404
+            mime = stem_transcode.FORMATS[fmt]['mimetype']
+        
+        try:
+            # A pasta inclui hash do áudio + modo: o conteúdo de uma URL nunca muda
+            response = send_file(os.path.abspath(path), mimetype=mime, conditional=True,
+                                 etag=True, max_age=STEM_CACHE_MAX_AGE)
+        except FileNotFoundError:
+            # Apagado por fora (ou pelo LRU) desde a indexação
+            stem_index.invalidate(model, song)
+            return jsonify({'error': 'Stem não encontrado'}), 404
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/segments/<model>/<song>/<int:index>/<stem>', methods=['GET'])
+def download_segment(model, song, index, stem):
+    """Trecho já separado de uma separação progressiva em andamento (WAV 16 bits)"""
+    if any(Path(part).name != part or part in ('', '.', '..') for part in (model, song, stem)):
+        return jsonify({'error': 'Trecho não encontrado'}), 404
+    path = os.path.join(STEMS_FOLDER, model, song, SEGMENTS_DIR, f'{stem}.{index:03d}.wav')
+    if not os.path.isfile(path):
+        # Inexistente ou já removido: o job terminou e os stems completos estão em /api/download
+        return jsonify({'error': 'Trecho não encontrado'}), 404
+    response = send_file(os.path.abspath(path), mimetype='audio/wav', conditional=True,
+                         etag=True, max_age=0)
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/segments/<model>/<song>/<stem>', methods=['GET'])
+def download_segments_combined(model, song, stem):
+    """Trechos 0..upto-1 de um stem emendados num WAV (gravado uma vez por upto)"""
+    if any(Path(part).name != part or part in ('', '.', '..') for part in (model, song, stem)):
+        return jsonify({'error': 'Trecho não encontrado'}), 404
+    upto = request.args.get('upto', type=int) or 0
+    segments_dir = os.path.join(STEMS_FOLDER, model, song, SEGMENTS_DIR)
+    parts = [os.path.join(segments_dir, f'{stem}.{index:03d}.wav') for index in range(upto)]
+    combined = os.path.join(segments_dir, f'{stem}.upto{upto:03d}.wav')
+    try:
+        if not os.path.isfile(combined):
+            if not parts or not all(os.path.isfile(part) for part in parts):
+                return jsonify({'error': 'Trecho não encontrado'}), 404
+            partial_path = f'{combined}.{uuid.uuid4().hex}.part'
+            try:
+                info = sf.info(parts[0])
+                with sf.SoundFile(partial_path, 'w', info.samplerate, info.channels,
+                                  format='WAV', subtype='PCM_16') as out:
+                    for part in parts:
+                        with sf.SoundFile(part) as f:
+                            for block in f.blocks(blocksize=65536, dtype='int16', always_2d=True):
+                                out.write(block)
+                os.replace(partial_path, combined)
+            finally:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+    except (OSError, RuntimeError):
+        # Job terminou no meio (.segments apagada): os stems completos estão em /api/download
+        return jsonify({'error': 'Trecho não encontrado'}), 404
+    response = send_file(os.path.abspath(combined), mimetype='audio/wav', conditional=True,
+                         etag=True, max_age=0)
+    response.cache_control.no_cache = True
+    return response
+
 @app.route('/uploads/<path:filename>', methods=['GET'])
 def serve_upload(filename):
     try:
         from urllib.parse import unquote
+        from werkzeug.security import safe_join
         decoded = unquote(filename)
-        path = os.path.join(UPLOAD_FOLDER, decoded)
-        
-        if os.path.exists(path):
-            ext = decoded.lower().split('.')[-1]
-            mimes = {
-                'mp3': 'audio/mpeg',
-                'wav': 'audio/wav',
-                'ogg': 'audio/ogg',
-                'm4a': 'audio/mp4'
-            }
-            return send_file(path, mimetype=mimes.get(ext, 'audio/mpeg'))
-        return jsonify({'error': 'Not found'}), 404
+        # Só nomes dentro de uploads/ (sem ../, caminho absoluto nem .blobs/.incoming)
+        path = safe_join(UPLOAD_FOLDER, decoded)
+        if path is None or any(part.startswith('.') for part in Path(decoded).parts):
+            return jsonify({'error': 'Not found'}), 404
+        
+        ext = decoded.lower().split('.')[-1]
+        mimes = {
+            'mp3': 'audio/mpeg',
+            'wav': 'audio/wav',
+            'ogg': 'audio/ogg',
+            'm4a': 'audio/mp4'
+        }
+        try:
+            # Re-upload com o mesmo nome troca o conteúdo: revalida sempre (ETag/304)
+            response = send_file(os.path.abspath(path), mimetype=mimes.get(ext, 'audio/mpeg'),
+                                 conditional=True, etag=True, max_age=0)
+        except (FileNotFoundError, IsADirectoryError):
+            return jsonify({'error': 'Not found'}), 404
+        response.cache_control.no_cache = True
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# ==================== INICIALIZAÇÃO ====================
+# ==================== MÉTRICAS ====================
+
+def scheduler_samples(field):
+    schedulers = {'separation': separation_scheduler, 'chords': chords_scheduler,
+                  'render': render_scheduler}
+    return [({'queue': name}, scheduler.stats().get(field)) for name, scheduler in schedulers.items()]
+
+def cache_samples(field):
+    caches = {'result': result_cache, 'render': render_cache, 'audio': audio_cache}
+    return [({'cache': name}, cache.stats().get(field)) for name, cache in caches.items()]
+
+metrics.REGISTRY.gauge('queue_queued', 'Jobs aguardando na fila', lambda: scheduler_samples('queued'))
+metrics.REGISTRY.gauge('queue_running', 'Jobs em execução', lambda: scheduler_samples('running'))
+metrics.REGISTRY.gauge('queue_slots', 'Jobs simultâneos permitidos', lambda: scheduler_samples('slots'))
+metrics.REGISTRY.gauge('cache_hits_total', 'Consultas ao cache respondidas', lambda: cache_samples('hits'),
+                       kind='counter')
+metrics.REGISTRY.gauge('cache_misses_total', 'Consultas ao cache sem resultado',
+                       lambda: cache_samples('misses'), kind='counter')
+metrics.REGISTRY.gauge('cache_hit_ratio', 'Hits / consultas desde o início do processo',
+                       lambda: cache_samples('hit_rate'))
+metrics.REGISTRY.gauge('cache_bytes', 'Bytes ocupados pelo cache', lambda: cache_samples('bytes'))
+metrics.REGISTRY.gauge('active_tasks', 'Tasks com progresso em memória', lambda: len(progress_data))
+metrics.REGISTRY.gauge('progress_streams', 'Conexões SSE abertas', progress_broker.connections)
+metrics.REGISTRY.gauge('live_sessions', 'Sessões de pitch/velocidade em tempo real', lambda: len(live_sessions))
+metrics.REGISTRY.gauge('demucs_models_loaded', 'Modelos Demucs em memória',
+                       lambda: len(demucs_pool.loaded_models()))
 
-if __name__ == '__main__':
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Tempos por etapa, filas, caches e memória (formato de texto do Prometheus)"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+if __name__ == '__main__' and APP_MODE == 'worker':
+    print("=" * 70)
+    print(f"👷 MUSIC ANALYZER WORKER - dados em {os.path.abspath(DATA_DIR or '.')}")
+    print("=" * 70)
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+        print(f"📈 Métricas: http://localhost:{METRICS_PORT}/metrics")
+    run_worker(separation_scheduler, {'process_separation_async': process_separation_async,
+                                      'derive_separation_async': derive_separation_async},
+               SEPARATION_SLOTS, on_start=on_job_start)
+
+elif __name__ == '__main__':
     print("=" * 70)
     print("🎵 MUSIC ANALYZER API - UPGRADE v2.0")
     print("=" * 70)
@@ -999,9 +2390,25 @@ if __name__ == '__main__':
     print("   GET  /api/quality-info  - Info sobre qualidades")
     print("   POST /api/separate      - Separar stems")
     print("   POST /api/chords        - Detectar acordes")
-    print("   POST /api/process-audio - Pitch shift e velocidade")
+    print("   POST /api/chords/batch  - Acordes de vários arquivos (CREMA em lote)")
+    print("   POST /api/process-audio - Pitch shift e velocidade (render em cache ou task)")
+    print("   POST /api/stems/process - Pitch/velocidade de todos os stems (paralelo + remix)")
+    print("   GET  /api/process-audio/stream - Pitch/velocidade em blocos (WAV enquanto processa)")
+    print("   POST /api/live          - Pitch/velocidade em tempo real (quadros à frente do playhead)")
+    print("   GET  /api/renders/:id   - Áudio processado (pitch/velocidade)")
+    print("   GET  /api/peaks/...     - Picos da waveform (stems e upload)")
     print("   GET  /api/progress/:id  - Progresso de tarefa")
+    print("   GET  /api/progress/:id/stream - Progresso em tempo real (SSE)")
+    print("   GET  /metrics           - Tempos por etapa, filas e caches (Prometheus)")
     print("=" * 70)
     print(f"\n🚀 Servidor: http://localhost:5000\n")
     
-    app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Renders avulsos de versões anteriores (processed_<ts>_*.wav) nunca eram apagados
+    for old_render in Path(OUTPUT_FOLDER).glob('processed_*'):
+        try:
+            old_render.unlink()
+        except OSError:
+            pass
+    
+    # threaded: cada conexão SSE ocupa uma thread enquanto a task roda
+    app.run(debug=False, host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,153 @@
+# audio_cache.py - Áudio decodificado uma vez por upload e compartilhado entre as etapas
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+
+def audio_duration(path):
+    """Duração em segundos lida do cabeçalho (sem decodificar o áudio)"""
+    import soundfile as sf
+    try:
+        return float(sf.info(path).duration)
+    except Exception:
+        # Formatos que o libsndfile não lê (m4a, mp3 antigos): librosa usa audioread
+        import librosa
+        return float(librosa.get_duration(path=path))
+
+
+def decode(path):
+    """Decodifica no sample rate original: (float32 canais x amostras, sr)"""
+    import soundfile as sf
+    try:
+        data, sr = sf.read(path, dtype='float32', always_2d=True)
+        return np.ascontiguousarray(data.T), sr
+    except Exception:
+        import librosa
+        data, sr = librosa.load(path, sr=None, mono=False)
+        return np.atleast_2d(data).astype(np.float32, copy=False), sr
+
+
+class DecodedAudioCache:
+    """
+    LRU (limitado em bytes) de áudio decodificado, por arquivo e formato
+
+    A decodificação original fica em cache e as variantes (mono, outro sample
+    rate) são derivadas dela sem reler o arquivo. Os arrays são somente leitura:
+    cada etapa lê o mesmo buffer sem cópia.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.decodes = 0
+
+    @staticmethod
+    def _file_id(path):
+        # Mesmo nome com outro conteúdo (re-upload) gera outra entrada
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        entry[0].flags.writeable = False
+        size = entry[0].nbytes
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+            if size > self.max_bytes:
+                return entry
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+        return entry
+
+    def _get_or_create(self, key, create):
+        entry = self._lookup(key)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        # Uma decodificação por chave mesmo com várias etapas pedindo ao mesmo tempo
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._lookup(key)
+            if entry is None:
+                with self._lock:
+                    self.misses += 1
+                entry = self._store(key, create())
+        with self._lock:
+            self._loading.pop(key, None)
+        return entry
+
+    def _original(self, path, file_id):
+        def create():
+            with self._lock:
+                self.decodes += 1
+            with metrics.stage_timer('decode'):
+                return decode(path)
+        return self._get_or_create((file_id, None, False), create)
+
+    def get(self, path, sr=None, mono=False):
+        """
+        (array float32 somente leitura, sr) do arquivo no formato pedido
+
+        mono=True retorna 1D (amostras); senão (canais x amostras). sr=None mantém o original.
+        """
+        file_id = self._file_id(path)
+        original, native_sr = self._original(path, file_id)
+        target_sr = sr or native_sr
+        if target_sr == native_sr and not mono:
+            return original, native_sr
+
+        def create():
+            data = original.mean(axis=0) if mono else original
+            if target_sr != native_sr:
+                import librosa
+                with metrics.stage_timer('resample'):
+                    data = librosa.resample(data, orig_sr=native_sr, target_sr=target_sr)
+            return np.ascontiguousarray(data, dtype=np.float32), target_sr
+
+        return self._get_or_create((file_id, target_sr, mono), create)
+
+    def get_channels(self, path, sr, channels):
+        """Formato do Demucs: (channels x amostras) em sr, como convert_audio_channels"""
+        data, sr = self.get(path, sr=sr)
+        if data.shape[0] == channels:
+            return data, sr
+        if channels == 1:
+            return self.get(path, sr=sr, mono=True)[0][None], sr
+        if data.shape[0] == 1:
+            return np.broadcast_to(data, (channels, data.shape[1])), sr
+        return data[:channels], sr
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'decodes': self.decodes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            }
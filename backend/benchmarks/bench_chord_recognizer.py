@@ -0,0 +1,182 @@
+# bench_chord_recognizer.py - Reconhecedor vetorizado vs laço antigo em progressões sintéticas
+#
+# Uso (a partir de backend/):
+#   python benchmarks/bench_chord_recognizer.py --songs 8 --seconds 240
+#
+# Cada "música" é uma progressão fixa (semente determinística) sintetizada com
+# harmônicos, baixo na tônica e ruído. Precisão = fração do tempo em que o acorde
+# previsto coincide com o verdadeiro: "maj/min" compara tônica + maior/menor (o que
+# o laço antigo distingue), "exato" exige também a sétima.
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import librosa  # noqa: E402
+import numpy as np  # noqa: E402
+
+import chord_recognizer  # noqa: E402
+from chord_recognizer import HOP_LENGTH, NOTES, QUALITIES, SAMPLE_RATE  # noqa: E402
+
+SR = 22050
+
+
+def synth_note(midi, seconds, rng):
+    t = np.arange(int(seconds * SR)) / SR
+    freq = 440.0 * 2 ** ((midi - 69) / 12)
+    tone = sum((0.6 ** k) * np.sin(2 * np.pi * freq * (k + 1) * t + rng.uniform(0, 2 * np.pi))
+               for k in range(5))
+    envelope = np.minimum(1.0, np.minimum(t / 0.02, (seconds - t) / 0.05))
+    return tone * envelope
+
+
+def synth_progression(seed, total_seconds):
+    """Áudio + verdade [(início, fim, 'C:maj')] de uma progressão aleatória reprodutível"""
+    rng = np.random.default_rng(seed)
+    qualities = list(QUALITIES)
+    pieces = []
+    truth = []
+    elapsed = 0.0
+    while elapsed < total_seconds:
+        seconds = float(rng.choice([1.0, 2.0, 2.0, 4.0]))
+        root = int(rng.integers(12))
+        quality = qualities[int(rng.integers(len(qualities)))]
+        chord = np.zeros(int(seconds * SR))
+        for interval in QUALITIES[quality]:
+            chord += synth_note(60 + root + interval, seconds, rng)
+        chord += 0.8 * synth_note(36 + root, seconds, rng)
+        pieces.append(chord)
+        truth.append((elapsed, elapsed + seconds, f'{NOTES[root]}:{quality}'))
+        elapsed += seconds
+    y = np.concatenate(pieces)
+    y += 0.05 * rng.standard_normal(len(y))
+    return (y / np.abs(y).max()).astype(np.float32), truth
+
+
+def triad(label):
+    """Reduz para tônica + maj/min (o laço antigo só distingue isso)"""
+    if ':' not in label:
+        return label
+    root, quality = label.split(':', 1)
+    return f"{root}:{'min' if quality.startswith('min') else 'maj'}"
+
+
+def accuracy(truth, predicted, total_seconds, reduce=triad, step=0.05):
+    times = np.arange(0, total_seconds, step)
+
+    def label_at(segments):
+        labels = np.full(len(times), 'N', dtype=object)
+        for start, end, label in segments:
+            labels[(times >= start) & (times < end)] = reduce(label)
+        return labels
+
+    reference = label_at(truth)
+    estimate = label_at(predicted)
+    return float((reference == estimate).mean())
+
+
+def legacy_decode(chroma, sr, total_seconds, hop_length=2048):
+    """Laço anterior de detect_chords_chroma (segmentos de 2s, argmax como tônica)"""
+    frames_per_segment = int(2 * sr / hop_length)
+    chords = []
+    prev_chord = None
+    for i in range(0, chroma.shape[1], frames_per_segment):
+        segment = chroma[:, i:i + frames_per_segment]
+        if segment.shape[1] == 0:
+            continue
+        chroma_mean = segment.mean(axis=1)
+        chroma_mean = chroma_mean / (chroma_mean.max() + 1e-6)
+        if (chroma_mean > 0.3).sum() < 2:
+            continue
+        root_idx = chroma_mean.argmax()
+        third_major = chroma_mean[(root_idx + 4) % 12]
+        third_minor = chroma_mean[(root_idx + 3) % 12]
+        fifth = chroma_mean[(root_idx + 7) % 12]
+        if third_major > third_minor + 0.1:
+            quality = 'maj'
+        elif third_minor > third_major + 0.1:
+            quality = 'min'
+        else:
+            quality = '5' if fifth > 0.4 else 'maj'
+        label = f'{NOTES[root_idx]}:{quality}'
+        start_time = i * hop_length / sr
+        end_time = min((i + frames_per_segment) * hop_length / sr, total_seconds)
+        if label != prev_chord:
+            chords.append((start_time, end_time, label))
+            prev_chord = label
+        else:
+            chords[-1] = (chords[-1][0], end_time, label)
+    return chords
+
+
+def legacy_file(path):
+    y, sr = librosa.load(path, sr=22050)  # sem o limite de 180s, para comparar faixas inteiras
+    chroma = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=2048, bins_per_octave=36)
+    return legacy_decode(chroma, sr, len(y) / sr)
+
+
+def vectorized_file(path):
+    return [(c['start'], c['end'], c['chord']) for c in chord_recognizer.recognize_file(path)]
+
+
+def vectorized_decode(chroma, sr, total_seconds):
+    segments = chord_recognizer.recognize(chroma, sr, HOP_LENGTH, total_seconds)
+    return [(c['start'], c['end'], c['chord']) for c in segments]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconhecimento de acordes: vetorizado vs laço')
+    parser.add_argument('--songs', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=240.0)
+    args = parser.parse_args()
+
+    import soundfile as sf
+
+    workdir = tempfile.mkdtemp(prefix='bench_chords_')
+    songs = []
+    for seed in range(args.songs):
+        y, truth = synth_progression(seed, args.seconds)
+        path = os.path.join(workdir, f'song_{seed}.wav')
+        sf.write(path, librosa.resample(y, orig_sr=SR, target_sr=44100), 44100)
+        songs.append((path, truth))
+
+    # Aquecimento: filtros do CQT são construídos na primeira chamada
+    legacy_file(songs[0][0])
+    vectorized_file(songs[0][0])
+
+    methods = {
+        'laço antigo': (legacy_file, legacy_decode, 22050, 2048),
+        'vetorizado': (vectorized_file, vectorized_decode, SAMPLE_RATE, HOP_LENGTH),
+    }
+
+    print(f"\n{args.songs} progressões sintéticas de {args.seconds:.0f}s (WAV 44.1 kHz)")
+    print(f"{'método':>12} | {'maj/min':>7} | {'exato':>6} | {'acordes':>7} | {'arquivo→acordes':>15} | {'só decodificação':>16}")
+    for name, (from_file, decode, sr, hop) in methods.items():
+        scores, exact, counts = [], [], []
+        total = decode_total = 0.0
+        for path, truth in songs:
+            start = time.perf_counter()
+            predicted = from_file(path)
+            total += time.perf_counter() - start
+            scores.append(accuracy(truth, predicted, args.seconds))
+            exact.append(accuracy(truth, predicted, args.seconds, reduce=lambda label: label))
+            counts.append(len(predicted))
+
+            y, _ = librosa.load(path, sr=sr)
+            chroma = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=hop, bins_per_octave=36)
+            start = time.perf_counter()
+            decode(chroma, sr, len(y) / sr)
+            decode_total += time.perf_counter() - start
+
+        print(f"{name:>12} | {np.mean(scores):>7.1%} | {np.mean(exact):>6.1%} | {np.mean(counts):>7.0f} | "
+              f"{total / len(songs):>14.2f}s | {decode_total / len(songs) * 1000:>14.1f}ms")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# bench_chunked_separation.py - Separação em trechos paralelos: qualidade vs faixa inteira e tempo por nº de cores
+#
+# Uso (a partir de backend/):
+#   python benchmarks/bench_chunked_separation.py caminho/musica.mp3 --workers 1 2 4 8
+#
+# A qualidade é medida como SDR (dB) de cada stem do modo chunked contra a saída
+# do Demucs sem divisão; acima de ~30 dB as diferenças ficam inaudíveis.
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import parallel_separation  # noqa: E402
+from demucs_pool import DemucsModelPool, load_audio  # noqa: E402
+
+
+def sdr(reference, estimate):
+    noise = reference - estimate
+    return 10 * np.log10((reference ** 2).sum() / max((noise ** 2).sum(), 1e-12))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Separação chunked vs faixa inteira')
+    parser.add_argument('audio')
+    parser.add_argument('--model', default='htdemucs')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--min-sdr', type=float, default=30.0)
+    args = parser.parse_args()
+
+    import torch
+    from demucs.apply import apply_model
+
+    config = {'shifts': 0, 'overlap': 0.25}
+    pool = DemucsModelPool()
+    model = pool.get_model(args.model)
+    wav = load_audio(args.audio, model)
+    ref = wav.mean(0)
+    wav = (wav - ref.mean()) / ref.std()
+    seconds = wav.shape[-1] / model.samplerate
+
+    start = time.time()
+    with torch.no_grad():
+        reference = apply_model(model, wav[None], shifts=0, split=True, overlap=0.25)[0].numpy()
+    baseline = time.time() - start
+
+    print(f"\nÁudio: {seconds:.1f}s | Modelo: {args.model}")
+    print(f"Faixa inteira (1 processo): {baseline:.1f}s")
+    print(f"{'workers':>8} | {'tempo':>8} | {'speedup':>7} | SDR por stem (dB)")
+
+    worst = float('inf')
+    for workers in sorted(set(args.workers)):
+        array = wav.numpy().astype(np.float32)
+        # Aquecimento: cada worker carrega o modelo uma vez
+        parallel_separation.separate_array(
+            args.model, array[:, :model.samplerate * 30], model.samplerate,
+            len(model.sources), config, None, workers
+        )
+        start = time.time()
+        estimate = parallel_separation.separate_array(
+            args.model, array, model.samplerate, len(model.sources), config, None, workers
+        )
+        elapsed = time.time() - start
+        scores = [sdr(reference[i], estimate[i]) for i in range(len(model.sources))]
+        worst = min(worst, *scores)
+        detail = ', '.join(f'{name} {score:.1f}' for name, score in zip(model.sources, scores))
+        print(f"{workers:>8} | {elapsed:>7.1f}s | {baseline / elapsed:>6.2f}x | {detail}")
+
+    if worst < args.min_sdr:
+        print(f"\n✗ SDR mínimo {worst:.1f} dB abaixo do limite de {args.min_sdr:.1f} dB")
+        sys.exit(1)
+    print(f"\n✓ SDR mínimo {worst:.1f} dB (limite {args.min_sdr:.1f} dB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# bench_crema_batch.py - Acordes em lote: uma chamada do keras por música vs uma por lote
+#
+# Uso (a partir de backend/):
+#   python benchmarks/bench_crema_batch.py musica1.mp3 musica2.mp3 ... --batch-size 8
+#
+# Mede músicas/minuto dos dois modos (features já extraídas uma vez, só inferência +
+# conversão em acordes) e a concordância dos acordes: o preenchimento do lote pode
+# mudar só os quadros finais de cada música.
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crema_pool import CremaChordPool  # noqa: E402
+
+
+def chord_frames(annotation, step=0.1):
+    """Acorde a cada `step` segundos (para comparar as duas anotações)"""
+    labels = []
+    for observation in annotation.data:
+        count = int(round(float(observation.duration) / step))
+        labels.extend([observation.value] * count)
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CREMA: predição por música vs em lote')
+    parser.add_argument('audio', nargs='+')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--min-agreement', type=float, default=0.98)
+    args = parser.parse_args()
+
+    pool = CremaChordPool()
+    pool.warm_up()
+    features = [pool.features(path) for path in args.audio]
+
+    start = time.time()
+    single = [pool.predict(path, features=feats) for path, feats in zip(args.audio, features)]
+    single_time = time.time() - start
+
+    start = time.time()
+    batched = []
+    for offset in range(0, len(args.audio), args.batch_size):
+        paths = args.audio[offset:offset + args.batch_size]
+        feats = features[offset:offset + args.batch_size]
+        for annotation, error in pool._predict_stacked(paths, feats):
+            if error is not None:
+                raise error
+            batched.append(annotation)
+    batch_time = time.time() - start
+
+    agreements = []
+    for a, b in zip(single, batched):
+        frames_a, frames_b = chord_frames(a), chord_frames(b)
+        n = min(len(frames_a), len(frames_b))
+        agreements.append(sum(x == y for x, y in zip(frames_a[:n], frames_b[:n])) / max(n, 1))
+
+    songs = len(args.audio)
+    print(f"\nMúsicas: {songs} | Lote: {args.batch_size}")
+    print(f"Uma por vez: {single_time:.2f}s ({songs / single_time * 60:.1f} músicas/min)")
+    print(f"Em lote:     {batch_time:.2f}s ({songs / batch_time * 60:.1f} músicas/min)")
+    print(f"Ganho: {single_time / batch_time:.2f}x")
+    worst = min(agreements)
+    print(f"Concordância dos acordes: pior {worst:.3f} | média {sum(agreements) / songs:.3f}")
+    if worst < args.min_agreement:
+        print(f"✗ Concordância abaixo de {args.min_agreement}")
+        sys.exit(1)
+    print("✓ Lote equivalente à predição por música")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# bench_demucs_pool.py - Latência por job: subprocess (frio) vs pool em memória (quente)
+#
+# Uso (a partir de backend/):
+#   python benchmarks/bench_demucs_pool.py caminho/musica.mp3 --jobs 3 --quality basic
+#
+# Sem arquivo, gera 30s de ruído estéreo para medir só o overhead de engine.
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from demucs_pool import DemucsModelPool  # noqa: E402
+
+QUALITIES = {
+    'basic': {'shifts': 0, 'overlap': 0.25, 'mp3': False},
+    'intermediate': {'shifts': 1, 'overlap': 0.4, 'mp3': False, 'float32': True},
+}
+
+
+def make_test_audio(path, seconds=30, samplerate=44100):
+    import numpy as np
+    import soundfile as sf
+    rng = np.random.default_rng(0)
+    sf.write(path, 0.1 * rng.standard_normal((seconds * samplerate, 2)).astype('float32'), samplerate)
+
+
+def run_cold(audio_path, model_name, config, out_dir):
+    cmd = [
+        sys.executable, '-m', 'demucs',
+        '-n', model_name,
+        '--shifts', str(config['shifts']),
+        '--overlap', str(config['overlap']),
+        '--device', 'cpu',
+        '--out', out_dir, audio_path,
+    ]
+    start = time.time()
+    subprocess.run(cmd, check=True, capture_output=True)
+    return time.time() - start
+
+
+def run_warm(pool, audio_path, model_name, config, out_dir):
+    start = time.time()
+    pool.separate(model_name, audio_path, out_dir, config)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Demucs: subprocess frio vs pool quente')
+    parser.add_argument('audio', nargs='?')
+    parser.add_argument('--model', default='htdemucs')
+    parser.add_argument('--quality', default='basic', choices=sorted(QUALITIES))
+    parser.add_argument('--jobs', type=int, default=3)
+    args = parser.parse_args()
+
+    config = QUALITIES[args.quality]
+    with tempfile.TemporaryDirectory() as tmp:
+        audio_path = args.audio
+        if audio_path is None:
+            audio_path = os.path.join(tmp, 'noise.wav')
+            make_test_audio(audio_path)
+
+        cold = [run_cold(audio_path, args.model, config, os.path.join(tmp, 'cold'))
+                for _ in range(args.jobs)]
+
+        pool = DemucsModelPool()
+        start = time.time()
+        pool.get_model(args.model)
+        load_time = time.time() - start
+        warm = [run_warm(pool, audio_path, args.model, config, os.path.join(tmp, f'warm{i}'))
+                for i in range(args.jobs)]
+
+    print(f"\nModelo: {args.model} | Qualidade: {args.quality} | Jobs: {args.jobs}")
+    print(f"{'job':>4} | {'subprocess (frio)':>18} | {'pool (quente)':>14}")
+    for i, (c, w) in enumerate(zip(cold, warm), 1):
+        print(f"{i:>4} | {c:>17.2f}s | {w:>13.2f}s")
+    print(f"Carga única do modelo no pool: {load_time:.2f}s")
+    print(f"Média: frio {sum(cold) / len(cold):.2f}s | quente {sum(warm) / len(warm):.2f}s")
+
+
+if __name__ == '__main__':
+    main()
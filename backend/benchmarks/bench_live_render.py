@@ -0,0 +1,73 @@
+# bench_live_render.py - Pitch/velocidade em tempo real (/api/live): tempo até o primeiro quadro e folga de CPU
+#
+# Uso (a partir de backend/):
+#   python benchmarks/bench_live_render.py caminho/musica.wav
+#   python benchmarks/bench_live_render.py caminho/musica.wav --positions 0 60 180
+#
+# Por posição: tempo até o primeiro quadro (abrir o arquivo + preroll + primeiro quadro),
+# quadros até uma troca de parâmetros aparecer no stream (tem que ser 1) e velocidade de
+# render sem o limite de LEAD_SECONDS (x tempo real; abaixo de 1 o player engasga).
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import live_render  # noqa: E402
+
+SETTINGS = [(2, 1.0), (-3, 0.8), (5, 1.25)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempo real: primeiro quadro e velocidade de render')
+    parser.add_argument('audio')
+    parser.add_argument('--positions', type=float, nargs='+', default=[0, 30])
+    parser.add_argument('--seconds', type=float, default=10.0, help='áudio renderizado por medição')
+    parser.add_argument('--max-first-frame', type=float, default=1.0)
+    args = parser.parse_args()
+
+    # Sem espera pelo playhead: mede o quanto o render está à frente do tempo real
+    live_render.LEAD_SECONDS = float('inf')
+
+    print(f"\n{'posição':>8} | {'semitons':>8} | {'vel.':>5} | {'1º quadro':>9} | {'troca':>5} | {'x tempo real':>12}")
+    failures = 0
+    for position in args.positions:
+        for semitones, rate in SETTINGS:
+            start = time.monotonic()
+            session = live_render.LiveSession(args.audio, position, semitones, rate)
+            frames = session.frames()
+            next(frames)
+            first_frame = time.monotonic() - start
+
+            # Troca com posição: quantos quadros até a nova época
+            epoch = session.set_params(-semitones, 1.0, position)
+            latency = 0
+            for frame in frames:
+                latency += 1
+                if live_render.FRAME_HEADER.unpack(frame[:live_render.FRAME_HEADER.size])[0] == epoch:
+                    break
+
+            rendered = 0.0
+            start = time.monotonic()
+            for frame in frames:
+                rendered += live_render.FRAME_HEADER.unpack(frame[:live_render.FRAME_HEADER.size])[1]
+                if rendered >= args.seconds * session.sample_rate:
+                    break
+            speed = rendered / session.sample_rate / (time.monotonic() - start)
+            session.close()
+            frames.close()
+
+            ok = first_frame <= args.max_first_frame and latency == 1 and speed > 1
+            failures += not ok
+            print(f"{position:>7.0f}s | {semitones:>+8} | {rate:>5.2f} | {first_frame * 1000:>7.0f}ms | "
+                  f"{latency:>5} | {speed:>11.1f}x {'✓' if ok else '✗'}")
+
+    if failures:
+        print(f"\n✗ {failures} medição(ões) lentas demais para tempo real")
+        sys.exit(1)
+    print(f"\n✓ Primeiro quadro em menos de {args.max_first_frame:.1f}s e troca no quadro seguinte")
+
+
+if __name__ == '__main__':
+    main()
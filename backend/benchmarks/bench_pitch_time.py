@@ -0,0 +1,101 @@
+# bench_pitch_time.py - Pitch + velocidade numa passada (pitch_time) vs pitch_shift seguido de time_stretch
+#
+# Uso (a partir de backend/):
+#   python benchmarks/bench_pitch_time.py --seconds 180
+#   python benchmarks/bench_pitch_time.py --audio caminho/musica.wav
+#
+# Tempo: estéreo de --seconds segundos (ou --audio) em cada combinação de sliders.
+# Correção: num tom de 440 Hz, a duração tem que ser L / velocidade (exato, em amostras)
+# e a frequência medida 440 * 2^(semitons/12) (erro em cents).
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import librosa  # noqa: E402
+import numpy as np  # noqa: E402
+
+import pitch_time  # noqa: E402
+
+SR = 44100
+SETTINGS = [(2, 1.0), (0, 1.25), (3, 0.8), (-4, 1.1), (7, 1.5)]
+
+
+def two_step(y, sr, semitones, rate):
+    """Caminho antigo do /api/process-audio"""
+    if semitones != 0:
+        y = librosa.effects.pitch_shift(y, sr=sr, n_steps=semitones)
+    if rate != 1.0:
+        y = librosa.effects.time_stretch(y, rate=rate)
+    return y
+
+
+def dominant_frequency(y, sr):
+    """Pico do espectro (interpolação parabólica) no trecho central, longe das bordas"""
+    y = np.atleast_2d(y)[0]
+    middle = y[len(y) // 4:len(y) // 4 + len(y) // 2]
+    middle = middle * np.hanning(len(middle))
+    spectrum = np.abs(np.fft.rfft(middle))
+    peak = int(np.argmax(spectrum[1:-1])) + 1
+    a, b, c = np.log(spectrum[peak - 1:peak + 2] + 1e-12)
+    offset = 0.5 * (a - c) / (a - 2 * b + c)
+    return (peak + offset) * sr / len(middle)
+
+
+def cents(measured, expected):
+    return 1200 * np.log2(measured / expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pitch + velocidade: uma passada vs duas')
+    parser.add_argument('--seconds', type=float, default=120.0)
+    parser.add_argument('--audio', help='arquivo real para o tempo (senão ruído rosa estéreo)')
+    parser.add_argument('--max-cents', type=float, default=5.0)
+    args = parser.parse_args()
+
+    if args.audio:
+        y, sr = librosa.load(args.audio, sr=None, mono=False)
+        y = np.atleast_2d(y).astype(np.float32)
+    else:
+        rng = np.random.default_rng(0)
+        sr = SR
+        white = rng.standard_normal((2, int(args.seconds * sr)))
+        y = (np.cumsum(white, axis=1) * 0.001).astype(np.float32)
+        y -= y.mean(axis=1, keepdims=True)
+
+    print(f"\nÁudio: {y.shape[-1] / sr:.1f}s, {y.shape[0]} canais @ {sr} Hz")
+    print(f"{'semitons':>8} | {'vel.':>5} | {'2 passadas':>10} | {'1 passada':>9} | {'speedup':>7}")
+    for semitones, rate in SETTINGS:
+        start = time.time()
+        two_step(y, sr, semitones, rate)
+        before = time.time() - start
+        start = time.time()
+        pitch_time.shift_and_stretch(y, sr, semitones, rate)
+        after = time.time() - start
+        print(f"{semitones:>+8} | {rate:>5.2f} | {before:>9.2f}s | {after:>8.2f}s | {before / after:>6.2f}x")
+
+    print("\nTom de 440 Hz (5s estéreo): duração e pitch")
+    print(f"{'semitons':>8} | {'vel.':>5} | {'amostras':>9} | {'esperado':>9} | {'Hz':>7} | {'cents':>6}")
+    t = np.arange(5 * SR) / SR
+    tone = np.stack([np.sin(2 * np.pi * 440 * t)] * 2).astype(np.float32)
+    failures = 0
+    for semitones, rate in SETTINGS:
+        out = pitch_time.shift_and_stretch(tone, SR, semitones, rate)
+        expected_length = pitch_time.output_length(tone.shape[-1], rate)
+        frequency = dominant_frequency(out, SR)
+        error = cents(frequency, 440 * 2 ** (semitones / 12))
+        ok = out.shape == (2, expected_length) and abs(error) <= args.max_cents
+        failures += not ok
+        print(f"{semitones:>+8} | {rate:>5.2f} | {out.shape[-1]:>9} | {expected_length:>9} | "
+              f"{frequency:>7.1f} | {error:>+6.1f} {'✓' if ok else '✗'}")
+
+    if failures:
+        print(f"\n✗ {failures} combinação(ões) com duração ou pitch errados")
+        sys.exit(1)
+    print(f"\n✓ Duração exata e pitch dentro de {args.max_cents:.0f} cents")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# bench_pitch_time_stream.py - Render de pitch/velocidade em blocos (memória constante) vs arquivo inteiro
+#
+# Uso (a partir de backend/):
+#   python benchmarks/bench_pitch_time_stream.py --minutes 1 5 10
+#   python benchmarks/bench_pitch_time_stream.py --minutes 60 --skip-batch
+#
+# Memória: pico do tracemalloc (arrays do NumPy) lendo, processando e gravando WAVs estéreo de
+# --minutes minutos. Em blocos o pico tem que ficar igual para qualquer duração.
+# Correção: a saída em blocos tem que bater com o mesmo algoritmo aplicado ao sinal inteiro
+# (STFT/phase vocoder/ISTFT do librosa em float64 + resample soxr).
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import soundfile as sf  # noqa: E402
+
+import pitch_time  # noqa: E402
+
+SR = 44100
+SEMITONES, RATE = 3, 0.8
+
+
+def write_noise(path, minutes, sr=SR):
+    """Ruído avermelhado estéreo gravado aos poucos (o próprio arquivo de teste não ocupa RAM)"""
+    from scipy.signal import lfilter
+    rng = np.random.default_rng(0)
+    state = np.zeros((1, 2))
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=2, subtype='PCM_16') as out:
+        for _ in range(int(round(minutes * 60))):
+            # Passa-baixas de 1 polo, ~0.15 RMS: sem clipping (quadros saturados têm bins ~0,
+            # cuja fase é só arredondamento e faria a comparação divergir)
+            block, state = lfilter([1.0], [1.0, -0.99], rng.standard_normal((sr, 2)) * 0.02,
+                                   axis=0, zi=state)
+            out.write(block)
+
+
+def render_stream(src, dst):
+    blocks = pitch_time.stream_file(src, SEMITONES, RATE)
+    sr, channels, _ = next(blocks)
+    with sf.SoundFile(dst, 'w', samplerate=sr, channels=channels, subtype='PCM_16') as out:
+        for block in blocks:
+            out.write(block)
+
+
+def render_batch(src, dst):
+    y, sr = sf.read(src, dtype='float32', always_2d=True)
+    y = pitch_time.shift_and_stretch(y.T, sr, SEMITONES, RATE)
+    sf.write(dst, y.T, sr, subtype='PCM_16')
+
+
+def measure(render, src, dst):
+    tracemalloc.start()
+    start = time.time()
+    render(src, dst)
+    elapsed = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024 ** 2
+
+
+def reference(y, sr):
+    """shift_and_stretch em float64 (o phase vocoder do librosa acumula a fase em float32)"""
+    import librosa
+    length = pitch_time.output_length(y.shape[-1], RATE)
+    shift = pitch_time.pitch_rate(SEMITONES)
+    stretch = shift * RATE
+    stft = librosa.stft(y, n_fft=pitch_time.N_FFT, hop_length=pitch_time.HOP_LENGTH)
+    stft = librosa.phase_vocoder(stft, rate=stretch, hop_length=pitch_time.HOP_LENGTH, n_fft=pitch_time.N_FFT)
+    y = librosa.istft(stft, hop_length=pitch_time.HOP_LENGTH, n_fft=pitch_time.N_FFT,
+                      length=pitch_time.output_length(y.shape[-1], stretch))
+    y = librosa.resample(y, orig_sr=sr / shift, target_sr=sr, res_type=pitch_time.RES_TYPE)
+    return librosa.util.fix_length(y, size=length)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pitch/velocidade em blocos vs arquivo inteiro')
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--skip-batch', action='store_true', help='só o render em blocos')
+    parser.add_argument('--max-growth', type=float, default=1.2,
+                        help='pico em blocos do maior arquivo / do menor')
+    parser.add_argument('--max-diff', type=float, default=1e-4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"\nPitch {SEMITONES:+d} semitons, velocidade {RATE:.2f}x (estéreo {SR} Hz)")
+        print(f"{'minutos':>7} | {'blocos':>8} | {'pico':>8} | {'inteiro':>8} | {'pico':>8}")
+        peaks = []
+        for minutes in args.minutes:
+            src = os.path.join(tmp, 'input.wav')
+            write_noise(src, minutes)
+            stream_time, stream_peak = measure(render_stream, src, os.path.join(tmp, 'stream.wav'))
+            peaks.append(stream_peak)
+            line = f"{minutes:>7g} | {stream_time:>7.1f}s | {stream_peak:>5.0f} MB"
+            if not args.skip_batch:
+                batch_time, batch_peak = measure(render_batch, src, os.path.join(tmp, 'batch.wav'))
+                line += f" | {batch_time:>7.1f}s | {batch_peak:>5.0f} MB"
+            print(line)
+            os.remove(src)
+
+        print("\nCorreção (20s):")
+        src = os.path.join(tmp, 'short.wav')
+        write_noise(src, 20 / 60)
+        y, sr = sf.read(src, dtype='float64', always_2d=True)
+        expected = reference(y.T, sr)
+        blocks = pitch_time.stream_file(src, SEMITONES, RATE)
+        next(blocks)
+        streamed = np.concatenate(list(blocks)).T
+        diff = float(np.abs(streamed - expected).max()) if streamed.shape == expected.shape else np.inf
+        print(f"  amostras: {streamed.shape[-1]} (esperado {expected.shape[-1]}) | dif. máx: {diff:.2e}")
+
+    growth = max(peaks) / min(peaks)
+    if diff > args.max_diff:
+        print(f"\n✗ Saída em blocos diferente do sinal inteiro ({diff:.2e})")
+        sys.exit(1)
+    if growth > args.max_growth:
+        print(f"\n✗ Pico em blocos cresceu {growth:.2f}x com a duração")
+        sys.exit(1)
+    print(f"\n✓ Mesma saída e pico constante ({min(peaks):.0f}-{max(peaks):.0f} MB)")
+
+
+if __name__ == '__main__':
+    main()
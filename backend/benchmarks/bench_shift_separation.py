@@ -0,0 +1,106 @@
+# bench_shift_separation.py - Shifts em paralelo (engine=shifts) vs sequencial, por qualidade
+#
+# Uso (a partir de backend/):
+#   python benchmarks/bench_shift_separation.py caminho/musica.mp3 --workers 4
+#
+# Os deslocamentos sorteados pelo engine paralelo são repassados ao apply_model sequencial:
+# com as mesmas passadas as saídas devem coincidir (diferença máxima ~0, só arredondamento).
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import parallel_separation  # noqa: E402
+from demucs_pool import DemucsModelPool, load_audio  # noqa: E402
+
+# shifts/overlap de QUALITY_CONFIGS (app.py)
+TIERS = {
+    'basic': {'shifts': 0, 'overlap': 0.25},
+    'intermediate': {'shifts': 1, 'overlap': 0.4},
+    'maximum': {'shifts': 3, 'overlap': 0.5},
+}
+
+
+class _ReplayOffsets:
+    """Substitui demucs.apply.random: devolve os deslocamentos já sorteados, na ordem"""
+
+    def __init__(self, offsets):
+        self._offsets = iter(offsets)
+
+    def randint(self, low, high):
+        return next(self._offsets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shifts em paralelo vs sequencial')
+    parser.add_argument('audio')
+    parser.add_argument('--model', default='htdemucs')
+    parser.add_argument('--tiers', nargs='+', default=list(TIERS), choices=list(TIERS))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-diff', type=float, default=1e-4)
+    args = parser.parse_args()
+
+    import torch
+    import demucs.apply as demucs_apply
+
+    pool = DemucsModelPool()
+    model = pool.get_model(args.model)
+    wav = load_audio(args.audio, model)
+    ref = wav.mean(0)
+    wav = (wav - ref.mean()) / ref.std()
+    array = wav.numpy().astype(np.float32)
+    seconds = wav.shape[-1] / model.samplerate
+
+    # Aquecimento: cada worker carrega o modelo uma vez
+    parallel_separation.separate_shifts_array(
+        args.model, model, array[:, :model.samplerate * 10], {'shifts': args.workers, 'overlap': 0.25},
+        None, args.workers
+    )
+
+    print(f"\nÁudio: {seconds:.1f}s | Modelo: {args.model} | {args.workers} processos")
+    print(f"{'qualidade':>12} | {'shifts':>6} | {'sequencial':>10} | {'paralelo':>9} | {'speedup':>7} | dif. máx")
+
+    worst = 0.0
+    for tier in args.tiers:
+        config = TIERS[tier]
+        offsets = [offset for _, offset in parallel_separation.plan_shifts(
+            model, config['shifts'], random.Random(args.seed)) if offset is not None]
+
+        original_random = demucs_apply.random
+        demucs_apply.random = _ReplayOffsets(offsets)
+        try:
+            start = time.time()
+            with torch.no_grad():
+                sequential = demucs_apply.apply_model(
+                    model, wav[None], shifts=config['shifts'], split=True,
+                    overlap=config['overlap'], device='cpu'
+                )[0].numpy()
+            sequential_time = time.time() - start
+        finally:
+            demucs_apply.random = original_random
+
+        start = time.time()
+        parallel = parallel_separation.separate_shifts_array(
+            args.model, model, array, config, None, args.workers, rng=random.Random(args.seed)
+        )
+        parallel_time = time.time() - start
+
+        diff = float(np.abs(sequential - parallel).max())
+        worst = max(worst, diff)
+        print(f"{tier:>12} | {config['shifts']:>6} | {sequential_time:>9.1f}s | {parallel_time:>8.1f}s | "
+              f"{sequential_time / parallel_time:>6.2f}x | {diff:.2e}")
+
+    if worst > args.max_diff:
+        print(f"\n✗ Diferença máxima {worst:.2e} acima de {args.max_diff:.0e}")
+        sys.exit(1)
+    print(f"\n✓ Mesmo resultado do sequencial (diferença máxima {worst:.2e})")
+
+
+if __name__ == '__main__':
+    main()
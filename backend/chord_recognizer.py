@@ -0,0 +1,162 @@
+# chord_recognizer.py - Reconhecimento de acordes por chroma: templates (1 matmul) + suavização Viterbi
+import numpy as np
+
+NOTES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Intervalos (semitons a partir da tônica) de cada qualidade, em notação Harte
+QUALITIES = {
+    'maj': (0, 4, 7),
+    'min': (0, 3, 7),
+    '7': (0, 4, 7, 10),
+    'maj7': (0, 4, 7, 11),
+    'min7': (0, 3, 7, 10),
+}
+
+NO_CHORD = 'N'
+
+# 11025 Hz cobre as 7 oitavas do chroma (até ~4.2 kHz) com metade do custo de CQT de 22050 Hz
+SAMPLE_RATE = 11025
+HOP_LENGTH = 1024
+# Probabilidade de permanecer no mesmo acorde a cada frame (~93 ms com hop 1024 @ 11025 Hz)
+SELF_TRANSITION = 0.97
+# Nitidez da distribuição de emissão a partir da similaridade de cosseno
+EMISSION_SHARPNESS = 20.0
+# Similaridade atribuída ao estado "sem acorde" (silêncio / ruído sem harmonia)
+NO_CHORD_SCORE = 0.45
+# Frames com energia abaixo desta fração da mediana são tratados como silêncio
+SILENCE_RATIO = 0.05
+# Segmentos mais curtos que isso são absorvidos pelos vizinhos
+MIN_SEGMENT_SECONDS = 0.3
+
+
+def build_templates():
+    """Matriz (acordes x 12) normalizada e os rótulos Harte correspondentes"""
+    labels = []
+    rows = []
+    for quality, intervals in QUALITIES.items():
+        base = np.zeros(12, dtype=np.float32)
+        base[list(intervals)] = 1.0
+        # Tônica e quinta pesam mais que as notas de cor (terça, sétima)
+        base[0] += 0.5
+        base[7] += 0.25
+        for root in range(12):
+            rows.append(np.roll(base, root))
+            labels.append(f'{NOTES[root]}:{quality}')
+    templates = np.stack(rows)
+    templates /= np.linalg.norm(templates, axis=1, keepdims=True)
+    return templates, labels
+
+
+TEMPLATES, LABELS = build_templates()
+STATE_LABELS = LABELS + [NO_CHORD]
+
+
+def frame_scores(chroma, templates=TEMPLATES):
+    """
+    Similaridade de cosseno de todos os frames contra todos os templates
+
+    chroma: (12 x frames). Retorna (acordes + 1 x frames); a última linha é "sem acorde".
+    """
+    energy = chroma.sum(axis=0)
+    norms = np.linalg.norm(chroma, axis=0)
+    unit = chroma / np.maximum(norms, 1e-9)
+    scores = templates @ unit
+
+    silent = energy < SILENCE_RATIO * max(float(np.median(energy)), 1e-9)
+    scores[:, silent] = 0.0
+    no_chord = np.full((1, chroma.shape[1]), NO_CHORD_SCORE, dtype=scores.dtype)
+    no_chord[0, silent] = 1.0
+    return np.vstack([scores, no_chord])
+
+
+def emission_probabilities(scores, sharpness=EMISSION_SHARPNESS):
+    """Softmax por frame: similaridade -> probabilidade de cada estado"""
+    logits = sharpness * scores
+    logits -= logits.max(axis=0, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=0, keepdims=True)
+    return probs
+
+
+def viterbi_path(probs, self_transition=SELF_TRANSITION):
+    """
+    Sequência de estados mais provável com transição "fica ou troca uniforme"
+
+    Com essa matriz o máximo sobre o estado anterior é max(ficar, melhor estado + trocar),
+    então cada frame custa O(estados) em vez de O(estados²).
+    """
+    n_states, n_frames = probs.shape
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    log_probs = np.log(np.maximum(probs, 1e-12))
+    log_stay = np.log(self_transition)
+    log_switch = np.log((1.0 - self_transition) / max(n_states - 1, 1))
+
+    backpointers = np.empty((n_frames, n_states), dtype=np.int64)
+    states = np.arange(n_states)
+    delta = log_probs[:, 0] - np.log(n_states)
+    for t in range(1, n_frames):
+        best = int(delta.argmax())
+        stay = delta + log_stay
+        switch = delta[best] + log_switch
+        keep = stay >= switch
+        backpointers[t] = np.where(keep, states, best)
+        delta = np.where(keep, stay, switch) + log_probs[:, t]
+
+    path = np.empty(n_frames, dtype=np.int64)
+    path[-1] = int(delta.argmax())
+    for t in range(n_frames - 1, 0, -1):
+        path[t - 1] = backpointers[t, path[t]]
+    return path
+
+
+def path_to_segments(path, frame_seconds, total_seconds, labels=STATE_LABELS,
+                     min_segment_seconds=MIN_SEGMENT_SECONDS):
+    """Converte a sequência de estados em [{'start', 'end', 'chord'}] (rótulos Harte, sem 'N')"""
+    if len(path) == 0:
+        return []
+
+    changes = np.flatnonzero(np.diff(path)) + 1
+    starts = np.concatenate([[0], changes])
+    ends = np.concatenate([changes, [len(path)]])
+
+    segments = []
+    for start, end in zip(starts, ends):
+        label = labels[path[start]]
+        start_time = float(start * frame_seconds)
+        end_time = float(min(end * frame_seconds, total_seconds))
+        if segments and (label == segments[-1]['chord']
+                         or end_time - start_time < min_segment_seconds):
+            segments[-1]['end'] = end_time
+            continue
+        segments.append({'start': start_time, 'end': end_time, 'chord': label})
+
+    return [segment for segment in segments if segment['chord'] != NO_CHORD]
+
+
+def recognize(chroma, sr, hop_length=HOP_LENGTH, total_seconds=None):
+    """Acordes (rótulos Harte) a partir de um chroma (12 x frames)"""
+    frame_seconds = hop_length / sr
+    if total_seconds is None:
+        total_seconds = chroma.shape[1] * frame_seconds
+    path = viterbi_path(emission_probabilities(frame_scores(chroma)))
+    return path_to_segments(path, frame_seconds, total_seconds)
+
+
+def recognize_audio(y, sr):
+    """Acordes (rótulos Harte) do sinal mono y"""
+    import librosa
+
+    # Mantém a duração do frame (a transição do Viterbi é calibrada por frame)
+    hop_length = max(64, int(round(HOP_LENGTH * sr / SAMPLE_RATE / 64)) * 64)
+    chroma = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=hop_length, bins_per_octave=36)
+    return recognize(chroma, sr, hop_length, total_seconds=len(y) / sr)
+
+
+def recognize_file(audio_path):
+    """Acordes (rótulos Harte) da faixa inteira em audio_path"""
+    import librosa
+
+    y, sr = librosa.load(audio_path, sr=SAMPLE_RATE)
+    return recognize_audio(y, sr)
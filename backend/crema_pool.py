@@ -0,0 +1,191 @@
+# crema_pool.py - Modelos CREMA carregados uma vez e reutilizados entre requisições
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import metrics
+
+
+class CremaChordPool:
+    """
+    Pool pequeno de ChordModel (grafo TF construído uma vez por instância)
+
+    Cada modelo é usado por uma thread por vez; a extração de features (CQT do
+    pump) não precisa do modelo e roda em paralelo. Em lote, as músicas passam
+    por uma única chamada do keras (predict_batch).
+    """
+
+    def __init__(self, size=1, audio_loader=None):
+        self.size = max(1, size)
+        # audio_loader(path) -> (y mono, sr): reaproveita o áudio já decodificado
+        self.audio_loader = audio_loader
+        self._available = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._pump = None
+        self.load_time = None
+        self.predictions = 0
+
+    def _create_model(self):
+        import crema
+
+        start = time.time()
+        model = crema.models.chord.ChordModel()
+        elapsed = time.time() - start
+        metrics.observe_stage('crema_load', elapsed, model='crema')
+        with self._lock:
+            if self._pump is None:
+                self._pump = model.pump
+                self.load_time = elapsed
+        print(f"✓ CREMA carregado em {elapsed:.1f}s (mantido em memória)")
+        return model
+
+    def _acquire(self):
+        try:
+            return self._available.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._create_model()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._available.get()
+
+    def _release(self, model):
+        self._available.put(model)
+
+    def warm_up(self):
+        self._release(self._acquire())
+
+    def is_loaded(self):
+        return self._pump is not None
+
+    def features(self, audio_path):
+        """Features de entrada do modelo (CQT); não ocupa um modelo do pool"""
+        if self._pump is None:
+            self.warm_up()
+        if self.audio_loader is not None:
+            y, sr = self.audio_loader(audio_path)
+            with metrics.stage_timer('crema_features', model='crema'):
+                return self._pump.transform(y=y, sr=sr)
+        with metrics.stage_timer('crema_features', model='crema'):
+            return self._pump.transform(audio_f=audio_path)
+
+    def predict(self, audio_path, features=None):
+        """Anotação JAMS de acordes para audio_path"""
+        if features is None:
+            features = self.features(audio_path)
+        model = self._acquire()
+        try:
+            start = time.perf_counter()
+            keras_model = model.model
+            pred = keras_model.predict([features[name] for name in keras_model.input_names], verbose=0)
+            outputs = {name: pred[i][0] for i, name in enumerate(keras_model.output_names)}
+            annotation = model.predict(filename=audio_path, outputs=outputs)
+            metrics.observe_stage('crema_predict', time.perf_counter() - start, model='crema')
+        finally:
+            self._release(model)
+        with self._lock:
+            self.predictions += 1
+        return annotation
+
+    def _predict_stacked(self, audio_paths, features_list):
+        """
+        Uma chamada do keras para o lote inteiro
+
+        As features são completadas no fim (eixo do tempo) até a mais longa com o nível de
+        silêncio da própria música e empilhadas; a saída de cada música é cortada de volta
+        no seu número de quadros. Retorna [(anotação, None) | (None, exceção)].
+        """
+        model = self._acquire()
+        try:
+            start = time.perf_counter()
+            keras_model = model.model
+            frames = [features[keras_model.input_names[0]].shape[1] for features in features_list]
+            longest = max(frames)
+            inputs = []
+            for name in keras_model.input_names:
+                stacked = []
+                for features in features_list:
+                    x = features[name]
+                    padding = [(0, 0)] * x.ndim
+                    padding[1] = (0, longest - x.shape[1])
+                    stacked.append(np.pad(x, padding, constant_values=x.min()))
+                inputs.append(np.concatenate(stacked))
+            pred = keras_model.predict(inputs, batch_size=len(features_list), verbose=0)
+            metrics.observe_stage('crema_predict_batch', time.perf_counter() - start, model='crema')
+
+            results = []
+            for index, path in enumerate(audio_paths):
+                outputs = {name: pred[i][index, :frames[index]]
+                           for i, name in enumerate(keras_model.output_names)}
+                try:
+                    results.append((model.predict(filename=path, outputs=outputs), None))
+                except Exception as e:
+                    results.append((None, e))
+        finally:
+            self._release(model)
+        with self._lock:
+            self.predictions += len(audio_paths)
+        return results
+
+    def predict_batch(self, audio_paths, feature_workers=4, on_result=None):
+        """
+        Processa vários arquivos: features em paralelo e uma inferência para o lote
+
+        Se a chamada em lote falhar, cai para uma predição por arquivo (o erro fica só
+        na música que falhou). Retorna [(anotação, None) | (None, exceção)] na mesma
+        ordem de audio_paths.
+        """
+        if self._pump is None:
+            self.warm_up()
+
+        results = [None] * len(audio_paths)
+        features = {}
+        with ThreadPoolExecutor(max_workers=max(1, feature_workers)) as executor:
+            futures = [executor.submit(self.features, path) for path in audio_paths]
+            for index, future in enumerate(futures):
+                try:
+                    features[index] = future.result()
+                except Exception as e:
+                    results[index] = (None, e)
+
+        ready = sorted(features)
+        try:
+            if ready:
+                batch = self._predict_stacked([audio_paths[index] for index in ready],
+                                              [features[index] for index in ready])
+                for index, result in zip(ready, batch):
+                    results[index] = result
+        except Exception as e:
+            print(f"⚠️  CREMA em lote falhou ({e}), predizendo um arquivo por vez")
+            for index in ready:
+                try:
+                    results[index] = (self.predict(audio_paths[index], features=features[index]), None)
+                except Exception as error:
+                    results[index] = (None, error)
+
+        if on_result:
+            for index, result in enumerate(results):
+                on_result(index, result)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self._pump is not None,
+                'models': self._created,
+                'size': self.size,
+                'load_time': self.load_time,
+                'predictions': self.predictions,
+            }
@@ -0,0 +1,330 @@
+# demucs_pool.py - Pool persistente de modelos Demucs (API Python, sem subprocess)
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import metrics
+
+# Separação progressiva: trechos prontos ficam em <pasta dos stems>/.segments até o fim do job
+SEGMENTS_DIR = '.segments'
+SEGMENTS_MANIFEST = 'manifest.jsonl'
+DEFAULT_BLOCK_SECONDS = 60.0
+
+# Progresso por thread: cada job registra seu callback antes do apply_model
+_progress_local = threading.local()
+
+
+class _PassProgress:
+    """Agrega o progresso de várias passadas (shifts x modelos do bag) em 0-100%"""
+
+    def __init__(self, total_passes, callback):
+        self.total_passes = max(1, total_passes)
+        self.callback = callback
+        self.current_pass = 0
+        self.last_percent = -1
+
+    def start_pass(self):
+        self.current_pass = min(self.current_pass + 1, self.total_passes)
+
+    def report(self, done, total):
+        fraction = (self.current_pass - 1 + done / max(1, total)) / self.total_passes
+        percent = int(fraction * 100)
+        if percent > self.last_percent:
+            self.last_percent = percent
+            self.callback(percent)
+
+
+class _TqdmShim:
+    """Substitui o módulo tqdm usado por demucs.apply para repassar o progresso"""
+
+    def __init__(self, original):
+        self._original = original
+
+    def tqdm(self, iterable, *args, **kwargs):
+        progress = getattr(_progress_local, 'progress', None)
+        if progress is None:
+            return self._original.tqdm(iterable, *args, **kwargs)
+        return _iter_with_progress(list(iterable), progress)
+
+    def __getattr__(self, name):
+        return getattr(self._original, name)
+
+
+def _iter_with_progress(items, progress):
+    progress.start_pass()
+    total = len(items)
+    for index, item in enumerate(items, 1):
+        yield item
+        # Executa quando o Demucs pede o próximo segmento (o atual terminou)
+        progress.report(index, total)
+
+
+def _install_progress_hook():
+    import demucs.apply as demucs_apply
+    if not isinstance(demucs_apply.tqdm, _TqdmShim):
+        demucs_apply.tqdm = _TqdmShim(demucs_apply.tqdm)
+
+
+def _sub_models(model):
+    from demucs.apply import BagOfModels
+    if isinstance(model, BagOfModels):
+        return list(model.models)
+    return [model]
+
+
+def max_allowed_segment(model):
+    """Maior segment aceito pelo modelo (Transformers não aceitam segmentos maiores que o treino)"""
+    from demucs.htdemucs import HTDemucs
+    limit = float('inf')
+    for sub in _sub_models(model):
+        if isinstance(sub, HTDemucs):
+            limit = min(limit, float(sub.segment))
+    return limit
+
+
+def resolve_segment(model, config):
+    """Converte o 'segment' do QUALITY_CONFIGS para o valor aceito pelo apply_model"""
+    segment = config.get('segment')
+    if not segment or segment == 'default':
+        return None
+    segment = float(segment)
+    limit = max_allowed_segment(model)
+    if segment > limit:
+        print(f"⚠️  Segment {segment:.0f}s acima do máximo do modelo ({limit:.1f}s), usando {limit:.1f}s")
+        return None
+    return segment
+
+
+def load_audio(audio_path, model, audio_loader=None):
+    """
+    Decodifica o áudio já no sample rate e nº de canais do modelo
+
+    audio_loader(path, samplerate, channels) -> (array, sr), quando dado, fornece o
+    áudio já decodificado (ex: DecodedAudioCache.get_channels) sem passar pelo ffmpeg.
+    """
+    from demucs.audio import AudioFile, convert_audio
+    if audio_loader is not None:
+        import warnings
+        import torch
+        data, _ = audio_loader(str(audio_path), model.samplerate, model.audio_channels)
+        with warnings.catch_warnings():
+            # Buffer somente leitura compartilhado: a normalização abaixo gera tensores novos
+            warnings.simplefilter('ignore', UserWarning)
+            return torch.from_numpy(data)
+    try:
+        return AudioFile(Path(audio_path)).read(
+            streams=0, samplerate=model.samplerate, channels=model.audio_channels
+        )
+    except Exception as e:
+        # Sem ffmpeg: decodifica com soundfile (wav/flac/ogg/mp3)
+        print(f"⚠️  ffmpeg falhou ({e}), usando soundfile")
+        import soundfile as sf
+        import torch
+        data, sr = sf.read(str(audio_path), dtype='float32', always_2d=True)
+        return convert_audio(torch.from_numpy(data.T), sr, model.samplerate, model.audio_channels)
+
+
+def save_stems(sources, model, out_dir, config, two_stems=None):
+    """Grava os stems com os mesmos nomes/formatos do CLI (ex: vocals.mp3, no_vocals.mp3)"""
+    from demucs.audio import save_audio
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ext = 'mp3' if config.get('mp3', False) else 'wav'
+    kwargs = {
+        'samplerate': model.samplerate,
+        'bitrate': config.get('mp3_bitrate') or 320,
+        'clip': 'rescale',
+        'as_float': bool(config.get('float32', False)),
+        'bits_per_sample': 16,
+    }
+
+    written = {}
+    for stem_name, source in named_sources(model, sources, two_stems).items():
+        path = out_dir / f'{stem_name}.{ext}'
+        save_audio(source, path, **kwargs)
+        written[stem_name] = str(path)
+    return written
+
+
+def named_sources(model, sources, two_stems=None):
+    """{stem: fonte}; com two_stems, junta o resto em no_<stem> (como o --two-stems do CLI)"""
+    named = dict(zip(model.sources, sources))
+    if two_stems:
+        selected = named.pop(two_stems)
+        rest = sum(named.values())
+        named = {two_stems: selected, f'no_{two_stems}': rest}
+    return named
+
+
+def save_segment(sources, model, out_dir, index, start, end, two_stems=None):
+    """
+    Grava um trecho pronto (WAV 16 bits) e acrescenta uma linha ao manifest
+
+    Arquivos: <out_dir>/.segments/<stem>.<índice>.wav. Retorna a entrada do manifest.
+    """
+    import soundfile as sf
+
+    segments_dir = os.path.join(out_dir, SEGMENTS_DIR)
+    os.makedirs(segments_dir, exist_ok=True)
+    stems = {}
+    for stem_name, source in named_sources(model, sources, two_stems).items():
+        path = os.path.join(segments_dir, f'{stem_name}.{index:03d}.wav')
+        partial_path = path + '.part'
+        sf.write(partial_path, source.clamp(-1, 1).numpy().T, model.samplerate,
+                 format='WAV', subtype='PCM_16')
+        os.replace(partial_path, path)
+        stems[stem_name] = path
+
+    entry = {'index': index, 'start': round(start, 3), 'end': round(end, 3), 'stems': stems}
+    # Append-only: quem lê o manifest nunca vê um trecho antes dos arquivos existirem
+    with open(os.path.join(segments_dir, SEGMENTS_MANIFEST), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + '\n')
+    return entry
+
+
+class DemucsModelPool:
+    """Mantém os modelos Demucs carregados em memória entre jobs"""
+
+    def __init__(self, device='cpu', num_threads=None, audio_loader=None):
+        self.device = device
+        self.audio_loader = audio_loader
+        self.num_threads = num_threads
+        self._models = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.load_times = {}
+
+    def get_model(self, model_name):
+        """Retorna o modelo carregado (carrega apenas na primeira chamada)"""
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is not None:
+                return model
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        with load_lock:
+            model = self._models.get(model_name)
+            if model is not None:
+                return model
+
+            import torch
+            from demucs.pretrained import get_model
+            _install_progress_hook()
+            if self.num_threads:
+                # Threads intra-op por job (cada thread de job abre seu próprio time OpenMP)
+                torch.set_num_threads(self.num_threads)
+
+            start = time.time()
+            model = get_model(model_name)
+            model.to(self.device)
+            model.eval()
+            elapsed = time.time() - start
+            metrics.observe_stage('demucs_model_load', elapsed, model=model_name)
+
+            with self._lock:
+                self._models[model_name] = model
+                self.load_times[model_name] = elapsed
+            print(f"✓ Modelo {model_name} carregado em {elapsed:.1f}s (mantido em memória)")
+            return model
+
+    def preload(self, model_names):
+        for model_name in model_names:
+            try:
+                self.get_model(model_name)
+            except Exception as e:
+                print(f"⚠️  Falha ao pré-carregar {model_name}: {e}")
+
+    def loaded_models(self):
+        with self._lock:
+            return sorted(self._models)
+
+    def separate(self, model_name, audio_path, out_dir, config, two_stems=None,
+                 progress_callback=None, jobs=0, segment_callback=None,
+                 block_seconds=DEFAULT_BLOCK_SECONDS):
+        """
+        Separa audio_path com o modelo em memória e grava os stems em out_dir
+
+        progress_callback(percent) recebe 0-100 conforme os segmentos são processados.
+        segment_callback(entrada do manifest), quando dado, liga o modo progressivo: a faixa
+        é separada em blocos sequenciais de block_seconds (crossfade nas bordas) e cada
+        trecho pronto é gravado em .segments/ antes de o próximo bloco começar.
+        Retorna {stem: caminho_do_arquivo}.
+        """
+        import torch
+
+        model = self.get_model(model_name)
+        wav = load_audio(audio_path, model, self.audio_loader)
+
+        # Mesma normalização do CLI (demucs.separate)
+        ref = wav.mean(0)
+        wav = (wav - ref.mean()) / ref.std()
+
+        blocks = [(0, wav.shape[-1])]
+        if segment_callback is not None:
+            from parallel_separation import plan_blocks
+            blocks = plan_blocks(wav.shape[-1], model.samplerate, block_seconds)
+
+        shifts = int(config.get('shifts', 0))
+        progress = None
+        if progress_callback is not None:
+            passes = len(_sub_models(model)) * max(1, shifts) * len(blocks)
+            progress = _PassProgress(passes, progress_callback)
+
+        _progress_local.progress = progress
+        try:
+            with torch.no_grad(), metrics.stage_timer('demucs_inference', model=model_name):
+                if segment_callback is None:
+                    sources = self._apply(model, wav, config, shifts, progress, jobs)
+                else:
+                    sources = self._apply_blocks(
+                        model, wav, blocks, config, shifts, progress, jobs,
+                        lambda index, start, end, block_sources: segment_callback(save_segment(
+                            block_sources * ref.std() + ref.mean(), model, out_dir, index,
+                            start / model.samplerate, end / model.samplerate, two_stems
+                        ))
+                    )
+        finally:
+            _progress_local.progress = None
+
+        sources = sources * ref.std() + ref.mean()
+        with metrics.stage_timer('stems_write', model=model_name):
+            return save_stems(sources, model, out_dir, config, two_stems)
+
+    def _apply(self, model, wav, config, shifts, progress, jobs):
+        from demucs.apply import apply_model
+        return apply_model(
+            model, wav[None],
+            device=self.device,
+            shifts=shifts,
+            split=True,
+            overlap=float(config.get('overlap', 0.25)),
+            progress=progress is not None,
+            num_workers=jobs,
+            segment=resolve_segment(model, config),
+        )[0]
+
+    def _apply_blocks(self, model, wav, blocks, config, shifts, progress, jobs, on_block):
+        """
+        Separa os blocos em sequência e junta com crossfade (mesma janela do engine chunked)
+
+        Depois do bloco i, tudo antes do início do bloco i+1 já não muda:
+        on_block(i, início, fim, fontes normalizadas do trecho) publica esse intervalo.
+        """
+        import torch
+        from parallel_separation import crossfade_weights
+
+        length = wav.shape[-1]
+        out = torch.zeros(len(model.sources), wav.shape[0], length)
+        total_weight = torch.zeros(length)
+        for index, (start, end) in enumerate(blocks):
+            block = self._apply(model, wav[:, start:end], config, shifts, progress, jobs)
+            weights = torch.from_numpy(crossfade_weights(start, end, blocks, index))
+            out[..., start:end] += block * weights
+            total_weight[start:end] += weights
+            final_end = blocks[index + 1][0] if index + 1 < len(blocks) else length
+            on_block(index, start, final_end,
+                     out[..., start:final_end] / total_weight[start:final_end].clamp_min(1e-8))
+        return out / total_weight.clamp_min(1e-8)
@@ -0,0 +1,128 @@
+# job_scheduler.py - Fila limitada com slots fixos de separação (controle de admissão)
+import os
+import threading
+import time
+from collections import deque
+
+
+class QueueFullError(Exception):
+    """Fila de jobs cheia: o cliente deve tentar novamente mais tarde"""
+
+
+def total_memory_bytes():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_slots(threads_per_job=4, memory_per_job_gb=3.0):
+    """Quantos jobs simultâneos cabem nos cores e na RAM desta máquina"""
+    cores = os.cpu_count() or 1
+    by_cpu = max(1, cores // max(1, threads_per_job))
+    memory = total_memory_bytes()
+    if memory is None:
+        return by_cpu
+    by_memory = max(1, int(memory // (memory_per_job_gb * 1024 ** 3)))
+    return min(by_cpu, by_memory)
+
+
+class JobScheduler:
+    """
+    Executa jobs em N threads de trabalho a partir de uma fila limitada
+
+    submit() recusa com QueueFullError quando a fila atinge max_queue, em vez de
+    criar mais uma thread competindo pelos mesmos cores.
+    """
+
+    def __init__(self, slots, max_queue, on_start=None, on_queue_change=None, name='job'):
+        self.slots = max(1, slots)
+        self.max_queue = max(0, max_queue)
+        self.on_start = on_start
+        self.on_queue_change = on_queue_change
+        self._queue = deque()
+        self._running = {}
+        self._running_args = {}
+        self._cond = threading.Condition()
+        self._completed = 0
+        self._workers = []
+        for index in range(self.slots):
+            worker = threading.Thread(target=self._work, name=f'{name}-worker-{index}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def is_full(self):
+        with self._cond:
+            return len(self._queue) >= self.max_queue
+
+    def submit(self, job_id, fn, *args):
+        """Enfileira o job; retorna a posição 1-based na fila"""
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise QueueFullError(f'Fila cheia ({self.max_queue} jobs aguardando)')
+            self._queue.append((job_id, fn, args, time.time()))
+            position = self._position_locked(job_id)
+            # Callbacks sob o lock: garantem a ordem queued -> running no progresso
+            if self.on_queue_change:
+                self.on_queue_change(self._queued_ids_locked())
+            self._cond.notify()
+        return position
+
+    def position(self, job_id):
+        """Posição 1-based na fila, 0 se já está rodando, None se desconhecido"""
+        with self._cond:
+            return self._position_locked(job_id)
+
+    def _position_locked(self, job_id):
+        if job_id in self._running:
+            return 0
+        for index, (queued_id, _, _, _) in enumerate(self._queue, 1):
+            if queued_id == job_id:
+                return index
+        return None
+
+    def queued_ids(self):
+        with self._cond:
+            return self._queued_ids_locked()
+
+    def _queued_ids_locked(self):
+        return [job_id for job_id, _, _, _ in self._queue]
+
+    def pending_args(self):
+        """Argumentos dos jobs na fila e rodando (ex: arquivos que ainda serão lidos)"""
+        with self._cond:
+            return [args for _, _, args, _ in self._queue] + list(self._running_args.values())
+
+    def stats(self):
+        with self._cond:
+            return {
+                'slots': self.slots,
+                'running': len(self._running),
+                'queued': len(self._queue),
+                'max_queue': self.max_queue,
+                'completed': self._completed,
+            }
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job_id, fn, args, queued_at = self._queue.popleft()
+                self._running[job_id] = time.time()
+                self._running_args[job_id] = args
+                if self.on_start:
+                    self.on_start(job_id, time.time() - queued_at)
+                if self.on_queue_change:
+                    self.on_queue_change(self._queued_ids_locked())
+
+            try:
+                fn(*args)
+            except Exception as e:
+                # As funções de job já reportam erro no progresso; só não deixar o worker morrer
+                print(f"✗ Job {job_id} falhou: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(job_id, None)
+                    self._running_args.pop(job_id, None)
+                    self._completed += 1
@@ -0,0 +1,236 @@
+# live_render.py - Pitch/velocidade em tempo real para o player: quadros curtos renderizados à frente do playhead
+#
+# Uma sessão lê o upload a partir da posição atual (soundfile, sem decodificar o resto) e
+# entrega quadros de FRAME_SECONDS, no máximo LEAD_SECONDS à frente do tempo real. Mudar
+# pitch/velocidade recria o motor (pitch_time.StreamingPitchTime) na posição pedida e vale
+# a partir do próximo quadro: com crossfade se a troca é contínua, ou com uma nova "época"
+# se o cliente mandou a posição do playhead (ele descarta o que já estava agendado).
+#
+# Quadro no stream: cabeçalho FRAME_HEADER (época, nº de amostras, posição no original em
+# segundos) + PCM 16 bits intercalado.
+import struct
+import threading
+import time
+import uuid
+
+import numpy as np
+
+import metrics
+import pitch_time
+
+FRAME_SECONDS = 0.1
+LEAD_SECONDS = 0.5
+# Entrada lida por chamada do motor: pequena para o primeiro quadro sair rápido
+FEED_SAMPLES = 2048
+# Contexto antes da posição inicial: a STFT centrada começa "cheia" em vez de com zeros
+PREROLL_SAMPLES = pitch_time.N_FFT
+CROSSFADE_SAMPLES = 1024
+FRAME_HEADER = struct.Struct('<IId')
+
+
+class _Voice:
+    """Um motor de pitch/velocidade lendo o arquivo a partir de uma posição (em amostras)"""
+
+    def __init__(self, audio, position, semitones, rate):
+        self.audio = audio
+        self.rate = float(rate)
+        start = max(position - PREROLL_SAMPLES, 0)
+        self._next_input = start
+        self._engine = pitch_time.StreamingPitchTime(audio.samplerate, audio.channels, semitones, rate)
+        # Saída correspondente ao preroll: descartada
+        self._discard = int(round((position - start) / self.rate))
+        self._pending = np.zeros((0, audio.channels), dtype=np.float32)
+        self._done = False
+        # Posição (amostras do original) da próxima amostra entregue
+        self.position = float(position)
+
+    def read(self, count):
+        """Até count amostras (menos só no fim do arquivo), como (amostras x canais)"""
+        while len(self._pending) < count + self._discard and not self._done:
+            self.audio.seek(self._next_input)
+            block = self.audio.read(FEED_SAMPLES, dtype='float32', always_2d=True)
+            self._next_input += len(block)
+            if len(block):
+                out = self._engine.feed(block)
+            else:
+                out = self._engine.flush()
+                self._done = True
+            if len(out):
+                self._pending = np.concatenate([self._pending, out])
+        if self._discard:
+            dropped = min(self._discard, len(self._pending))
+            self._pending = self._pending[dropped:]
+            self._discard -= dropped
+        out, self._pending = self._pending[:count], self._pending[count:]
+        self.position += len(out) * self.rate
+        return out
+
+
+class LiveSession:
+    """Sessão de render em tempo real de um arquivo (um cliente, um stream)"""
+
+    def __init__(self, path, position=0.0, semitones=0.0, rate=1.0):
+        import soundfile as sf
+
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.created = time.time()
+        self._audio = sf.SoundFile(path)
+        self.sample_rate = self._audio.samplerate
+        self.channels = self._audio.channels
+        self.duration = self._audio.frames / self.sample_rate
+        self._lock = threading.Lock()
+        self._pending = None
+        self._closed = False
+        self.streaming = False
+        self.epoch = 0
+        self.params = (float(semitones), float(rate))
+        self._voice = self._start(position, *self.params)
+
+    def _start(self, position, semitones, rate):
+        samples = int(min(max(float(position), 0.0), self.duration) * self.sample_rate)
+        return _Voice(self._audio, samples, semitones, rate)
+
+    @property
+    def position(self):
+        """Posição (segundos do original) do próximo quadro"""
+        return self._voice.position / self.sample_rate
+
+    def set_params(self, semitones, rate, position=None):
+        """
+        Novos pitch/velocidade a partir do próximo quadro
+
+        Com position (playhead do cliente, em segundos do original) o render recomeça ali
+        numa nova época; sem, continua de onde está com crossfade. Retorna a época.
+        """
+        with self._lock:
+            if position is None and self._pending is not None:
+                # Uma troca com posição ainda não aplicada continua valendo
+                position = self._pending[2]
+            self._pending = (float(semitones), float(rate), position)
+            return self.epoch + 1 if position is not None else self.epoch
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if not self.streaming:
+                self._audio.close()
+
+    def _apply_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return None
+        semitones, rate, position = pending
+        self.params = (semitones, rate)
+        if position is not None:
+            self.epoch += 1
+            self._voice = self._start(position, semitones, rate)
+            return None
+        # Troca contínua: o fim do motor antigo funde com o começo do novo
+        old = self._voice
+        self._voice = self._start(old.position / self.sample_rate, semitones, rate)
+        tail = old.read(CROSSFADE_SAMPLES)
+        head = self._voice.read(len(tail))
+        fade = np.linspace(0.0, 1.0, len(head), dtype=np.float32)[:, None]
+        return tail[:len(head)] * (1.0 - fade) + head * fade
+
+    def frames(self):
+        """
+        Gera os quadros (bytes) até o fim do arquivo ou close()
+
+        Não passa de LEAD_SECONDS à frente do tempo real; uma nova época recomeça a
+        contagem (o cliente descartou o que estava agendado).
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self.streaming = True
+        frame_samples = int(FRAME_SECONDS * self.sample_rate)
+        started = time.monotonic()
+        clock, sent, epoch = started, 0, self.epoch
+        first = True
+        try:
+            while not self._closed:
+                position = self.position
+                crossfade = self._apply_pending()
+                if self.epoch != epoch:
+                    clock, sent, epoch = time.monotonic(), 0, self.epoch
+                    position = self.position
+                parts = [crossfade] if crossfade is not None else []
+                parts.append(self._voice.read(frame_samples - sum(len(p) for p in parts)))
+                frame = np.concatenate(parts)
+                if not len(frame):
+                    break
+                if first:
+                    metrics.observe_stage('live_first_frame', time.monotonic() - started)
+                    first = False
+                yield FRAME_HEADER.pack(self.epoch, len(frame), position) + pitch_time.to_pcm16(frame).tobytes()
+                sent += len(frame)
+                # Espera o playhead se aproximar; uma troca de parâmetros interrompe a espera
+                while not self._closed and self._pending is None:
+                    ahead = sent / self.sample_rate - (time.monotonic() - clock)
+                    if ahead <= LEAD_SECONDS:
+                        break
+                    time.sleep(min(ahead - LEAD_SECONDS, FRAME_SECONDS / 4))
+        finally:
+            self._audio.close()
+
+
+class LiveSessions:
+    """Sessões abertas por id; as que nunca abriram o stream expiram"""
+
+    def __init__(self, max_sessions=8, ttl=60):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = {}
+        self._streaming = set()
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        limit = time.time() - self.ttl
+        for session_id, session in list(self._sessions.items()):
+            if session_id not in self._streaming and session.created < limit:
+                del self._sessions[session_id]
+                session.close()
+
+    def is_full(self):
+        with self._lock:
+            self._prune()
+            return len(self._sessions) >= self.max_sessions
+
+    def add(self, session):
+        with self._lock:
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def stream(self, session):
+        """Quadros da sessão; ao terminar (ou o cliente desconectar) ela é removida"""
+        with self._lock:
+            if session.id in self._streaming:
+                raise ValueError('Sessão já tem um stream aberto')
+            self._streaming.add(session.id)
+        try:
+            yield from session.frames()
+        finally:
+            self.remove(session.id)
+
+    def remove(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            self._streaming.discard(session_id)
+        if session is not None:
+            session.close()
+
+    def paths(self):
+        """Arquivos lidos pelas sessões abertas"""
+        with self._lock:
+            return [session.path for session in self._sessions.values()]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,202 @@
+# metrics.py - Tempo de cada etapa (histogramas) e gauges no formato de texto do Prometheus
+#
+# Sem dependência nova: o registro é pequeno e a exposição segue o formato 0.0.4
+# (https://prometheus.io/docs/instrumenting/exposition_formats/).
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PREFIX = 'music_analyzer'
+
+# De upload (ms) a separação na qualidade máxima (dezenas de minutos)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+STAGE_LABELS = ('stage', 'stems_mode', 'quality_mode', 'model')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames, buckets):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Gauge:
+    """Valor lido na hora da coleta: collect() -> número ou [(dict de labels, número), ...]"""
+
+    def __init__(self, name, help_text, collect, kind='gauge'):
+        self.name = name
+        self.help = help_text
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        samples = self.collect()
+        if not isinstance(samples, list):
+            samples = [({}, samples)]
+        for labels, value in samples:
+            if value is None:
+                continue
+            lines.append(f'{self.name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, help_text, labelnames, buckets):
+        return self.register(Histogram(f'{PREFIX}_{name}', help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, collect, kind='gauge'):
+        return self.register(Gauge(f'{PREFIX}_{name}', help_text, collect, kind))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # Uma fonte com erro não derruba a coleta inteira
+                lines.append(f'# {metric.name}: erro na coleta: {_escape(e)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram('stage_seconds', 'Duração de cada etapa do processamento',
+                                   STAGE_LABELS, STAGE_BUCKETS)
+
+# ==================== TEMPO POR ETAPA ====================
+
+# Labels do job corrente (stems_mode/quality_mode/model) herdados pelas etapas da mesma thread:
+# demucs_pool, crema_pool e afins medem sem receber esses parâmetros
+_context = threading.local()
+
+
+@contextmanager
+def job_labels(**labels):
+    previous = getattr(_context, 'labels', {})
+    _context.labels = {**previous, **labels}
+    try:
+        yield
+    finally:
+        _context.labels = previous
+
+
+def observe_stage(stage, seconds, **labels):
+    STAGE_SECONDS.observe(seconds, stage=stage, **{**getattr(_context, 'labels', {}), **labels})
+
+
+@contextmanager
+def stage_timer(stage, **labels):
+    """Mede o bloco em STAGE_SECONDS (também quando termina com erro)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, **labels)
+
+
+# ==================== PROCESSO ====================
+
+def rss_bytes():
+    """Memória residente atual do processo (Linux: /proc; outros: pico via getrusage)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if os.uname().sysname == 'Darwin' else peak * 1024
+        except Exception:
+            return None
+
+
+REGISTRY.gauge('process_resident_memory_bytes', 'Memória residente do processo', rss_bytes)
+_started = time.time()
+REGISTRY.gauge('process_uptime_seconds', 'Tempo desde o início do processo', lambda: round(time.time() - _started, 1))
+
+
+def render():
+    return REGISTRY.render()
+
+
+def serve(port, host='0.0.0.0'):
+    """/metrics num servidor HTTP próprio (workers não rodam o Flask)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
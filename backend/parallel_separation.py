@@ -0,0 +1,307 @@
+# parallel_separation.py - Separação em trechos sobrepostos processados em paralelo (process pool)
+#                          e passadas de shifts do Demucs em paralelo
+import math
+import multiprocessing
+import os
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+# Sobreposição entre trechos: contexto suficiente para o Transformer (segment ~7.8s)
+DEFAULT_OVERLAP_SECONDS = 4.0
+# Trechos menores que isso gastam mais em borda/overhead do que ganham em paralelismo
+MIN_CHUNK_SECONDS = 20.0
+# Deslocamento máximo de cada passada de shifts (mesmo valor do demucs.apply)
+MAX_SHIFT_SECONDS = 0.5
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+# Estado de cada processo worker
+_worker_models = {}
+
+
+def _init_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _worker_model(model_name):
+    model = _worker_models.get(model_name)
+    if model is None:
+        from demucs.pretrained import get_model
+        model = get_model(model_name)
+        model.eval()
+        _worker_models[model_name] = model
+    return model
+
+
+def _separate_chunk(model_name, chunk, shifts, overlap, segment):
+    """Roda no processo worker: separa um trecho já normalizado"""
+    import torch
+    from demucs.apply import apply_model
+
+    model = _worker_model(model_name)
+    with torch.no_grad():
+        sources = apply_model(
+            model, torch.from_numpy(chunk)[None],
+            device='cpu', shifts=shifts, split=True,
+            overlap=overlap, progress=False, segment=segment,
+        )[0]
+    return sources.numpy()
+
+
+def _separate_shift(model_name, sub_index, shifted, overlap, segment, threads):
+    """Roda no processo worker: uma passada (modelo do bag x deslocamento), sem shifts"""
+    import torch
+    from demucs.apply import apply_model
+    from demucs_pool import _sub_models
+
+    model = _sub_models(_worker_model(model_name))[sub_index]
+    previous_threads = torch.get_num_threads()
+    # Threads da passada: os cores divididos entre as passadas simultâneas deste job
+    torch.set_num_threads(threads)
+    try:
+        with torch.no_grad():
+            sources = apply_model(
+                model, torch.from_numpy(shifted)[None],
+                device='cpu', shifts=0, split=True,
+                overlap=overlap, progress=False, segment=segment,
+            )[0]
+    finally:
+        torch.set_num_threads(previous_threads)
+    return sources.numpy()
+
+
+def get_executor(workers):
+    """Pool de processos persistente (os modelos ficam carregados em cada worker)"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # spawn: fork de um processo com torch/threads ativos pode travar o OpenMP
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(threads,),
+            )
+            _executor_workers = workers
+        return _executor
+
+
+def plan_chunks(length, samplerate, workers, overlap_seconds=DEFAULT_OVERLAP_SECONDS,
+                min_chunk_seconds=MIN_CHUNK_SECONDS):
+    """
+    Divide [0, length) em trechos com sobreposição fixa
+
+    Retorna [(início, fim), ...]; trechos consecutivos compartilham overlap amostras.
+    """
+    overlap = int(overlap_seconds * samplerate)
+    min_chunk = int(min_chunk_seconds * samplerate)
+    count = max(1, workers)
+    chunk = max(min_chunk, math.ceil((length + (count - 1) * overlap) / count))
+    return _split(length, chunk, overlap)
+
+
+def plan_blocks(length, samplerate, block_seconds, overlap_seconds=DEFAULT_OVERLAP_SECONDS):
+    """Trechos de tamanho fixo para a separação progressiva (um após o outro, no mesmo processo)"""
+    overlap = int(overlap_seconds * samplerate)
+    block = max(int(block_seconds * samplerate), 2 * overlap)
+    return _split(length, block, overlap)
+
+
+def _split(length, chunk, overlap):
+    if chunk >= length:
+        return [(0, length)]
+
+    chunks = []
+    start = 0
+    while True:
+        end = min(start + chunk, length)
+        chunks.append((start, end))
+        if end >= length:
+            break
+        start = end - overlap
+    return chunks
+
+
+def crossfade_weights(start, end, chunks_bounds, index):
+    """Janela do trecho: rampa linear nas regiões sobrepostas aos vizinhos"""
+    length = end - start
+    weights = np.ones(length, dtype=np.float32)
+    if index > 0:
+        fade_in = chunks_bounds[index - 1][1] - start
+        if fade_in > 0:
+            weights[:fade_in] = np.linspace(0, 1, fade_in + 2, dtype=np.float32)[1:-1]
+    if index < len(chunks_bounds) - 1:
+        fade_out = end - chunks_bounds[index + 1][0]
+        if fade_out > 0:
+            weights[-fade_out:] = np.minimum(
+                weights[-fade_out:], np.linspace(1, 0, fade_out + 2, dtype=np.float32)[1:-1]
+            )
+    return weights
+
+
+def stitch(results, chunks, shape):
+    """Soma os trechos ponderados pelas janelas e normaliza pela soma dos pesos"""
+    out = np.zeros(shape, dtype=np.float32)
+    total_weight = np.zeros(shape[-1], dtype=np.float32)
+    for index, (start, end) in enumerate(chunks):
+        weights = crossfade_weights(start, end, chunks, index)
+        out[..., start:end] += results[index] * weights
+        total_weight[start:end] += weights
+    out /= np.maximum(total_weight, 1e-8)
+    return out
+
+
+def separate_array(model_name, wav, samplerate, sources_count, config, segment, workers,
+                   progress_callback=None, overlap_seconds=DEFAULT_OVERLAP_SECONDS):
+    """
+    Separa wav (canais x amostras, normalizado) em trechos paralelos
+
+    Retorna np.ndarray (fontes x canais x amostras).
+    """
+    length = wav.shape[-1]
+    chunks = plan_chunks(length, samplerate, workers, overlap_seconds)
+    executor = get_executor(workers)
+    shifts = int(config.get('shifts', 0))
+    overlap = float(config.get('overlap', 0.25))
+
+    print(f"  ⚡ Separação paralela: {len(chunks)} trechos em {workers} processos")
+    futures = {
+        executor.submit(_separate_chunk, model_name, np.ascontiguousarray(wav[:, start:end]),
+                        shifts, overlap, segment): index
+        for index, (start, end) in enumerate(chunks)
+    }
+
+    results = [None] * len(chunks)
+    for done, future in enumerate(as_completed(futures), 1):
+        results[futures[future]] = future.result()
+        if progress_callback is not None:
+            progress_callback(int(done / len(chunks) * 100))
+
+    return stitch(results, chunks, (sources_count, wav.shape[0], length))
+
+
+def plan_shifts(model, shifts, rng=random):
+    """
+    [(índice do modelo no bag, deslocamento ou None), ...] na ordem em que o apply_model
+    sorteia: para cada modelo do bag, `shifts` deslocamentos em [0, MAX_SHIFT_SECONDS]
+
+    Com os mesmos deslocamentos o resultado é idêntico ao sequencial (a semente não basta:
+    o Transformer do htdemucs também consome o `random` a cada forward).
+    """
+    from demucs_pool import _sub_models
+
+    passes = []
+    for sub_index, sub_model in enumerate(_sub_models(model)):
+        if shifts:
+            max_shift = int(MAX_SHIFT_SECONDS * sub_model.samplerate)
+            passes.extend((sub_index, rng.randint(0, max_shift)) for _ in range(shifts))
+        else:
+            passes.append((sub_index, None))
+    return passes
+
+
+def separate_shifts_array(model_name, model, wav, config, segment, workers, progress_callback=None,
+                          rng=random):
+    """
+    Separa wav (canais x amostras, normalizado) com as passadas de shifts em paralelo
+
+    Cada passada é independente (entrada deslocada, saída deslocada de volta); a média
+    por modelo e os pesos do bag são aplicados aqui, como no apply_model sequencial.
+    Retorna np.ndarray (fontes x canais x amostras).
+    """
+    from demucs_pool import _sub_models
+
+    shifts = int(config.get('shifts', 0))
+    overlap = float(config.get('overlap', 0.25))
+    passes = plan_shifts(model, shifts, rng)
+    sub_models = _sub_models(model)
+    length = wav.shape[-1]
+    max_shift = int(MAX_SHIFT_SECONDS * model.samplerate)
+    padded = np.pad(wav, ((0, 0), (max_shift, max_shift))) if shifts else wav
+
+    concurrent = max(1, min(workers, len(passes)))
+    threads = max(1, (os.cpu_count() or 1) // concurrent)
+    executor = get_executor(workers)
+    print(f"  ⚡ Shifts em paralelo: {len(passes)} passadas em {concurrent} processos ({threads} threads cada)")
+
+    futures = {}
+    for index, (sub_index, offset) in enumerate(passes):
+        # Mesmo recorte do apply_model: [offset, length + max_shift) da mistura com padding
+        shifted = wav if offset is None else padded[:, offset:length + max_shift]
+        future = executor.submit(_separate_shift, model_name, sub_index, np.ascontiguousarray(shifted),
+                                 overlap, segment, threads)
+        futures[future] = index
+
+    per_model = [np.zeros((len(model.sources), wav.shape[0], length), dtype=np.float32)
+                 for _ in sub_models]
+    for done, future in enumerate(as_completed(futures), 1):
+        sub_index, offset = passes[futures[future]]
+        sources = future.result()
+        if offset is not None:
+            sources = sources[..., max_shift - offset:][..., :length]
+        per_model[sub_index] += sources
+        if progress_callback is not None:
+            progress_callback(int(done / len(passes) * 100))
+
+    weights = getattr(model, 'weights', None) or [[1.0] * len(model.sources)]
+    out = np.zeros_like(per_model[0])
+    totals = np.zeros(len(model.sources), dtype=np.float32)
+    for sources, model_weights in zip(per_model, weights):
+        if shifts:
+            sources /= shifts
+        for k, weight in enumerate(model_weights):
+            out[k] += sources[k] * weight
+            totals[k] += weight
+    return out / totals[:, None, None]
+
+
+def separate_shifts(pool, model_name, audio_path, out_dir, config, two_stems=None,
+                    progress_callback=None, workers=None):
+    """Mesma interface de DemucsModelPool.separate, com as passadas de shifts em processos separados"""
+    import torch
+    from demucs_pool import load_audio, resolve_segment, save_stems
+
+    model = pool.get_model(model_name)
+    wav = load_audio(audio_path, model, pool.audio_loader)
+    ref = wav.mean(0)
+    wav = (wav - ref.mean()) / ref.std()
+
+    workers = workers or os.cpu_count() or 1
+    sources = separate_shifts_array(
+        model_name, model, wav.numpy().astype(np.float32), config,
+        resolve_segment(model, config), workers, progress_callback,
+    )
+
+    sources = torch.from_numpy(sources) * ref.std() + ref.mean()
+    return save_stems(sources, model, out_dir, config, two_stems)
+
+
+def separate_chunked(pool, model_name, audio_path, out_dir, config, two_stems=None,
+                     progress_callback=None, workers=None):
+    """Mesma interface de DemucsModelPool.separate, mas dividindo o áudio entre processos"""
+    import torch
+    from demucs_pool import load_audio, resolve_segment, save_stems
+
+    # O modelo do processo principal só fornece metadados (sample rate, fontes)
+    model = pool.get_model(model_name)
+    wav = load_audio(audio_path, model, pool.audio_loader)
+    ref = wav.mean(0)
+    wav = (wav - ref.mean()) / ref.std()
+
+    workers = workers or os.cpu_count() or 1
+    sources = separate_array(
+        model_name, wav.numpy().astype(np.float32), model.samplerate, len(model.sources),
+        config, resolve_segment(model, config), workers, progress_callback,
+    )
+
+    sources = torch.from_numpy(sources) * ref.std() + ref.mean()
+    return save_stems(sources, model, out_dir, config, two_stems)
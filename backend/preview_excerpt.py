@@ -0,0 +1,65 @@
+# preview_excerpt.py - Escolhe o trecho representativo da música para a prévia da separação
+import os
+
+import numpy as np
+
+PREVIEW_SECONDS = 25
+# Resolução da análise: quadros de 100 ms
+FRAME_SECONDS = 0.1
+# Introdução e final raramente representam a música: ficam de fora quando há espaço
+EDGE_FRACTION = 0.1
+# Peso da novidade (subidas de energia: entradas de instrumentos, refrão) frente ao volume
+NOVELTY_WEIGHT = 0.5
+
+
+def _zscore(x):
+    std = x.std()
+    return (x - x.mean()) / std if std > 0 else np.zeros_like(x)
+
+
+def select_excerpt(y, sr, seconds=PREVIEW_SECONDS):
+    """
+    (início, fim) em segundos do trecho de `seconds` com mais energia e novidade
+
+    y: (canais x amostras) ou (amostras,). Faixas mais curtas que `seconds` voltam inteiras.
+    """
+    y = np.atleast_2d(y)
+    total = y.shape[-1] / sr
+    if total <= seconds:
+        return 0.0, total
+
+    hop = max(1, int(sr * FRAME_SECONDS))
+    frames_count = y.shape[-1] // hop
+    energy = np.zeros(frames_count)
+    for channel in y:
+        # Fatia contígua: o reshape é uma view, sem copiar o áudio
+        frames = channel[:frames_count * hop].reshape(frames_count, hop)
+        energy += np.einsum('ij,ij->i', frames, frames, dtype=np.float64)
+    rms_db = 10 * np.log10(energy / (hop * len(y)) + 1e-10)
+    novelty = np.maximum(np.diff(rms_db, prepend=rms_db[0]), 0)
+    score = _zscore(rms_db) + NOVELTY_WEIGHT * _zscore(novelty)
+
+    # Soma do score em cada janela de `seconds` (soma acumulada: O(n))
+    width = min(frames_count, int(round(seconds / FRAME_SECONDS)))
+    cumulative = np.concatenate(([0.0], np.cumsum(score)))
+    windows = cumulative[width:] - cumulative[:-width]
+
+    edge = int(frames_count * EDGE_FRACTION)
+    first, last = edge, len(windows) - 1 - edge
+    if last < first:
+        first, last = 0, len(windows) - 1
+    start = (first + int(np.argmax(windows[first:last + 1]))) * hop / sr
+    return start, min(start + seconds, total)
+
+
+def write_excerpt(y, sr, start, end, dst_path):
+    """Grava o trecho [start, end) de y (canais x amostras) em WAV (gravação atômica)"""
+    import soundfile as sf
+
+    y = np.atleast_2d(y)
+    excerpt = y[:, int(start * sr):int(end * sr)]
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    partial_path = dst_path + '.part'
+    sf.write(partial_path, excerpt.T, sr, format='WAV')
+    os.replace(partial_path, dst_path)
+    return dst_path
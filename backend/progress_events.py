@@ -0,0 +1,102 @@
+# progress_events.py - Publicação de progresso para clientes SSE (Server-Sent Events)
+import json
+import queue
+import threading
+import time
+
+# Intervalo do comentário keep-alive (proxies fecham conexões ociosas)
+KEEPALIVE_SECONDS = 15
+# Modo api/worker: intervalo de leitura do progresso no banco compartilhado
+POLL_SECONDS = 0.5
+
+
+class ProgressBroker:
+    """Entrega cada update_progress às conexões SSE inscritas na task"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, task_id):
+        subscriber = queue.Queue(maxsize=256)
+        with self._lock:
+            self._subscribers.setdefault(task_id, []).append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, task_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(task_id, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+            if not subscribers:
+                self._subscribers.pop(task_id, None)
+
+    def publish(self, task_id, snapshot):
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, []))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(snapshot)
+            except queue.Full:
+                # Cliente lento: descarta o mais antigo, o último estado é o que importa
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(snapshot)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def connections(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+def is_final(snapshot):
+    return snapshot.get('step') == -1 or snapshot.get('percentage', 0) >= 100
+
+
+def format_event(snapshot):
+    return f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+
+
+def stream_progress(broker, task_id, get_snapshot):
+    """Gerador SSE: estado atual, depois cada atualização até concluir ou falhar"""
+    # Inscreve antes de ler o estado para não perder atualizações no intervalo
+    subscriber = broker.subscribe(task_id)
+    try:
+        initial_snapshot = get_snapshot()
+        yield format_event(initial_snapshot)
+        if is_final(initial_snapshot):
+            return
+        while True:
+            try:
+                snapshot = subscriber.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(snapshot)
+            if is_final(snapshot):
+                return
+    finally:
+        broker.unsubscribe(task_id, subscriber)
+
+
+def poll_progress(get_snapshot, interval=POLL_SECONDS):
+    """Gerador SSE para estado em outro processo: relê o snapshot e envia quando muda"""
+    last_event = None
+    idle = 0.0
+    while True:
+        snapshot = get_snapshot()
+        if snapshot is None:
+            return
+        event = format_event(snapshot)
+        if event != last_event:
+            yield event
+            last_event = event
+            idle = 0.0
+            if is_final(snapshot):
+                return
+        elif idle >= KEEPALIVE_SECONDS:
+            yield ": keep-alive\n\n"
+            idle = 0.0
+        time.sleep(interval)
+        idle += interval
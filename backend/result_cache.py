@@ -0,0 +1,184 @@
+# result_cache.py - Cache de resultados endereçado por conteúdo (hash do áudio + parâmetros)
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """SHA-256 do arquivo lido em blocos (memória constante)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def separation_key(audio_hash, model_name, stems_mode, quality_mode, engine='standard'):
+    key = f'sep:{audio_hash}:{model_name}:{stems_mode}:{quality_mode}'
+    # Engines alternativos geram saída ligeiramente diferente: entrada própria no cache
+    return key if engine == 'standard' else f'{key}:{engine}'
+
+
+def chords_key(audio_hash):
+    return f'chords:{audio_hash}'
+
+
+def render_key(audio_hash, semitones, rate):
+    # Arredonda para o passo dos sliders: 0.1 semitom / 0.01x não geram renders distintos
+    return f'render:{audio_hash}:{round(float(semitones), 1):+.1f}:{round(float(rate), 2):.2f}'
+
+
+def stem_render_key(model_name, output_name, stem, semitones, rate):
+    # A pasta dos stems já identifica o conteúdo (nome inclui o hash do áudio)
+    return f'render-stem:{model_name}/{output_name}/{stem}:{round(float(semitones), 1):+.1f}:{round(float(rate), 2):.2f}'
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ResultCache:
+    """
+    Índice LRU de resultados (stems e acordes) com limite de tamanho em disco
+
+    Entradas de separação apontam para a pasta dos stems ('path'); ao passar de
+    max_bytes as menos usadas recentemente são removidas junto com a pasta.
+    Em memória fica só o índice (chave, pasta, tamanho); o payload é lido do
+    store sob demanda. prefixes limita o cache às chaves com esses prefixos,
+    permitindo orçamentos separados sobre o mesmo store.
+    """
+
+    def __init__(self, store, max_bytes, max_entries=5000, prefixes=None, name='resultados',
+                 on_remove=None):
+        self.store = store
+        # on_remove(meta): chamado para cada entrada removida (LRU ou remove_where)
+        self.on_remove = on_remove
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.prefixes = tuple(prefixes) if prefixes else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index = OrderedDict()
+        self._lock = threading.RLock()
+        for row in store.result_index():
+            if self.prefixes is None or row['key'].startswith(self.prefixes):
+                self._index[row['key']] = row
+        print(f"✓ Cache de {name}: {len(self._index)} entradas")
+
+    def get(self, key):
+        """Retorna a entrada (e marca como usada) ou None; conta hit/miss"""
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None and (self.prefixes is None or key.startswith(self.prefixes)):
+                # Outro processo (ex: worker no modo api/worker) pode ter gravado no mesmo banco
+                meta = self._adopt(key)
+            if meta is not None and meta.get('path') and not os.path.isdir(meta['path']):
+                # Pasta apagada por fora do cache
+                self._drop(key, delete_files=False)
+                meta = None
+            entry = self.store.get_result(key) if meta is not None else None
+            if entry is None:
+                if meta is not None:
+                    # Removida por outro processo
+                    self._index.pop(key, None)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            meta['last_access'] = time.time()
+            self.store.touch_result(key, meta['last_access'])
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock, metrics.stage_timer('persist_result'):
+            entry = dict(entry)
+            entry['size'] = dir_size(entry['path']) if entry.get('path') else 0
+            entry['created'] = entry.get('created', time.time())
+            entry['last_access'] = time.time()
+            self.store.put_result(key, entry)
+            self._index[key] = {
+                'key': key,
+                'filename': entry.get('filename'),
+                'path': entry.get('path'),
+                'size': entry['size'],
+                'last_access': entry['last_access'],
+            }
+            self._index.move_to_end(key)
+            self._evict()
+
+    def _adopt(self, key):
+        entry = self.store.get_result(key)
+        if entry is None:
+            return None
+        meta = {field: entry.get(field) for field in ('filename', 'path')}
+        meta.update(key=key, size=entry.get('size', 0), last_access=entry.get('last_access', 0))
+        self._index[key] = meta
+        return meta
+
+    def find(self, predicate):
+        """Entradas completas cujos metadados satisfazem predicate(key, meta)"""
+        with self._lock:
+            keys = [key for key, meta in self._index.items() if predicate(key, meta)]
+            found = []
+            for key in keys:
+                entry = self.store.get_result(key)
+                if entry is not None:
+                    found.append((key, entry))
+            return found
+
+    def remove_where(self, predicate, delete_files=True):
+        """Remove entradas (e pastas de stems) cujos metadados satisfazem predicate(key, meta)"""
+        with self._lock:
+            keys = [key for key, meta in self._index.items() if predicate(key, meta)]
+            return [self._drop(key, delete_files) for key in keys]
+
+    def _drop(self, key, delete_files):
+        meta = self._index.pop(key)
+        self.store.delete_results([key])
+        if delete_files and meta.get('path'):
+            shutil.rmtree(meta['path'], ignore_errors=True)
+        if self.on_remove is not None:
+            self.on_remove(meta)
+        return meta
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(meta.get('size', 0) for meta in self._index.values())
+
+    def _evict(self):
+        total = sum(meta.get('size', 0) for meta in self._index.values())
+        # Nunca despeja a entrada recém-inserida (última do OrderedDict)
+        while len(self._index) > 1 and (total > self.max_bytes or len(self._index) > self.max_entries):
+            key = next(iter(self._index))
+            meta = self._drop(key, delete_files=True)
+            total -= meta.get('size', 0)
+            self.evictions += 1
+            print(f"  ♻️  Cache: removido {key} ({meta.get('size', 0) / 1024 ** 2:.1f} MB)")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._index),
+                'bytes': sum(meta.get('size', 0) for meta in self._index.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,117 @@
+# shared_queue.py - Fila de jobs em SQLite compartilhada entre processo de API e workers
+import os
+import socket
+import threading
+import time
+import uuid
+
+from job_scheduler import QueueFullError
+
+# Worker sem heartbeat há mais que isso é considerado morto: seus jobs voltam para a fila
+DEFAULT_STALE_SECONDS = 60
+HEARTBEAT_SECONDS = 10
+POLL_SECONDS = 1.0
+
+
+class SharedJobQueue:
+    """
+    Mesma interface do JobScheduler (submit/is_full/position/stats), mas o job vai
+    para a tabela jobs do AnalysisStore e roda em qualquer worker ligado ao mesmo banco
+    (processos do mesmo host: SQLite em WAL não funciona em sistema de arquivos de rede)
+
+    Os argumentos precisam ser serializáveis em JSON; a função é gravada pelo nome e
+    resolvida no worker pelo registro passado a run_worker.
+    """
+
+    def __init__(self, store, max_queue, name='job', stale_seconds=DEFAULT_STALE_SECONDS):
+        self.store = store
+        self.max_queue = max(0, max_queue)
+        self.name = name
+        self.stale_seconds = stale_seconds
+
+    def is_full(self):
+        return self.store.job_counts(self.name).get('queued', 0) >= self.max_queue
+
+    def submit(self, job_id, fn, *args):
+        position = self.store.enqueue_job(job_id, self.name, fn.__name__, list(args), self.max_queue)
+        if position is None:
+            raise QueueFullError(f'Fila cheia ({self.max_queue} jobs aguardando)')
+        return position
+
+    def position(self, job_id):
+        return self.store.job_position(job_id)
+
+    def queued_ids(self):
+        return self.store.queued_job_ids(self.name)
+
+    def pending_args(self):
+        return self.store.pending_job_args(self.name)
+
+    def stats(self):
+        counts = self.store.job_counts(self.name)
+        workers = self.store.live_workers(self.name, self.stale_seconds)
+        return {
+            'slots': sum(worker['slots'] for worker in workers),
+            'workers': len(workers),
+            'running': counts.get('running', 0),
+            'queued': counts.get('queued', 0),
+            'max_queue': self.max_queue,
+            'completed': counts.get('done', 0) + counts.get('error', 0),
+        }
+
+
+def worker_id():
+    return f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+
+
+def run_worker(queue, registry, slots, on_start=None, poll_seconds=POLL_SECONDS):
+    """
+    Processo worker: `slots` threads pegando jobs da fila compartilhada (bloqueia)
+
+    registry: {nome da função: função}. Jobs de funções desconhecidas são marcados como erro.
+    """
+    ident = worker_id()
+    store = queue.store
+
+    def heartbeat():
+        while True:
+            try:
+                store.worker_heartbeat(ident, queue.name, slots)
+                requeued = store.requeue_stale_jobs(queue.name, queue.stale_seconds)
+                if requeued:
+                    print(f"♻️  {requeued} job(s) de workers parados voltaram para a fila")
+                store.prune_jobs(24 * 3600)
+            except Exception as e:
+                print(f"⚠️  Heartbeat falhou: {e}")
+            time.sleep(HEARTBEAT_SECONDS)
+
+    def work():
+        while True:
+            job = store.claim_job(queue.name, ident)
+            if job is None:
+                time.sleep(poll_seconds)
+                continue
+            fn = registry.get(job['fn'])
+            if fn is None:
+                print(f"✗ Job {job['id']}: função desconhecida {job['fn']}")
+                store.finish_job(job['id'], 'error')
+                continue
+            if on_start:
+                on_start(job['id'], time.time() - job['created'])
+            try:
+                fn(*job['args'])
+                store.finish_job(job['id'], 'done')
+            except Exception as e:
+                # As funções de job já reportam erro no progresso; só não deixar o worker morrer
+                print(f"✗ Job {job['id']} falhou: {e}")
+                store.finish_job(job['id'], 'error')
+
+    store.worker_heartbeat(ident, queue.name, slots)
+    threading.Thread(target=heartbeat, name='worker-heartbeat', daemon=True).start()
+    threads = [threading.Thread(target=work, name=f'{queue.name}-worker-{index}', daemon=True)
+               for index in range(max(1, slots))]
+    for thread in threads:
+        thread.start()
+    print(f"👷 Worker {ident}: {len(threads)} slots na fila '{queue.name}'")
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,92 @@
+# stem_derivation.py - Stems com menos fontes montados a partir de uma separação com mais fontes
+#
+# 4 -> 2: vocals + no_vocals (drums + bass + other)
+# 6 -> 4: other = other + guitar + piano
+# 6 -> 2: vocals + no_vocals (as outras cinco)
+# Mesma soma que o Demucs faz no --two-stems, sem rodar o modelo de novo.
+import os
+from pathlib import Path
+
+import numpy as np
+
+STEM_LAYOUTS = {
+    '2': ('vocals', 'no_vocals'),
+    '4': ('drums', 'bass', 'other', 'vocals'),
+    '6': ('drums', 'bass', 'guitar', 'piano', 'other', 'vocals'),
+}
+# Stems do htdemucs_6s que viram 'other' no layout de 4
+FOLDED_INTO_OTHER = ('guitar', 'piano')
+
+
+def stem_mapping(target_mode, source_mode):
+    """{stem de destino: [stems de origem]} ou None se source_mode não gera target_mode"""
+    if target_mode not in STEM_LAYOUTS or source_mode not in STEM_LAYOUTS:
+        return None
+    if int(source_mode) <= int(target_mode):
+        return None
+    source = STEM_LAYOUTS[source_mode]
+    if target_mode == '2':
+        return {'vocals': ['vocals'], 'no_vocals': [stem for stem in source if stem != 'vocals']}
+    return {
+        stem: [stem] + (list(FOLDED_INTO_OTHER) if stem == 'other' else [])
+        for stem in STEM_LAYOUTS[target_mode]
+    }
+
+
+def stem_files(folder):
+    """{stem: caminho} dos stems completos da pasta (WAV tem prioridade sobre MP3)"""
+    files = {}
+    for ext in ('.wav', '.mp3'):
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(ext) and Path(name).stem not in files:
+                files[Path(name).stem] = os.path.join(folder, name)
+    return files
+
+
+def _read(path):
+    import soundfile as sf
+    try:
+        data, sr = sf.read(path, dtype='float32', always_2d=True)
+        return data, sr
+    except Exception:
+        # MP3 em libsndfile antigo
+        import librosa
+        data, sr = librosa.load(path, sr=None, mono=False)
+        return np.atleast_2d(data).T.astype(np.float32, copy=False), sr
+
+
+def derive_stems(source_files, mapping, out_dir):
+    """
+    Soma os stems de origem de cada stem de destino e grava WAVs em out_dir
+
+    Grava em float se a origem era float, senão 16 bits (com a mesma redução de ganho
+    do Demucs quando a soma passa de 0 dBFS). Retorna {stem: caminho}.
+    """
+    import soundfile as sf
+
+    missing = {stem for sources in mapping.values() for stem in sources} - set(source_files)
+    if missing:
+        raise FileNotFoundError(f"Stems ausentes na separação de origem: {', '.join(sorted(missing))}")
+
+    decoded = {}
+    sr = None
+    for stem in {stem for sources in mapping.values() for stem in sources}:
+        decoded[stem], sr = _read(source_files[stem])
+    length = min(len(data) for data in decoded.values())
+    first = next(iter(source_files.values()))
+    subtype = 'FLOAT' if first.endswith('.wav') and sf.info(first).subtype == 'FLOAT' else 'PCM_16'
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = {}
+    for stem, sources in mapping.items():
+        mix = np.stack([decoded[source][:length] for source in sources]).sum(axis=0)
+        if subtype == 'PCM_16':
+            peak = float(np.abs(mix).max()) if mix.size else 0.0
+            if peak > 1.0:
+                mix /= peak
+        path = os.path.join(out_dir, f'{stem}.wav')
+        partial_path = path + '.part'
+        sf.write(partial_path, mix, sr, format='WAV', subtype=subtype)
+        os.replace(partial_path, path)
+        written[stem] = path
+    return written
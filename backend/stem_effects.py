@@ -0,0 +1,105 @@
+# stem_effects.py - Pitch shift / time stretch dos stems em paralelo (process pool) e remix
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import metrics
+import pitch_time
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers):
+    """Pool de processos persistente para os renders de stems"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        # Worker morto (ex: falta de memória) quebra o pool inteiro: recria
+        broken = _executor is not None and getattr(_executor, '_broken', False)
+        if _executor is None or _executor_workers != workers or broken:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn: o processo principal tem threads (Flask, torch) ativas
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            _executor_workers = workers
+        return _executor
+
+
+def write_atomic(path, data, sr):
+    """Grava (amostras x canais) em .part e renomeia: leitores nunca veem arquivo pela metade"""
+    import soundfile as sf
+    partial_path = path + '.part'
+    sf.write(partial_path, data, sr, format='WAV')
+    os.replace(partial_path, path)
+
+
+def render_stem(src_path, dst_path, semitones, rate):
+    """
+    Roda no worker: aplica pitch/velocidade a um stem (todos os canais juntos)
+
+    Retorna (destino, duração, {etapa: segundos}); os tempos são registrados no processo pai.
+    """
+    import soundfile as sf
+
+    timings = {}
+    data, sr = sf.read(src_path, dtype='float32', always_2d=True)
+    start = time.perf_counter()
+    y = pitch_time.shift_and_stretch(data.T, sr, semitones, rate)
+    timings['pitch_time'] = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    write_atomic(dst_path, y.T, sr)
+    return dst_path, y.shape[-1] / sr, timings
+
+
+def render_stems(jobs, semitones, rate, workers, progress_callback=None):
+    """
+    Renderiza vários stems em paralelo
+
+    jobs: {nome: (origem, destino)}. Retorna {nome: (destino, duração)}.
+    """
+    if not jobs:
+        return {}
+    executor = get_executor(max(1, workers))
+    futures = {
+        executor.submit(render_stem, src_path, dst_path, semitones, rate): name
+        for name, (src_path, dst_path) in jobs.items()
+    }
+    results = {}
+    for done, future in enumerate(as_completed(futures), 1):
+        dst_path, duration, timings = future.result()
+        for stage, seconds in timings.items():
+            metrics.observe_stage(stage, seconds)
+        results[futures[future]] = (dst_path, duration)
+        if progress_callback is not None:
+            progress_callback(futures[future], int(done / len(futures) * 100))
+    return results
+
+
+def mix_stems(paths, dst_path):
+    """Soma os stems renderizados; reduz o ganho só se a soma passar de 0 dBFS"""
+    import soundfile as sf
+
+    mix = None
+    sr = None
+    for path in paths:
+        data, sr = sf.read(path, dtype='float32', always_2d=True)
+        if mix is None:
+            mix = data.copy()
+        else:
+            length = min(len(mix), len(data))
+            mix = mix[:length] + data[:length]
+    peak = float(np.abs(mix).max()) if mix is not None and mix.size else 0.0
+    if peak > 1.0:
+        mix /= peak
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    write_atomic(dst_path, mix, sr)
+    return dst_path, len(mix) / sr
@@ -0,0 +1,79 @@
+# stem_index.py - Índice em memória dos arquivos de stems (sem sondar o disco a cada download)
+import os
+import threading
+
+# Extensões na ordem de preferência (WAV antes de MP3, como o download sempre fez)
+STEM_EXTENSIONS = (('.wav', 'audio/wav'), ('.mp3', 'audio/mpeg'))
+
+
+def _safe_name(name):
+    return bool(name) and name not in ('.', '..') and os.path.basename(name) == name
+
+
+class StemIndex:
+    """(modelo, pasta da separação) -> {stem: (caminho, mimetype)}, preenchido sob demanda"""
+
+    def __init__(self, root):
+        self.root = root
+        self._songs = {}
+        self._lock = threading.Lock()
+
+    def _scan(self, model, song):
+        stems = {}
+        try:
+            entries = sorted(os.scandir(os.path.join(self.root, model, song)), key=lambda e: e.name)
+        except (FileNotFoundError, NotADirectoryError):
+            return stems
+        for ext, mimetype in STEM_EXTENSIONS:
+            for entry in entries:
+                if entry.name.endswith(ext) and entry.is_file():
+                    stems.setdefault(entry.name[:-len(ext)], (entry.path, mimetype))
+        return stems
+
+    def song(self, model, song):
+        """Stems da pasta (varre o disco só na primeira consulta)"""
+        if not (_safe_name(model) and _safe_name(song)):
+            return {}
+        key = (model, song)
+        with self._lock:
+            stems = self._songs.get(key)
+        if stems is None:
+            stems = self._scan(model, song)
+            if stems:
+                with self._lock:
+                    self._songs[key] = stems
+        return stems
+
+    def lookup(self, model, song, stem):
+        return self.song(model, song).get(stem)
+
+    def register(self, model, song, paths):
+        """Registra stems recém-gravados: {stem: caminho}"""
+        mimetypes = dict(STEM_EXTENSIONS)
+        stems = {
+            stem: (path, mimetypes.get(os.path.splitext(path)[1], 'application/octet-stream'))
+            for stem, path in paths.items()
+        }
+        with self._lock:
+            self._songs[(model, song)] = stems
+
+    def invalidate(self, model=None, song=None):
+        """Esquece uma pasta, todas as pastas de um modelo ou tudo"""
+        with self._lock:
+            for key in list(self._songs):
+                if (model is None or key[0] == model) and (song is None or key[1] == song):
+                    del self._songs[key]
+
+    def invalidate_path(self, path):
+        """Esquece a pasta pelo caminho no disco (ex: removida pelo LRU do cache)"""
+        rel = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        parts = rel.split(os.sep)
+        if len(parts) == 2:
+            self.invalidate(parts[0], parts[1])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'songs': len(self._songs),
+                'stems': sum(len(stems) for stems in self._songs.values()),
+            }
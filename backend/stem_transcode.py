@@ -0,0 +1,94 @@
+# stem_transcode.py - Variantes comprimidas (MP3/Opus) dos stems, geradas sob demanda e guardadas em disco
+import os
+import threading
+
+# Subpasta dentro da pasta dos stems: some junto com ela e não aparece como stem no índice
+VARIANTS_DIR = '.variants'
+
+FORMATS = {
+    'mp3': {
+        'ext': '.mp3',
+        'mimetype': 'audio/mpeg',
+        'bitrates': (96, 128, 160, 192, 256, 320),
+        'default_bitrate': 192,
+    },
+    'opus': {
+        'ext': '.opus',
+        'mimetype': 'audio/ogg',
+        'bitrates': (48, 64, 96, 128, 160, 192),
+        'default_bitrate': 96,
+    },
+}
+
+# Opus só aceita 8/12/16/24/48 kHz
+OPUS_SAMPLE_RATE = 48000
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+class UnsupportedFormatError(ValueError):
+    pass
+
+
+def resolve_format(fmt, bitrate=None):
+    """Valida formato/bitrate (kbps); bitrate fora da lista vai para o valor suportado mais próximo"""
+    spec = FORMATS.get((fmt or '').lower())
+    if spec is None:
+        raise UnsupportedFormatError(f"Formato não suportado: {fmt} (use {', '.join(FORMATS)})")
+    if not bitrate:
+        return fmt.lower(), spec['default_bitrate']
+    bitrate = int(bitrate)
+    return fmt.lower(), min(spec['bitrates'], key=lambda option: abs(option - bitrate))
+
+
+def compression_level(fmt, bitrate):
+    """
+    Bitrate (kbps) -> compression_level do libsndfile
+
+    libsndfile mapeia o nível linearmente: MP3 CBR de 320 (0.0) a 32 kbps (1.0),
+    Opus de 510 (0.0) a 6 kbps (1.0). O LAME arredonda para o bitrate válido mais próximo.
+    """
+    if fmt == 'mp3':
+        level = (320 - bitrate) / (320 - 32)
+    else:
+        level = (510 - bitrate) / (510 - 6)
+    return min(max(level, 0.0), 0.99)
+
+
+def variant_path(stem_path, fmt, bitrate):
+    folder, name = os.path.split(stem_path)
+    stem = os.path.splitext(name)[0]
+    return os.path.join(folder, VARIANTS_DIR, f'{stem}.{bitrate}k{FORMATS[fmt]["ext"]}')
+
+
+def transcode(src_path, dst_path, fmt, bitrate):
+    import soundfile as sf
+
+    data, sr = sf.read(src_path, dtype='float32', always_2d=True)
+    if fmt == 'opus' and sr != OPUS_SAMPLE_RATE:
+        import librosa
+        data = librosa.resample(data.T, orig_sr=sr, target_sr=OPUS_SAMPLE_RATE).T
+        sr = OPUS_SAMPLE_RATE
+
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    partial_path = dst_path + '.part'
+    kwargs = {'format': 'MP3', 'bitrate_mode': 'CONSTANT'} if fmt == 'mp3' else {'format': 'OGG', 'subtype': 'OPUS'}
+    sf.write(partial_path, data, sr, compression_level=compression_level(fmt, bitrate), **kwargs)
+    os.replace(partial_path, dst_path)
+
+
+def get_variant(stem_path, fmt, bitrate):
+    """Caminho da variante (transcodifica na primeira vez; pedidos simultâneos esperam a mesma)"""
+    dst_path = variant_path(stem_path, fmt, bitrate)
+    if os.path.exists(dst_path):
+        return dst_path
+    with _locks_lock:
+        lock = _locks.setdefault(dst_path, threading.Lock())
+    with lock:
+        if not os.path.exists(dst_path):
+            print(f"  🎚️  Transcodificando {os.path.basename(stem_path)} -> {fmt} {bitrate}k")
+            transcode(stem_path, dst_path, fmt, bitrate)
+    with _locks_lock:
+        _locks.pop(dst_path, None)
+    return dst_path
@@ -0,0 +1,358 @@
+# upload_store.py - Uploads gravados em streaming (hash durante a escrita), deduplicados e retomáveis
+#
+# Layout dentro da pasta de uploads:
+#   .blobs/<sha256><ext>     conteúdo imutável, um arquivo por áudio distinto (jobs leem daqui)
+#   <nome do cliente>        hardlink para o blob (histórico e /uploads/<nome>); troca atômica
+#   .incoming/<id>.part      upload em andamento (retomável); <id>.json guarda nome/tamanho/estado
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import metrics
+
+CHUNK_SIZE = 1024 * 1024
+# Tamanho sugerido para os PUTs dos uploads em partes
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+BLOBS_DIR = '.blobs'
+INCOMING_DIR = '.incoming'
+# Sessões abandonadas há mais que isso são apagadas
+SESSION_MAX_AGE = 24 * 3600
+HASH_MEMO_SIZE = 4096
+
+
+class UploadNotFoundError(LookupError):
+    pass
+
+
+class UploadOffsetError(ValueError):
+    """PUT fora de ordem: o cliente deve retomar de `offset`"""
+
+    def __init__(self, offset):
+        super().__init__(f'Offset esperado: {offset}')
+        self.offset = offset
+
+
+def _safe_name(filename):
+    name = Path(filename or '').name
+    if name in ('', '.', '..') or name.startswith('.'):
+        raise ValueError(f'Nome de arquivo inválido: {filename}')
+    return name
+
+
+def _copy_stream(stream, f, digest, limit=None):
+    """Copia em blocos de CHUNK_SIZE atualizando o hash; retorna bytes copiados"""
+    copied = 0
+    while True:
+        size = CHUNK_SIZE if limit is None else min(CHUNK_SIZE, limit - copied + 1)
+        chunk = stream.read(size)
+        if not chunk:
+            return copied
+        copied += len(chunk)
+        if limit is not None and copied > limit:
+            raise ValueError('Parte maior que o tamanho declarado do arquivo')
+        digest.update(chunk)
+        f.write(chunk)
+
+
+class UploadStore:
+    def __init__(self, root, in_use=None):
+        self.root = root
+        self.blobs_dir = os.path.join(root, BLOBS_DIR)
+        self.incoming_dir = os.path.join(root, INCOMING_DIR)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.incoming_dir, exist_ok=True)
+        # in_use(): caminhos que jobs na fila/rodando e sessões abertas ainda vão ler
+        self.in_use = in_use or (lambda: ())
+        self.hardlinks = self._supports_hardlinks()
+        # Coleta de blobs não pode correr entre "blob existe" e o link do nome
+        self._blobs_lock = threading.Lock()
+        # Hash em andamento de cada sessão (some num restart: recalculado do .part)
+        self._sessions = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._hashes = OrderedDict()
+
+    # ---------- Blobs ----------
+
+    def blob_path(self, audio_hash, filename):
+        return os.path.join(self.blobs_dir, f'{audio_hash}{Path(filename).suffix.lower()}')
+
+    def name_path(self, filename):
+        return os.path.join(self.root, _safe_name(filename))
+
+    def ingest(self, stream, filename):
+        """
+        Grava um stream (ex: arquivo do multipart) calculando o SHA-256 na mesma passada
+
+        Retorna (caminho do blob, hash, já existia). Memória constante: blocos de CHUNK_SIZE.
+        """
+        _safe_name(filename)
+        partial_path = os.path.join(self.incoming_dir, f'{uuid.uuid4().hex}.part')
+        digest = hashlib.sha256()
+        try:
+            with open(partial_path, 'wb') as f, metrics.stage_timer('upload_save'):
+                _copy_stream(stream, f, digest)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        return self._commit(partial_path, digest.hexdigest(), filename)
+
+    def _commit(self, partial_path, audio_hash, filename):
+        blob = self.blob_path(audio_hash, filename)
+        with self._blobs_lock:
+            deduplicated = os.path.exists(blob)
+            if deduplicated:
+                os.remove(partial_path)
+            else:
+                os.replace(partial_path, blob)
+            self.publish(blob, filename)
+        self._remember(blob, audio_hash)
+        # Conteúdo novo com um nome já usado deixa o blob antigo sem nome: coletado quando livre
+        self.collect_blobs()
+        return blob, audio_hash, deduplicated
+
+    def publish(self, blob, filename):
+        """uploads/<nome> passa a apontar para o blob (uploads simultâneos não se misturam)"""
+        dst = self.name_path(filename)
+        try:
+            if os.path.samefile(blob, dst):
+                return
+        except FileNotFoundError:
+            pass
+        link_path = f'{dst}.{uuid.uuid4().hex}.link'
+        try:
+            os.link(blob, link_path)
+        except OSError:
+            # Sistema de arquivos sem hardlink: cópia
+            shutil.copyfile(blob, link_path)
+        os.replace(link_path, dst)
+        if os.path.exists(link_path):
+            # rename entre dois links do mesmo inode não faz nada (corrida com outro publish)
+            os.remove(link_path)
+
+    def remove(self, filename):
+        """Remove o nome; o blob vai junto quando nenhum outro nome nem job o usa"""
+        path = self.name_path(filename)
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        self.collect_blobs()
+        return True
+
+    def collect_blobs(self):
+        """
+        Apaga blobs sem nenhum nome em uploads/ que nenhum job ou sessão ainda usa
+
+        Um blob em uso fica para a próxima coleta (no próximo upload ou remoção). Sem
+        hardlinks o número de links não diz nada: nada é apagado.
+        """
+        if not self.hardlinks:
+            return 0
+        with self._blobs_lock:
+            in_use = {os.path.abspath(path) for path in self.in_use()}
+            # Uploads em partes concluídos ainda não usados em /api/separate etc.
+            in_use.update(os.path.abspath(path) for path in self._session_blobs())
+            removed = 0
+            for entry in os.scandir(self.blobs_dir):
+                try:
+                    if entry.stat().st_nlink <= 1 and os.path.abspath(entry.path) not in in_use:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    pass
+            return removed
+
+    def _session_blobs(self):
+        for entry in os.scandir(self.incoming_dir):
+            if entry.name.endswith('.json'):
+                try:
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if meta.get('path'):
+                    yield meta['path']
+
+    def _supports_hardlinks(self):
+        probe = os.path.join(self.incoming_dir, f'{uuid.uuid4().hex}.probe')
+        try:
+            open(probe, 'wb').close()
+            os.link(probe, probe + '.link')
+            os.remove(probe + '.link')
+            return True
+        except OSError:
+            return False
+        finally:
+            if os.path.exists(probe):
+                os.remove(probe)
+
+    # ---------- Hash sem reler o arquivo ----------
+
+    def _file_key(self, path):
+        st = os.stat(path)
+        return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _remember(self, path, audio_hash):
+        with self._lock:
+            self._hashes[self._file_key(path)] = audio_hash
+            while len(self._hashes) > HASH_MEMO_SIZE:
+                self._hashes.popitem(last=False)
+
+    def hash_of(self, path):
+        """SHA-256 do arquivo; nomes publicados compartilham o inode do blob e não são relidos"""
+        key = self._file_key(path)
+        with self._lock:
+            audio_hash = self._hashes.get(key)
+        if audio_hash is None:
+            from result_cache import hash_file
+            audio_hash = hash_file(path)
+            self._remember(path, audio_hash)
+        return audio_hash
+
+    # ---------- Uploads em partes (retomáveis) ----------
+
+    def _meta_path(self, upload_id):
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            raise UploadNotFoundError(upload_id)
+        return os.path.join(self.incoming_dir, f'{upload_id}.json')
+
+    def _read_meta(self, upload_id):
+        try:
+            with open(self._meta_path(upload_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadNotFoundError(upload_id)
+
+    def _write_meta(self, upload_id, meta):
+        path = self._meta_path(upload_id)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+    def _session_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def create_session(self, filename, size, sha256=None):
+        """
+        Abre um upload em partes
+
+        Com sha256 de um conteúdo já guardado, a sessão nasce concluída (nada a enviar).
+        """
+        # Mesmo nome que o upload multipart (sem diretórios): é o que o app grava e devolve
+        filename = _safe_name(filename)
+        size = int(size)
+        if size <= 0:
+            raise ValueError('Tamanho inválido')
+        self.prune_sessions()
+        upload_id = uuid.uuid4().hex
+        meta = {'upload_id': upload_id, 'filename': filename, 'size': size,
+                'created': time.time(), 'complete': False}
+        blob = self.blob_path(sha256.lower(), filename) if sha256 else None
+        with self._blobs_lock:
+            deduplicated = blob is not None and os.path.exists(blob)
+            if deduplicated:
+                self.publish(blob, filename)
+        if deduplicated:
+            meta.update(complete=True, audio_hash=sha256.lower(), path=blob, deduplicated=True)
+            self.collect_blobs()
+        else:
+            open(os.path.join(self.incoming_dir, f'{upload_id}.part'), 'wb').close()
+        self._write_meta(upload_id, meta)
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        meta = self._read_meta(upload_id)
+        if meta['complete']:
+            offset = meta['size']
+        else:
+            offset = os.path.getsize(os.path.join(self.incoming_dir, f'{upload_id}.part'))
+        status = {key: meta[key] for key in ('upload_id', 'filename', 'size', 'complete')}
+        status.update(offset=offset, chunk_size=UPLOAD_CHUNK_SIZE)
+        if meta['complete']:
+            status.update(audio_hash=meta['audio_hash'], deduplicated=meta.get('deduplicated', False))
+        return status
+
+    def append(self, upload_id, offset, stream):
+        """
+        Acrescenta uma parte a partir de `offset` (precisa ser o tamanho atual do .part)
+
+        Ao atingir o tamanho declarado o arquivo é movido para o blob e a sessão é concluída.
+        """
+        with self._session_lock(upload_id):
+            meta = self._read_meta(upload_id)
+            if meta['complete']:
+                return self.status(upload_id)
+            partial_path = os.path.join(self.incoming_dir, f'{upload_id}.part')
+            current = os.path.getsize(partial_path)
+            if offset != current:
+                raise UploadOffsetError(current)
+
+            digest, hashed = self._sessions.get(upload_id, (None, -1))
+            if hashed != current:
+                # Processo reiniciado (ou outro nó): refaz o hash do que já chegou
+                digest = hashlib.sha256()
+                with open(partial_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        digest.update(chunk)
+
+            try:
+                with open(partial_path, 'ab') as f, metrics.stage_timer('upload_chunk'):
+                    written = _copy_stream(stream, f, digest, limit=meta['size'] - current)
+            except BaseException:
+                # Parte incompleta/inválida: volta ao último ponto consistente
+                with open(partial_path, 'ab') as f:
+                    f.truncate(current)
+                self._sessions.pop(upload_id, None)
+                raise
+            current += written
+            self._sessions[upload_id] = (digest, current)
+
+            if current == meta['size']:
+                self._sessions.pop(upload_id, None)
+                blob, audio_hash, deduplicated = self._commit(partial_path, digest.hexdigest(),
+                                                              meta['filename'])
+                meta.update(complete=True, audio_hash=audio_hash, path=blob,
+                            deduplicated=deduplicated)
+                self._write_meta(upload_id, meta)
+        return self.status(upload_id)
+
+    def completed(self, upload_id):
+        """(caminho do blob, nome, hash) de um upload concluído"""
+        meta = self._read_meta(upload_id)
+        if not meta['complete'] or not os.path.exists(meta['path']):
+            raise UploadNotFoundError(upload_id)
+        return meta['path'], _safe_name(meta['filename']), meta['audio_hash']
+
+    def prune_sessions(self, max_age=SESSION_MAX_AGE):
+        """
+        Apaga sessões sem atividade há mais de max_age
+
+        A atividade é o arquivo mais recente da sessão (o .part cresce a cada PUT; o .json só
+        muda ao abrir e concluir), e .json/.part saem juntos.
+        """
+        limit = time.time() - max_age
+        sessions = {}
+        for entry in os.scandir(self.incoming_dir):
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            session = sessions.setdefault(entry.name.split('.', 1)[0], [0, []])
+            session[0] = max(session[0], mtime)
+            session[1].append(entry.path)
+        for last_activity, paths in sessions.values():
+            if last_activity >= limit:
+                continue
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,103 @@
+# waveform_peaks.py - Picos (min/max) em várias resoluções para desenhar a waveform sem baixar o áudio
+#
+# Formato binário (little-endian):
+#   cabeçalho: b'MAPK' | versão u8 | nº de níveis u8 | sample_rate u32 | total de amostras u64
+#   por nível: amostras por pico u32 | nº de picos u32
+#   dados:     para cada nível, nº de picos pares (min, max) em int8 (-127..127)
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'MAPK'
+VERSION = 1
+HEADER = struct.Struct('<4sBBIQ')
+LEVEL = struct.Struct('<II')
+
+# Nível mais fino: 256 amostras por pico (~5.8 ms @ 44.1 kHz); cada nível seguinte tem metade dos picos
+BASE_SAMPLES_PER_PEAK = 256
+# Para de reduzir quando o nível já cabe numa tela (menos picos que isso)
+MIN_PEAKS = 1024
+
+
+def compute_levels(y, base_samples_per_peak=BASE_SAMPLES_PER_PEAK, min_peaks=MIN_PEAKS):
+    """
+    [(amostras por pico, mins, maxs), ...] do mais fino ao mais grosso
+
+    y: (canais x amostras) ou (amostras,); os canais são combinados (menor mínimo, maior máximo).
+    """
+    y = np.atleast_2d(y)
+    length = y.shape[-1]
+    full = length // base_samples_per_peak
+    mins = np.full(full, np.inf, dtype=np.float32)
+    maxs = np.full(full, -np.inf, dtype=np.float32)
+    for channel in y:
+        # Fatia 1D contígua: o reshape é uma view, sem copiar o áudio
+        frames = channel[:full * base_samples_per_peak].reshape(full, base_samples_per_peak)
+        np.minimum(mins, frames.min(axis=1), out=mins)
+        np.maximum(maxs, frames.max(axis=1), out=maxs)
+    if length % base_samples_per_peak or not full:
+        tail = y[:, full * base_samples_per_peak:]
+        mins = np.append(mins, tail.min() if tail.size else 0.0)
+        maxs = np.append(maxs, tail.max() if tail.size else 0.0)
+
+    levels = [(base_samples_per_peak, mins, maxs)]
+    samples_per_peak = base_samples_per_peak
+    while len(mins) > min_peaks:
+        if len(mins) % 2:
+            mins = np.append(mins, mins[-1])
+            maxs = np.append(maxs, maxs[-1])
+        mins = mins.reshape(-1, 2).min(axis=1)
+        maxs = maxs.reshape(-1, 2).max(axis=1)
+        samples_per_peak *= 2
+        levels.append((samples_per_peak, mins, maxs))
+    return levels
+
+
+def encode(levels, sample_rate, total_samples):
+    parts = [HEADER.pack(MAGIC, VERSION, len(levels), int(sample_rate), int(total_samples))]
+    data = []
+    for samples_per_peak, mins, maxs in levels:
+        parts.append(LEVEL.pack(samples_per_peak, len(mins)))
+        pairs = np.empty(len(mins) * 2, dtype=np.float32)
+        pairs[0::2] = mins
+        pairs[1::2] = maxs
+        data.append(np.clip(np.round(pairs * 127), -127, 127).astype(np.int8).tobytes())
+    return b''.join(parts + data)
+
+
+def decode(blob):
+    """Inverso de encode: (sample_rate, total de amostras, [(amostras por pico, pares int8), ...])"""
+    magic, version, count, sample_rate, total_samples = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Arquivo de picos inválido')
+    offset = HEADER.size
+    specs = []
+    for _ in range(count):
+        specs.append(LEVEL.unpack_from(blob, offset))
+        offset += LEVEL.size
+    levels = []
+    for samples_per_peak, peaks in specs:
+        pairs = np.frombuffer(blob, dtype=np.int8, count=peaks * 2, offset=offset)
+        levels.append((samples_per_peak, pairs))
+        offset += peaks * 2
+    return sample_rate, total_samples, levels
+
+
+def write_peaks(y, sample_rate, dst_path):
+    """Calcula e grava os picos de y (gravação atômica)"""
+    y = np.atleast_2d(y)
+    blob = encode(compute_levels(y), sample_rate, y.shape[-1])
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    partial_path = dst_path + '.part'
+    with open(partial_path, 'wb') as f:
+        f.write(blob)
+    os.replace(partial_path, dst_path)
+    return dst_path
+
+
+def write_file_peaks(audio_path, dst_path):
+    """Picos de um arquivo de áudio (stems já gravados)"""
+    import soundfile as sf
+    data, sr = sf.read(audio_path, dtype='float32', always_2d=True)
+    return write_peaks(data.T, sr, dst_path)
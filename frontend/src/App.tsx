@@ -47,6 +47,11 @@ export default function MusicAnalyzer() {
   const [audioUrlForVisualizer, setAudioUrlForVisualizer] = useState<
     string | null
   >(null);
+  // Picos pré-calculados valem só para o áudio exato a que pertencem
+  const [visualizerPeaks, setVisualizerPeaks] = useState<{
+    audioUrl: string;
+    peaksUrl: string;
+  } | null>(null);
   const [stemsMode, setStemsMode] = useState<"2" | "4" | "6">("4");
   const [quality, setQuality] = useState<"basic" | "intermediate" | "maximum">(
     "intermediate"
@@ -101,8 +106,39 @@ export default function MusicAnalyzer() {
     setPlaybackRate,
     setPitchShift,
     processAudioDebounced,
+    isLive,
+    startLive,
+    updateLive,
+    stopLive,
+    setLiveVolume,
   } = useAudioEffects(API_URL);
 
+  // Último playhead visto: salto grande = seek (o tempo real recomeça ali)
+  const lastTimeRef = useRef(0);
+
+  // Tempo real enquanto o render do pitch não fica pronto: o WaveSurfer segue tocando
+  // mudo (só o playhead) e o áudio vem do servidor a partir da posição atual
+  const beginLive = useCallback(async () => {
+    const wavesurfer = wavesurferRef.current;
+    if (!wavesurfer || stems.length > 0 || (!file && !loadedFromHistory)) return;
+    const position = wavesurfer.getCurrentTime();
+    const started = loadedFromHistory
+      ? await startLive(loadedFromHistory, position, pitchShift, playbackRate)
+      : await startLive(file!.name, position, pitchShift, playbackRate, file!);
+    if (started) wavesurfer.setVolume(0);
+  }, [stems.length, file, loadedFromHistory, startLive, pitchShift, playbackRate]);
+
+  const endLive = useCallback(() => {
+    stopLive();
+    if (wavesurferRef.current && stems.length === 0) {
+      wavesurferRef.current.setVolume(0.8);
+    }
+  }, [stopLive, stems.length]);
+
+  useEffect(() => {
+    setLiveVolume(isMasterMuted ? 0 : masterVolume);
+  }, [masterVolume, isMasterMuted, setLiveVolume]);
+
   // Carregar histórico ao inicializar
   useEffect(() => {
     loadHistory();
@@ -113,7 +149,12 @@ export default function MusicAnalyzer() {
     if (wavesurferRef.current) {
       // Velocidade funciona nativamente no WaveSurfer
       wavesurferRef.current.setPlaybackRate(playbackRate);
+      // Tempo real acompanha o playhead: mesma velocidade a partir da posição atual
+      if (isLive) {
+        updateLive(pitchShift, playbackRate, wavesurferRef.current.getCurrentTime());
+      }
     }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [playbackRate]);
 
   // Atualizar velocidade dos stems
@@ -135,6 +176,7 @@ export default function MusicAnalyzer() {
     // Se pitch é 0, voltar ao áudio original
     if (pitchShift === 0) {
       console.log("[App] Pitch = 0, voltando ao áudio original");
+      endLive();
       
       if (processedAudioUrl) {
         URL.revokeObjectURL(processedAudioUrl);
@@ -153,6 +195,15 @@ export default function MusicAnalyzer() {
       return;
     }
 
+    // Tocando: ouve o novo tom já (tempo real) enquanto o render completo é processado
+    if (wavesurferRef.current?.isPlaying() && stems.length === 0) {
+      if (isLive) {
+        updateLive(pitchShift, playbackRate, wavesurferRef.current.getCurrentTime());
+      } else {
+        beginLive();
+      }
+    }
+
     // IMPORTANTE: Priorizar histórico sobre file
     // Se loadedFromHistory existe, sempre usar a URL (mesmo que file exista)
     if (loadedFromHistory && audioUrlForVisualizer) {
@@ -169,6 +220,8 @@ export default function MusicAnalyzer() {
   useEffect(() => {
     if (processedAudioUrl) {
       console.log("[App] Áudio processado pronto, atualizando visualizador");
+      // Render completo assume o lugar do tempo real (o WaveSurfer volta a ter som no 'ready')
+      stopLive();
       
       // Resetar player para carregar novo áudio
       if (wavesurferRef.current) {
@@ -278,6 +331,23 @@ export default function MusicAnalyzer() {
           newStems.length
         );
       },
+      onPreview: ({ stems: previewStems, volumes, mutes, start, end, update }) => {
+        // Trecho já separado: dá para ouvir enquanto a música inteira processa
+        console.log(
+          `[App] Prévia (${start.toFixed(0)}s-${end.toFixed(0)}s):`,
+          previewStems.map((s) => s.name)
+        );
+        setStems(previewStems);
+        if (update) {
+          // Mais blocos prontos: mantém o mix que o usuário já ajustou
+          setStemVolumes((prev) => ({ ...volumes, ...prev }));
+          setMutedStems((prev) => ({ ...mutes, ...prev }));
+          return;
+        }
+        setStemVolumes(volumes);
+        setMutedStems(mutes);
+        setSoloStems({});
+      },
       onError: () => {
         console.error("[App] onError chamado!");
       },
@@ -309,6 +379,7 @@ export default function MusicAnalyzer() {
         volumes,
         mutes,
         audioUrl,
+        peaksUrl,
       }) => {
         setStems(newStems);
         setStemVolumes(volumes);
@@ -316,6 +387,9 @@ export default function MusicAnalyzer() {
         setChords(newChords);
         setSoloStems({});
         setAudioUrlForVisualizer(audioUrl);
+        setVisualizerPeaks(
+          audioUrl && peaksUrl ? { audioUrl, peaksUrl } : null
+        );
         setLoadedFromHistory(filename);
         setFile(null);
         setAudioLoaded(false);
@@ -369,6 +443,20 @@ export default function MusicAnalyzer() {
     syncAudioTime(time);
   };
 
+  // Stem (re)carregado, ex: blocos progressivos novos trocam a URL no meio da música
+  const handleStemLoaded = (e: React.SyntheticEvent<HTMLAudioElement>) => {
+    const audio = e.currentTarget;
+    if (!Number.isFinite(audio.duration)) return;
+    // Stems parciais são mais curtos que a música: a duração não diminui
+    setDuration((prev) => Math.max(prev, audio.duration));
+    const player = wavesurferRef.current;
+    if (!player) return;
+    audio.currentTime = Math.min(player.getCurrentTime(), audio.duration);
+    if (player.isPlaying()) {
+      audio.play().catch((error) => console.error("Error playing stem:", error));
+    }
+  };
+
   const handleVolumeChange = (stem: string, value: number) => {
     setStemVolumes((prev) => ({ ...prev, [stem]: value }));
   };
@@ -402,8 +490,12 @@ export default function MusicAnalyzer() {
       if (stems.length > 0) {
         syncAudioTime(time);
       }
+      if (isLive && Math.abs(time - lastTimeRef.current) > 1) {
+        updateLive(pitchShift, playbackRate, time);
+      }
+      lastTimeRef.current = time;
     },
-    [stems.length, syncAudioTime]
+    [stems.length, syncAudioTime, isLive, updateLive, pitchShift, playbackRate]
   );
 
   const handleVisualizerFinish = useCallback(() => {
@@ -414,6 +506,12 @@ export default function MusicAnalyzer() {
   const handleVisualizerPlaybackChange = useCallback(
     (isPlaying: boolean) => {
       setPlaying(isPlaying);
+      if (!isPlaying) {
+        endLive();
+      } else if (pitchShift !== 0 && isProcessingAudio && stems.length === 0) {
+        // Render do tom atual ainda em andamento: toca em tempo real
+        beginLive();
+      }
       if (stems.length > 0) {
         if (isPlaying) {
           playAllStems();
@@ -422,7 +520,7 @@ export default function MusicAnalyzer() {
         }
       }
     },
-    [stems.length, playAllStems, pauseAllStems]
+    [stems.length, playAllStems, pauseAllStems, endLive, beginLive, pitchShift, isProcessingAudio]
   );
 
   const isDisabled = detectingChords || chords.length > 0;
@@ -489,6 +587,11 @@ export default function MusicAnalyzer() {
               file={file}
               loadedFromHistory={loadedFromHistory}
               audioUrlForVisualizer={audioUrlForVisualizer}
+              peaksUrlForVisualizer={
+                visualizerPeaks?.audioUrl === audioUrlForVisualizer
+                  ? visualizerPeaks.peaksUrl
+                  : null
+              }
               playing={playing}
               audioLoaded={audioLoaded}
               currentTime={currentTime}
@@ -515,6 +618,7 @@ export default function MusicAnalyzer() {
                 onPlaybackRateChange={setPlaybackRate}
                 onPitchShiftChange={setPitchShift}
                 isProcessing={isProcessingAudio}
+                isLive={isLive}
               />
             )}
 
@@ -543,7 +647,7 @@ export default function MusicAnalyzer() {
               onToggleMute={toggleMute}
               onToggleSolo={handleToggleSolo}
               onTimeUpdate={handleTimeUpdate}
-              onLoadedMetadata={(e) => setDuration(e.currentTarget.duration)}
+              onLoadedMetadata={handleStemLoaded}
             />
           </div>
         )}
@@ -7,6 +7,7 @@ interface AudioControlsProps {
   onPlaybackRateChange: (rate: number) => void;
   onPitchShiftChange: (semitones: number) => void;
   isProcessing?: boolean;
+  isLive?: boolean;
 }
 
 export function AudioControls({
@@ -15,6 +16,7 @@ export function AudioControls({
   onPlaybackRateChange,
   onPitchShiftChange,
   isProcessing = false,
+  isLive = false,
 }: AudioControlsProps) {
   const handleReset = () => {
     onPlaybackRateChange(1);
@@ -29,7 +31,7 @@ export function AudioControls({
           Controles de Áudio
           {isProcessing && (
             <span className="text-xs text-yellow-400 animate-pulse">
-              (Processando...)
+              {isLive ? "(Tempo real)" : "(Processando...)"}
             </span>
           )}
         </h3>
@@ -127,7 +129,7 @@ export function AudioControls({
           </p>
           {pitchShift !== 0 && (
             <p className="text-xs text-gray-500 mt-1">
-              ⏱️ Processamento: ~3-8 segundos (mantém qualidade original)
+              ⏱️ Tocando: o novo tom sai em menos de 1s (tempo real) até o render completo ficar pronto
             </p>
           )}
         </div>
@@ -9,6 +9,7 @@ interface MusicPlayerProps {
   file: File | null;
   loadedFromHistory: string | null;
   audioUrlForVisualizer: string | null;
+  peaksUrlForVisualizer?: string | null;
   playing: boolean;
   audioLoaded: boolean;
   currentTime: number;
@@ -31,6 +32,7 @@ export function MusicPlayer({
   file,
   loadedFromHistory,
   audioUrlForVisualizer,
+  peaksUrlForVisualizer,
   playing,
   audioLoaded,
   currentTime,
@@ -77,6 +79,7 @@ export function MusicPlayer({
             ref={visualizerRef}
             wavesurferRef={wavesurferRef}
             audioUrl={audioUrlForVisualizer}
+            peaksUrl={peaksUrlForVisualizer}
             isPlaying={playing}
             currentTime={currentTime}
             hasSeparatedStems={hasSeparatedStems}
@@ -7,6 +7,7 @@ import {
   useImperativeHandle,
 } from "react";
 import WaveSurfer from "wavesurfer.js";
+import { fetchPeaks, peaksForWidth } from "../lib/peaks";
 
 export interface WaveformHandle {
   togglePlayPause: () => Promise<void>;
@@ -17,6 +18,7 @@ export interface WaveformHandle {
 
 interface WaveformVisualizerProps {
   audioUrl: string | null;
+  peaksUrl?: string | null; // Picos pré-calculados: desenha sem decodificar o áudio
   isPlaying: boolean;
   currentTime?: number; // Tempo atual para sincronizar quando há stems
   onReady: (duration: number) => void;
@@ -34,6 +36,7 @@ export const WaveformVisualizer = forwardRef<
   (
     {
       audioUrl,
+      peaksUrl,
       isPlaying,
       currentTime,
       onReady,
@@ -155,7 +158,34 @@ export const WaveformVisualizer = forwardRef<
       });
 
       wavesurferRef.current = wavesurfer;
-      wavesurfer.load(audioUrl);
+
+      // Com picos do servidor, a waveform aparece sem baixar/decodificar o áudio inteiro
+      const abortController = new AbortController();
+      const loadAudio = async () => {
+        if (peaksUrl) {
+          try {
+            const peaks = await fetchPeaks(peaksUrl, abortController.signal);
+            if (abortController.signal.aborted) return;
+            const width =
+              (containerRef.current?.clientWidth || 1000) *
+              (window.devicePixelRatio || 1);
+            wavesurfer.load(
+              audioUrl,
+              [peaksForWidth(peaks, width)],
+              peaks.duration
+            );
+            return;
+          } catch (error) {
+            if (abortController.signal.aborted) return;
+            console.warn(
+              "[WaveformVisualizer] Picos indisponíveis, decodificando áudio:",
+              error
+            );
+          }
+        }
+        wavesurfer.load(audioUrl);
+      };
+      loadAudio();
 
       wavesurfer.on("ready", () => {
         // Se há stems separados, mutar o waveform (apenas visualização)
@@ -222,6 +252,7 @@ export const WaveformVisualizer = forwardRef<
       container.addEventListener("mouseleave", handleMouseLeave);
 
       return () => {
+        abortController.abort();
         container.removeEventListener("mousemove", handleMouseMove);
         container.removeEventListener("mouseenter", handleMouseEnter);
         container.removeEventListener("mouseleave", handleMouseLeave);
@@ -229,7 +260,7 @@ export const WaveformVisualizer = forwardRef<
         setIsReady(false);
         wavesurfer.destroy();
       };
-    }, [audioUrl, wavesurferRef, hasSeparatedStems]); // Adicionado hasSeparatedStems
+    }, [audioUrl, peaksUrl, wavesurferRef, hasSeparatedStems]); // Adicionado hasSeparatedStems
 
     // Sincronizar progresso visual quando há stems separados
     useEffect(() => {
@@ -8,6 +8,21 @@ import type {
   StemVolumes,
   MutedStems,
 } from "../types";
+import { uploadFile, forgetUpload } from "../lib/upload";
+
+// Stems sem duplicatas + volume/mute iniciais
+function buildStemState(stems: Stem[]) {
+  const uniqueStems = stems.filter(
+    (stem, index, self) => index === self.findIndex((s) => s.name === stem.name)
+  );
+  const volumes: StemVolumes = {};
+  const mutes: MutedStems = {};
+  uniqueStems.forEach((stem) => {
+    volumes[stem.name] = 1;
+    mutes[stem.name] = false;
+  });
+  return { stems: uniqueStems, volumes, mutes };
+}
 
 export function useAnalysis(apiUrl: string) {
   const [analyzing, setAnalyzing] = useState(false);
@@ -15,11 +30,64 @@ export function useAnalysis(apiUrl: string) {
   const [detectingChords, setDetectingChords] = useState(false);
   const [progress, setProgress] = useState<ProgressData | null>(null);
 
+  // Atualiza o progresso; retorna true quando a task terminou (sucesso ou erro)
+  const handleProgressUpdate = useCallback(
+    (
+      progressData: ProgressData,
+      onSuccess?: (data: ProgressData) => void,
+      onError?: () => void,
+      onUpdate?: (data: ProgressData) => void
+    ) => {
+      setProgress(progressData);
+      if (onUpdate) onUpdate(progressData);
+
+      if (progressData.percentage >= 100 || progressData.step === -1) {
+        console.log("[progress] Processo finalizado! progressData completo:", progressData);
+
+        if (progressData.percentage >= 100 && onSuccess) {
+          onSuccess(progressData);
+        } else if (onError) {
+          onError();
+        }
+
+        if (progressData.step !== -1) {
+          setTimeout(() => setProgress(null), 2000);
+        }
+        return true;
+      }
+      return false;
+    },
+    []
+  );
+
+  // Envia o arquivo em partes (retomável) e faz o POST com o upload_id;
+  // se o upload sumiu do servidor (404), envia de novo uma vez
+  const postWithUpload = useCallback(
+    async (file: File, url: string, buildForm: (uploadId: string) => FormData) => {
+      for (let attempt = 0; ; attempt++) {
+        const uploadId = await uploadFile(apiUrl, file, (fraction) =>
+          setProgress({
+            step: 0,
+            message: `Enviando arquivo: ${Math.round(fraction * 100)}%`,
+            percentage: 0,
+            timestamp: new Date().toISOString(),
+          })
+        );
+        const response = await fetch(url, { method: "POST", body: buildForm(uploadId) });
+        if (response.status !== 404 || attempt > 0) return response;
+        forgetUpload(file);
+      }
+    },
+    [apiUrl]
+  );
+
+  // Fallback: polling de /api/progress quando SSE não está disponível
   const pollProgress = useCallback(
     async (
       taskId: string,
       onSuccess?: (data: ProgressData) => void,
-      onError?: () => void
+      onError?: () => void,
+      onUpdate?: (data: ProgressData) => void
     ) => {
       let consecutiveErrors = 0;
       const maxErrors = 5;
@@ -28,28 +96,11 @@ export function useAnalysis(apiUrl: string) {
         try {
           const response = await fetch(`${apiUrl}/api/progress/${taskId}`);
           if (response.ok) {
-            const progressData = await response.json();
-            setProgress(progressData);
+            const progressData: ProgressData = await response.json();
             consecutiveErrors = 0; // Reset error counter on success
 
-            // Log quando chegar perto de 100%
-            if (progressData.percentage >= 90) {
-              console.log(`[pollProgress] ${progressData.percentage}% - Debug:`, progressData._debug);
-            }
-
-            if (progressData.percentage >= 100 || progressData.step === -1) {
-              console.log("[pollProgress] Processo finalizado! progressData completo:", progressData);
+            if (handleProgressUpdate(progressData, onSuccess, onError, onUpdate)) {
               clearInterval(pollInterval);
-
-              if (progressData.percentage >= 100 && onSuccess) {
-                onSuccess(progressData);
-              } else if (onError) {
-                onError();
-              }
-
-              if (progressData.step !== -1) {
-                setTimeout(() => setProgress(null), 2000);
-              }
             }
           } else {
             consecutiveErrors++;
@@ -71,7 +122,41 @@ export function useAnalysis(apiUrl: string) {
 
       return pollInterval;
     },
-    [apiUrl]
+    [apiUrl, handleProgressUpdate]
+  );
+
+  // Progresso empurrado pelo servidor (SSE); cai para polling se a conexão falhar
+  const trackProgress = useCallback(
+    (
+      taskId: string,
+      onSuccess?: (data: ProgressData) => void,
+      onError?: () => void,
+      onUpdate?: (data: ProgressData) => void
+    ) => {
+      if (typeof EventSource === "undefined") {
+        pollProgress(taskId, onSuccess, onError, onUpdate);
+        return;
+      }
+
+      const source = new EventSource(`${apiUrl}/api/progress/${taskId}/stream`);
+      let finished = false;
+
+      source.onmessage = (event) => {
+        const progressData: ProgressData = JSON.parse(event.data);
+        if (handleProgressUpdate(progressData, onSuccess, onError, onUpdate)) {
+          finished = true;
+          source.close();
+        }
+      };
+
+      source.onerror = () => {
+        if (finished) return;
+        console.warn("[trackProgress] SSE indisponível, usando polling");
+        source.close();
+        pollProgress(taskId, onSuccess, onError, onUpdate);
+      };
+    },
+    [apiUrl, pollProgress, handleProgressUpdate]
   );
 
   const separateStems = useCallback(
@@ -85,6 +170,16 @@ export function useAnalysis(apiUrl: string) {
           volumes: StemVolumes;
           mutes: MutedStems;
         }) => void;
+        // Prévia (trecho separado com a config básica ou os blocos progressivos prontos)
+        // enquanto o job completo roda; update = stems maiores da mesma separação
+        onPreview?: (data: {
+          stems: Stem[];
+          volumes: StemVolumes;
+          mutes: MutedStems;
+          start: number;
+          end: number;
+          update: boolean;
+        }) => void;
         onError: () => void;
         onComplete: () => void;
       }
@@ -98,24 +193,47 @@ export function useAnalysis(apiUrl: string) {
         timestamp: new Date().toISOString(),
       });
 
-      const formData = new FormData();
-      formData.append("audio", file);
-      formData.append("stems_mode", stemsMode);
-      formData.append("quality_mode", qualityMode);
+      const buildForm = (uploadId: string) => {
+        const formData = new FormData();
+        formData.append("upload_id", uploadId);
+        formData.append("stems_mode", stemsMode);
+        formData.append("quality_mode", qualityMode);
+        if (callbacks.onPreview) {
+          formData.append("preview", "1");
+          formData.append("progressive", "1");
+        }
+        return formData;
+      };
 
       try {
-        const response = await fetch(`${apiUrl}/api/separate`, {
-          method: "POST",
-          body: formData,
-        });
+        const response = await postWithUpload(file, `${apiUrl}/api/separate`, buildForm);
+
+        if (response.status === 429) {
+          // Fila de separação cheia no servidor
+          const busy = await response.json();
+          setProgress({
+            step: -1,
+            message: busy.error || "Servidor ocupado. Tente novamente em instantes.",
+            percentage: 0,
+            timestamp: new Date().toISOString(),
+          });
+          setTimeout(() => setProgress(null), 5000);
+          callbacks.onError();
+          setAnalyzing(false);
+          setSeparating(false);
+          callbacks.onComplete();
+          return;
+        }
 
         if (!response.ok) throw new Error("Erro na separação");
 
         const data: AnalysisResponse = await response.json();
 
         if (data.task_id) {
-          // Iniciar polling e aguardar conclusão
-          pollProgress(
+          let previewShown = false;
+          let segmentsShown = 0;
+          // Acompanhar progresso e aguardar conclusão
+          trackProgress(
             data.task_id,
             (progressData) => {
               // Debug: verificar o que está vindo no progressData
@@ -127,26 +245,11 @@ export function useAnalysis(apiUrl: string) {
                 console.log("[useAnalysis] Processando stems:", progressData.stems.length);
 
                 // Remover duplicatas baseado no nome do stem
-                const uniqueStems = progressData.stems.filter(
-                  (stem: Stem, index: number, self: Stem[]) =>
-                    index === self.findIndex((s) => s.name === stem.name)
-                );
-
-                console.log("[useAnalysis] Stems únicos:", uniqueStems.length);
+                const stemState = buildStemState(progressData.stems);
 
-                const volumes: StemVolumes = {};
-                const mutes: MutedStems = {};
-                uniqueStems.forEach((stem: Stem) => {
-                  volumes[stem.name] = 1;
-                  mutes[stem.name] = false;
-                });
-
-                console.log("[useAnalysis] Chamando onSuccess com stems:", uniqueStems);
-                callbacks.onSuccess({
-                  stems: uniqueStems,
-                  volumes,
-                  mutes,
-                });
+                console.log("[useAnalysis] Stems únicos:", stemState.stems.length);
+                console.log("[useAnalysis] Chamando onSuccess com stems:", stemState.stems);
+                callbacks.onSuccess(stemState);
               } else {
                 console.warn("[useAnalysis] Nenhum stem encontrado no progressData!");
                 console.warn("[useAnalysis] progressData completo:", JSON.stringify(progressData, null, 2));
@@ -161,6 +264,39 @@ export function useAnalysis(apiUrl: string) {
               setAnalyzing(false);
               setSeparating(false);
               callbacks.onComplete();
+            },
+            (progressData) => {
+              if (!callbacks.onPreview) return;
+              // Blocos progressivos: a cada bloco novo os stems passam a cobrir
+              // do início da música até o fim dele (trocam a prévia, se houver)
+              const segments = progressData.segments ?? [];
+              const latest = segments[segments.length - 1];
+              if (segments.length > segmentsShown && latest?.combined) {
+                segmentsShown = segments.length;
+                console.log(
+                  `[useAnalysis] Blocos prontos: ${segments.length} (até ${latest.end.toFixed(0)}s)`
+                );
+                callbacks.onPreview({
+                  ...buildStemState(latest.combined),
+                  start: 0,
+                  end: latest.end,
+                  update: previewShown,
+                });
+                previewShown = true;
+                return;
+              }
+              // Trecho representativo: chega uma vez, antes do resultado completo
+              const preview = progressData.preview;
+              if (!previewShown && preview) {
+                previewShown = true;
+                console.log("[useAnalysis] Prévia pronta:", preview);
+                callbacks.onPreview({
+                  ...buildStemState(preview.stems),
+                  start: preview.start,
+                  end: preview.end,
+                  update: false,
+                });
+              }
             }
           );
         } else {
@@ -185,7 +321,7 @@ export function useAnalysis(apiUrl: string) {
         callbacks.onComplete();
       }
     },
-    [apiUrl, pollProgress]
+    [apiUrl, trackProgress, postWithUpload]
   );
 
   const detectChords = useCallback(
@@ -206,14 +342,14 @@ export function useAnalysis(apiUrl: string) {
         timestamp: new Date().toISOString(),
       });
 
-      const formData = new FormData();
-      formData.append("audio", file);
+      const buildForm = (uploadId: string) => {
+        const formData = new FormData();
+        formData.append("upload_id", uploadId);
+        return formData;
+      };
 
       try {
-        const response = await fetch(`${apiUrl}/api/chords`, {
-          method: "POST",
-          body: formData,
-        });
+        const response = await postWithUpload(file, `${apiUrl}/api/chords`, buildForm);
 
         if (!response.ok) throw new Error("Erro na detecção de acordes");
 
@@ -224,9 +360,9 @@ export function useAnalysis(apiUrl: string) {
           console.log("Acordes detectados:", data.chords.length);
           callbacks.onSuccess(data.chords);
 
-          // Fazer polling apenas para atualizar o progresso visual
+          // Acompanhar apenas para atualizar o progresso visual
           if (data.task_id) {
-            pollProgress(data.task_id, undefined, undefined);
+            trackProgress(data.task_id, undefined, undefined);
           }
 
           setAnalyzing(false);
@@ -251,7 +387,7 @@ export function useAnalysis(apiUrl: string) {
         callbacks.onComplete();
       }
     },
-    [apiUrl, pollProgress]
+    [apiUrl, trackProgress, postWithUpload]
   );
 
   return {
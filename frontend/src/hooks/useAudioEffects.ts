@@ -1,4 +1,6 @@
 import { useState, useCallback, useRef, useEffect } from "react";
+import { LiveRenderPlayer, type LiveSource } from "../lib/liveRender";
+import { uploadFile } from "../lib/upload";
 
 export function useAudioEffects(apiUrl: string) {
     const [playbackRate, setPlaybackRate] = useState(1);
@@ -6,8 +8,64 @@ export function useAudioEffects(apiUrl: string) {
     const [isProcessing, setIsProcessing] = useState(false);
     const [processedAudioUrl, setProcessedAudioUrl] = useState<string | null>(null);
 
+    const [isLive, setIsLive] = useState(false);
+
     const abortControllerRef = useRef<AbortController | null>(null);
     const debounceTimerRef = useRef<number | null>(null);
+    const livePlayerRef = useRef<LiveRenderPlayer | null>(null);
+
+    // Aguarda a task de render (SSE, com polling como fallback) e retorna a render_url
+    const waitForRender = useCallback((taskId: string, signal: AbortSignal) => {
+        return new Promise<string>((resolve, reject) => {
+            const finish = (data: { step: number; percentage: number; render_url?: string; message?: string }) => {
+                if (data.step === -1) {
+                    reject(new Error(data.message || "Erro no processamento"));
+                    return true;
+                }
+                if (data.percentage >= 100 && data.render_url) {
+                    resolve(data.render_url);
+                    return true;
+                }
+                return false;
+            };
+
+            const poll = () => {
+                const interval = window.setInterval(async () => {
+                    if (signal.aborted) {
+                        window.clearInterval(interval);
+                        reject(new DOMException("Aborted", "AbortError"));
+                        return;
+                    }
+                    try {
+                        const response = await fetch(`${apiUrl}/api/progress/${taskId}`);
+                        if (response.ok && finish(await response.json())) {
+                            window.clearInterval(interval);
+                        }
+                    } catch (error) {
+                        console.error("[AudioEffects] Erro ao buscar progresso:", error);
+                    }
+                }, 300);
+            };
+
+            if (typeof EventSource === "undefined") {
+                poll();
+                return;
+            }
+
+            const source = new EventSource(`${apiUrl}/api/progress/${taskId}/stream`);
+            signal.addEventListener("abort", () => {
+                source.close();
+                reject(new DOMException("Aborted", "AbortError"));
+            });
+            source.onmessage = (event) => {
+                if (finish(JSON.parse(event.data))) source.close();
+            };
+            source.onerror = () => {
+                source.close();
+                if (!signal.aborted) poll();
+            };
+        });
+    }, [apiUrl]);
 
     // Processar áudio no backend
     const processAudio = useCallback(async (
@@ -65,15 +123,21 @@ export function useAudioEffects(apiUrl: string) {
                 throw new Error(`Erro ao processar: ${response.statusText}`);
             }
 
-            const blob = await response.blob();
-            const url = URL.createObjectURL(blob);
-
             // Limpar URL anterior
-            if (processedAudioUrl) {
+            if (processedAudioUrl && processedAudioUrl.startsWith("blob:")) {
                 URL.revokeObjectURL(processedAudioUrl);
             }
 
-            setProcessedAudioUrl(url);
+            if (response.status === 202) {
+                // Render não estava em cache: aguardar a task e tocar direto do servidor
+                const { task_id } = await response.json();
+                const renderUrl = await waitForRender(task_id, abortControllerRef.current.signal);
+                setProcessedAudioUrl(`${apiUrl}${renderUrl}`);
+            } else {
+                // Render em cache: o WAV vem na própria resposta
+                const blob = await response.blob();
+                setProcessedAudioUrl(URL.createObjectURL(blob));
+            }
             console.log(`[AudioEffects] ✓ Áudio processado com sucesso`);
         } catch (error: any) {
             if (error.name === 'AbortError') {
@@ -84,7 +148,7 @@ export function useAudioEffects(apiUrl: string) {
         } finally {
             setIsProcessing(false);
         }
-    }, [apiUrl, processedAudioUrl]);
+    }, [apiUrl, processedAudioUrl, waitForRender]);
 
     // Processar com debounce (aguardar usuário parar de mover slider)
     const processAudioDebounced = useCallback((
@@ -105,6 +169,54 @@ export function useAudioEffects(apiUrl: string) {
         }, 500);
     }, [processAudio]);
 
+    // Tempo real: o servidor renderiza a partir do playhead enquanto o render completo não fica pronto
+    const startLive = useCallback(async (
+        filename: string,
+        position: number,
+        pitch: number,
+        rate: number,
+        fileObject?: File
+    ) => {
+        if (!livePlayerRef.current) {
+            livePlayerRef.current = new LiveRenderPlayer(apiUrl);
+        }
+        try {
+            // Arquivo novo: mesmo upload_id da separação/acordes (enviado uma vez só)
+            const source: LiveSource = fileObject
+                ? { uploadId: await uploadFile(apiUrl, fileObject) }
+                : { filename };
+            await livePlayerRef.current.start(source, position, { pitch, rate });
+            setIsLive(true);
+            return true;
+        } catch (error) {
+            console.warn('[AudioEffects] Tempo real indisponível, aguardando render completo:', error);
+            livePlayerRef.current.stop();
+            setIsLive(false);
+            return false;
+        }
+    }, [apiUrl]);
+
+    const updateLive = useCallback(async (pitch: number, rate: number, position: number) => {
+        try {
+            await livePlayerRef.current?.update({ pitch, rate }, position);
+        } catch (error) {
+            console.error('[AudioEffects] Erro ao atualizar tempo real:', error);
+        }
+    }, []);
+
+    const stopLive = useCallback(() => {
+        livePlayerRef.current?.stop();
+        setIsLive(false);
+    }, []);
+
+    const setLiveVolume = useCallback((volume: number) => {
+        livePlayerRef.current?.setVolume(volume);
+    }, []);
+
+    useEffect(() => {
+        return () => livePlayerRef.current?.stop();
+    }, []);
+
     // Cleanup
     useEffect(() => {
         return () => {
@@ -114,7 +226,7 @@ export function useAudioEffects(apiUrl: string) {
             if (debounceTimerRef.current) {
                 window.clearTimeout(debounceTimerRef.current);
             }
-            if (processedAudioUrl) {
+            if (processedAudioUrl && processedAudioUrl.startsWith("blob:")) {
                 URL.revokeObjectURL(processedAudioUrl);
             }
         };
@@ -129,5 +241,10 @@ export function useAudioEffects(apiUrl: string) {
         setPitchShift,
         processAudio,
         processAudioDebounced,
+        isLive,
+        startLive,
+        updateLive,
+        stopLive,
+        setLiveVolume,
     };
 }
@@ -35,6 +35,7 @@ export function useHistory(apiUrl: string) {
           volumes: StemVolumes;
           mutes: MutedStems;
           audioUrl: string | null;
+          peaksUrl: string | null;
         }) => void;
         onError: () => void;
         setProgress: (progress: ProgressData) => void;
@@ -65,15 +66,22 @@ export function useHistory(apiUrl: string) {
 
         // Determinar URL do áudio para o visualizador
         let audioUrl: string | null = null;
+        let peaksUrl: string | null = null;
 
         if (uniqueStems.length > 0) {
           // Se há stems, usar o stem "other" ou o primeiro disponível
           const otherStem = uniqueStems.find((s) => s.name === "other");
           const audioForViz = otherStem || uniqueStems[0];
           audioUrl = `${apiUrl}${audioForViz.url}`;
+          // Análises antigas não guardam peaks_url: o endpoint calcula na hora
+          peaksUrl = `${apiUrl}${
+            audioForViz.peaks_url ||
+            audioForViz.url.replace("/api/download/", "/api/peaks/")
+          }`;
         } else {
           // Se não há stems, usar o arquivo original do upload
           audioUrl = `${apiUrl}/uploads/${encodeURIComponent(filename)}`;
+          peaksUrl = `${apiUrl}/api/peaks/upload/${encodeURIComponent(filename)}`;
           console.log("Usando arquivo original:", audioUrl);
         }
 
@@ -90,6 +98,7 @@ export function useHistory(apiUrl: string) {
           volumes,
           mutes,
           audioUrl,
+          peaksUrl,
         });
 
         callbacks.setProgress({
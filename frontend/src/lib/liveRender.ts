@@ -0,0 +1,227 @@
+// src/lib/liveRender.ts
+// Pitch/velocidade em tempo real (/api/live): o servidor renderiza quadros curtos a partir
+// do playhead e o Web Audio agenda um atrás do outro. Trocar os sliders manda a posição
+// atual; os quadros da nova "época" substituem o que ainda não tocou (fade curto).
+
+const FRAME_HEADER_SIZE = 16; // época u32, amostras u32, posição f64
+const START_DELAY = 0.03; // s entre receber o primeiro quadro e tocar
+const FADE_SECONDS = 0.02;
+
+export interface LiveParams {
+  pitch: number;
+  rate: number;
+}
+
+export type LiveSource = { filename: string } | { uploadId: string };
+
+interface LiveSession {
+  session_id: string;
+  stream_url: string;
+  sample_rate: number;
+  channels: number;
+}
+
+export class LiveRenderPlayer {
+  private context: AudioContext | null = null;
+  private gain: GainNode | null = null;
+  private sources: AudioBufferSourceNode[] = [];
+  private session: LiveSession | null = null;
+  private abort: AbortController | null = null;
+  private epoch = 0;
+  private nextTime = 0;
+  private volume = 1;
+  private apiUrl: string;
+
+  constructor(apiUrl: string) {
+    this.apiUrl = apiUrl;
+  }
+
+  get active() {
+    return this.session !== null;
+  }
+
+  // Abre a sessão e resolve quando o primeiro quadro está agendado
+  async start(source: LiveSource, position: number, params: LiveParams) {
+    this.stop();
+    const requestedAt = performance.now();
+    const body =
+      "uploadId" in source
+        ? { upload_id: source.uploadId }
+        : { filename: source.filename };
+    const response = await fetch(`${this.apiUrl}/api/live`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        ...body,
+        position,
+        pitch_shift: params.pitch,
+        time_stretch: params.rate,
+      }),
+    });
+    if (!response.ok) {
+      throw new Error(`Tempo real indisponível (${response.status})`);
+    }
+    const session: LiveSession = await response.json();
+    this.session = session;
+    this.epoch = 0;
+
+    if (!this.context) this.context = new AudioContext();
+    await this.context.resume();
+    this.resetOutput();
+
+    const abort = new AbortController();
+    this.abort = abort;
+    const stream = await fetch(`${this.apiUrl}${session.stream_url}`, {
+      signal: abort.signal,
+    });
+    if (!stream.ok || !stream.body) {
+      this.stop();
+      throw new Error(`Stream em tempo real falhou (${stream.status})`);
+    }
+
+    return new Promise<void>((resolve, reject) => {
+      let first = true;
+      const started = () => {
+        if (!first) return;
+        first = false;
+        console.log(
+          `[LiveRender] ✓ Primeiro quadro em ${Math.round(performance.now() - requestedAt)}ms`
+        );
+        resolve();
+      };
+      this.readFrames(stream.body!, session, abort.signal, started)
+        .then(started)
+        .catch((error) => {
+          if (error.name !== "AbortError") {
+            console.error("[LiveRender] Erro no stream:", error);
+          }
+          if (first) reject(error);
+        });
+    });
+  }
+
+  // Novos parâmetros a partir do playhead (segundos do original)
+  async update(params: LiveParams, position: number) {
+    if (!this.session) return;
+    const response = await fetch(
+      `${this.apiUrl}/api/live/${this.session.session_id}`,
+      {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          pitch_shift: params.pitch,
+          time_stretch: params.rate,
+          position,
+        }),
+      }
+    );
+    if (!response.ok) {
+      throw new Error(`Falha ao atualizar tempo real (${response.status})`);
+    }
+  }
+
+  setVolume(volume: number) {
+    this.volume = volume;
+    if (this.gain && this.context) {
+      this.gain.gain.setValueAtTime(volume, this.context.currentTime);
+    }
+  }
+
+  stop() {
+    this.abort?.abort();
+    this.abort = null;
+    if (this.session) {
+      fetch(`${this.apiUrl}/api/live/${this.session.session_id}`, {
+        method: "DELETE",
+      }).catch(() => undefined);
+      this.session = null;
+    }
+    this.fadeOut();
+  }
+
+  private resetOutput() {
+    const context = this.context!;
+    this.fadeOut();
+    this.gain = context.createGain();
+    this.gain.gain.value = this.volume;
+    this.gain.connect(context.destination);
+    this.nextTime = context.currentTime + START_DELAY;
+  }
+
+  // O que já foi agendado some com um fade curto (sem clique)
+  private fadeOut() {
+    if (!this.gain || !this.context) return;
+    const gain = this.gain;
+    const sources = this.sources;
+    const now = this.context.currentTime;
+    gain.gain.setValueAtTime(gain.gain.value, now);
+    gain.gain.linearRampToValueAtTime(0, now + FADE_SECONDS);
+    window.setTimeout(() => {
+      sources.forEach((source) => source.stop());
+      gain.disconnect();
+    }, FADE_SECONDS * 1000 + 50);
+    this.gain = null;
+    this.sources = [];
+  }
+
+  private async readFrames(
+    body: ReadableStream<Uint8Array>,
+    session: LiveSession,
+    signal: AbortSignal,
+    onFrame: () => void
+  ) {
+    const reader = body.getReader();
+    let buffer = new Uint8Array(0);
+    while (!signal.aborted) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      const merged = new Uint8Array(buffer.length + value.length);
+      merged.set(buffer);
+      merged.set(value, buffer.length);
+      buffer = merged;
+
+      // Quadros completos: cabeçalho + PCM 16 bits intercalado
+      let offset = 0;
+      while (buffer.length - offset >= FRAME_HEADER_SIZE) {
+        const view = new DataView(buffer.buffer, buffer.byteOffset + offset);
+        const epoch = view.getUint32(0, true);
+        const samples = view.getUint32(4, true);
+        const size = FRAME_HEADER_SIZE + samples * session.channels * 2;
+        if (buffer.length - offset < size) break;
+        const pcm = buffer.slice(offset + FRAME_HEADER_SIZE, offset + size);
+        offset += size;
+        if (epoch !== this.epoch) {
+          // Parâmetros novos: descarta o que estava agendado
+          this.epoch = epoch;
+          this.resetOutput();
+        }
+        this.schedule(new Int16Array(pcm.buffer), samples, session);
+        onFrame();
+      }
+      buffer = buffer.slice(offset);
+    }
+  }
+
+  private schedule(pcm: Int16Array, samples: number, session: LiveSession) {
+    const context = this.context;
+    if (!context || !this.gain || samples === 0) return;
+    const audio = context.createBuffer(session.channels, samples, session.sample_rate);
+    for (let channel = 0; channel < session.channels; channel++) {
+      const data = audio.getChannelData(channel);
+      for (let i = 0; i < samples; i++) {
+        data[i] = pcm[i * session.channels + channel] / 32768;
+      }
+    }
+    const source = context.createBufferSource();
+    source.buffer = audio;
+    source.connect(this.gain);
+    // Rede atrasou: recomeça um pouco à frente em vez de agendar no passado
+    this.nextTime = Math.max(this.nextTime, context.currentTime + START_DELAY);
+    source.start(this.nextTime);
+    this.nextTime += audio.duration;
+    this.sources.push(source);
+    source.onended = () => {
+      this.sources = this.sources.filter((item) => item !== source);
+    };
+  }
+}
@@ -0,0 +1,87 @@
+// src/lib/peaks.ts
+// Leitura dos picos pré-calculados pelo backend (/api/peaks, formato binário "MAPK")
+
+const MAGIC = "MAPK";
+const VERSION = 1;
+const HEADER_SIZE = 18; // 4s B B I Q
+const LEVEL_SIZE = 8; // I I
+
+export interface PeakLevel {
+  samplesPerPeak: number;
+  pairs: Int8Array; // (min, max) intercalados, -127..127
+}
+
+export interface WaveformPeaks {
+  sampleRate: number;
+  totalSamples: number;
+  duration: number;
+  levels: PeakLevel[]; // do mais fino ao mais grosso
+}
+
+export function parsePeaks(buffer: ArrayBuffer): WaveformPeaks {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(
+    ...new Uint8Array(buffer, 0, MAGIC.length)
+  );
+  if (magic !== MAGIC || view.getUint8(4) !== VERSION) {
+    throw new Error("Arquivo de picos inválido");
+  }
+
+  const levelCount = view.getUint8(5);
+  const sampleRate = view.getUint32(6, true);
+  const totalSamples = Number(view.getBigUint64(10, true));
+
+  let offset = HEADER_SIZE;
+  const specs: [number, number][] = [];
+  for (let i = 0; i < levelCount; i++) {
+    specs.push([
+      view.getUint32(offset, true),
+      view.getUint32(offset + 4, true),
+    ]);
+    offset += LEVEL_SIZE;
+  }
+
+  const levels = specs.map(([samplesPerPeak, count]) => {
+    const pairs = new Int8Array(buffer, offset, count * 2);
+    offset += count * 2;
+    return { samplesPerPeak, pairs };
+  });
+
+  return {
+    sampleRate,
+    totalSamples,
+    duration: sampleRate > 0 ? totalSamples / sampleRate : 0,
+    levels,
+  };
+}
+
+export async function fetchPeaks(
+  url: string,
+  signal?: AbortSignal
+): Promise<WaveformPeaks> {
+  const response = await fetch(url, { signal });
+  if (!response.ok) {
+    throw new Error(`Picos indisponíveis (${response.status})`);
+  }
+  return parsePeaks(await response.arrayBuffer());
+}
+
+/**
+ * Nível mais grosso que ainda tem pelo menos `pixels` picos,
+ * convertido para o formato do WaveSurfer (-1..1, min/max intercalados)
+ */
+export function peaksForWidth(
+  peaks: WaveformPeaks,
+  pixels: number
+): Float32Array {
+  const level =
+    [...peaks.levels]
+      .reverse()
+      .find((l) => l.pairs.length / 2 >= pixels) || peaks.levels[0];
+
+  const data = new Float32Array(level.pairs.length);
+  for (let i = 0; i < level.pairs.length; i++) {
+    data[i] = level.pairs[i] / 127;
+  }
+  return data;
+}
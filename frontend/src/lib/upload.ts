@@ -0,0 +1,76 @@
+// src/lib/upload.ts
+// Upload em partes (/api/uploads): retoma de onde parou se uma parte falhar
+// e reaproveita o mesmo upload_id quando o arquivo é usado de novo (acordes após separação)
+
+interface UploadStatus {
+  upload_id: string;
+  size: number;
+  offset: number;
+  chunk_size: number;
+  complete: boolean;
+}
+
+const MAX_RETRIES = 5;
+const completedUploads = new Map<string, string>();
+
+function fileKey(file: File) {
+  return `${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function readStatus(response: Response): Promise<UploadStatus> {
+  if (!response.ok) throw new Error(`Upload falhou (${response.status})`);
+  return response.json();
+}
+
+export async function uploadFile(
+  apiUrl: string,
+  file: File,
+  onProgress?: (fraction: number) => void
+): Promise<string> {
+  const cached = completedUploads.get(fileKey(file));
+  if (cached) return cached;
+
+  let status = await readStatus(
+    await fetch(`${apiUrl}/api/uploads`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ filename: file.name, size: file.size }),
+    })
+  );
+  const uploadUrl = `${apiUrl}/api/uploads/${status.upload_id}`;
+
+  let retries = 0;
+  while (!status.complete) {
+    onProgress?.(status.offset / status.size);
+    const chunk = file.slice(status.offset, status.offset + status.chunk_size);
+    try {
+      const response = await fetch(`${uploadUrl}?offset=${status.offset}`, {
+        method: "PUT",
+        headers: { "Content-Type": "application/octet-stream" },
+        body: chunk,
+      });
+      if (response.status === 409) {
+        // Servidor tem outro offset (parte anterior chegou, resposta se perdeu)
+        const conflict = await response.json();
+        status = { ...status, offset: conflict.offset };
+        continue;
+      }
+      status = await readStatus(response);
+      retries = 0;
+    } catch (error) {
+      if (++retries > MAX_RETRIES) throw error;
+      await new Promise((resolve) => setTimeout(resolve, 1000 * retries));
+      // Rede caiu no meio da parte: pergunta ao servidor quanto já chegou
+      status = await readStatus(await fetch(uploadUrl));
+    }
+  }
+
+  onProgress?.(1);
+  completedUploads.set(fileKey(file), status.upload_id);
+  return status.upload_id;
+}
+
+// Upload apagado no servidor (ex: análise deletada): próximo uso envia de novo
+export function forgetUpload(file: File) {
+  completedUploads.delete(fileKey(file));
+}
@@ -3,6 +3,7 @@
 export interface Stem {
   name: string;
   url: string;
+  peaks_url?: string;
 }
 
 export interface Chord {
@@ -34,6 +35,7 @@ export interface AnalysisResponse {
   method?: string;
   message?: string;
   task_id?: string;
+  queue_position?: number;
 }
 
 export interface ProgressData {
@@ -45,6 +47,30 @@ export interface ProgressData {
   chords?: Chord[];
   processing_time?: number;
   stems_mode?: string;
+  state?: "queued" | "running" | "done" | "error";
+  queue_position?: number;
+  demucs_percent?: number;
+  preview?: SeparationPreview;
+  segments?: SeparationSegment[];
+}
+
+// Trecho final de uma separação progressiva (stems em /api/segments)
+export interface SeparationSegment {
+  index: number;
+  start: number;
+  end: number;
+  stems: Stem[];
+  // Do início da música até o fim deste trecho, um arquivo por stem
+  combined?: Stem[];
+}
+
+// Trecho separado com a config básica enquanto o job completo roda
+export interface SeparationPreview {
+  stems: Stem[];
+  start: number;
+  end: number;
+  model?: string;
+  processing_time?: number;
 }
 
 export interface HistoryItem {